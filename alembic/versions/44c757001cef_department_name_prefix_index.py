@@ -0,0 +1,33 @@
+"""Department name prefix index
+
+Revision ID: 44c757001cef
+Revises: 6f4838aa7f7e
+Create Date: 2026-10-19 03:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '44c757001cef'
+down_revision: Union[str, Sequence[str], None] = '6f4838aa7f7e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_departments_name_lower_pattern', 'departments',
+        [sa.text('lower(name) text_pattern_ops')], unique=False,
+    )
+    op.create_index(op.f('ix_departments_parent_id'), 'departments', ['parent_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_departments_parent_id'), table_name='departments')
+    op.drop_index('ix_departments_name_lower_pattern', table_name='departments')
@@ -0,0 +1,40 @@
+"""Employee search indexes
+
+Revision ID: 6f4838aa7f7e
+Revises: 7aa055e817a6
+Create Date: 2026-10-19 03:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6f4838aa7f7e'
+down_revision: Union[str, Sequence[str], None] = '7aa055e817a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index(
+        'ix_employees_full_name_trgm', 'employees', ['full_name'],
+        unique=False, postgresql_using='gin', postgresql_ops={'full_name': 'gin_trgm_ops'},
+    )
+    op.create_index(
+        'ix_employees_position_trgm', 'employees', ['position'],
+        unique=False, postgresql_using='gin', postgresql_ops={'position': 'gin_trgm_ops'},
+    )
+    op.create_index(op.f('ix_employees_department_id'), 'employees', ['department_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_employees_department_id'), table_name='employees')
+    op.drop_index('ix_employees_position_trgm', table_name='employees')
+    op.drop_index('ix_employees_full_name_trgm', table_name='employees')
+    # Расширение pg_trgm не удаляем: им могут пользоваться другие объекты базы
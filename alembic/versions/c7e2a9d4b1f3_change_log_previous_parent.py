@@ -0,0 +1,28 @@
+"""Change log previous parent
+
+Revision ID: c7e2a9d4b1f3
+Revises: b3d9e1f2a4c6
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7e2a9d4b1f3'
+down_revision: Union[str, Sequence[str], None] = 'b3d9e1f2a4c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('change_log', sa.Column('previous_parent_id', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('change_log', 'previous_parent_id')
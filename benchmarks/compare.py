@@ -0,0 +1,51 @@
+"""
+Сравнение двух прогонов benchmarks.run.
+
+Пример:
+```
+python -m benchmarks.compare benchmarks/results/base.json benchmarks/results/new.json
+```
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import List
+
+
+def _delta(old: float, new: float) -> str:
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def compare(base: dict, new: dict) -> List[str]:
+    lines = [
+        f"base: {base['meta'].get('commit')}  new: {new['meta'].get('commit')}",
+        f"{'scenario':<28} {'p50 ms':>20} {'p99 ms':>20} {'rps':>20}",
+    ]
+    for name, new_stats in new["scenarios"].items():
+        base_stats = base["scenarios"].get(name)
+        if base_stats is None:
+            lines.append(f"{name:<28} (нет в базовом прогоне)")
+            continue
+        cells = []
+        for old_value, new_value in (
+            (base_stats["latency_ms"]["p50"], new_stats["latency_ms"]["p50"]),
+            (base_stats["latency_ms"]["p99"], new_stats["latency_ms"]["p99"]),
+            (base_stats["throughput_rps"], new_stats["throughput_rps"]),
+        ):
+            cells.append(f"{new_value:>10.2f} {_delta(old_value, new_value):>9}")
+        lines.append(f"{name:<28} " + " ".join(cells))
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сравнить два JSON с результатами benchmarks.run")
+    parser.add_argument("base", type=Path)
+    parser.add_argument("new", type=Path)
+    args = parser.parse_args()
+
+    print("\n".join(compare(
+        json.loads(args.base.read_text(encoding="utf-8")),
+        json.loads(args.new.read_text(encoding="utf-8")),
+    )))
@@ -0,0 +1,96 @@
+import datetime
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.data_access.entities.entities import Department, Employee, utc_now
+
+
+@dataclass
+class OrgTree:
+    """Загруженное в БД синтетическое дерево подразделений"""
+    root_id: int
+    # уровень -> id подразделений на этом уровне (0 - корень)
+    levels: List[List[int]] = field(default_factory=list)
+    parents: Dict[int, int | None] = field(default_factory=dict)
+    employees: int = 0
+
+    @property
+    def department_ids(self) -> List[int]:
+        return [dept_id for level in self.levels for dept_id in level]
+
+    @property
+    def leaves(self) -> List[int]:
+        return self.levels[-1]
+
+
+async def load_org_tree(
+        session: AsyncSession,
+        depth: int,
+        fanout: int,
+        employees_per_department: int,
+        seed: int = 0,
+        name_prefix: str = "bench",
+        parent_id: int | None = None,
+) -> OrgTree:
+    """
+    Сгенерировать и вставить дерево: корень, у каждого узла ``fanout`` детей, ``depth`` уровней под корнем.
+
+    Вставка идёт по уровням одним INSERT ... RETURNING на уровень, сотрудники - пачками.
+
+    :param parent_id: Куда подвесить корень дерева (None - новое корневое подразделение)
+    """
+    rnd = random.Random(seed)
+    now = utc_now()
+
+    result = await session.execute(
+        insert(Department)
+        .values(name=f"{name_prefix} root", parent_id=parent_id, created_at=now)
+        .returning(Department.id)
+    )
+    root_id = result.scalar_one()
+    tree = OrgTree(root_id=root_id, levels=[[root_id]], parents={root_id: parent_id})
+
+    for level in range(1, depth + 1):
+        rows = [
+            {"name": f"{name_prefix} L{level} #{parent_id}.{i}", "parent_id": parent_id, "created_at": now}
+            for parent_id in tree.levels[-1]
+            for i in range(fanout)
+        ]
+        result = await session.execute(
+            insert(Department).returning(Department.id, Department.parent_id, sort_by_parameter_order=True),
+            rows,
+        )
+        ids = []
+        for row in result:
+            ids.append(row.id)
+            tree.parents[row.id] = row.parent_id
+        tree.levels.append(ids)
+
+    batch: List[dict] = []
+    for dept_id in tree.department_ids:
+        for i in range(employees_per_department):
+            batch.append({
+                "department_id": dept_id,
+                "full_name": f"Employee {dept_id}-{i} {rnd.choice(NAMES)}",
+                "position": rnd.choice(POSITIONS),
+                "hired_at": datetime.date(2015, 1, 1) + datetime.timedelta(days=rnd.randrange(3650)),
+                "created_at": now,
+            })
+            if len(batch) >= 5000:
+                await session.execute(insert(Employee), batch)
+                tree.employees += len(batch)
+                batch = []
+    if batch:
+        await session.execute(insert(Employee), batch)
+        tree.employees += len(batch)
+
+    await session.commit()
+    return tree
+
+
+NAMES = ["Ivanov", "Petrova", "Sidorov", "Smirnova", "Kuznetsov", "Popova", "Vasiliev", "Sokolova"]
+POSITIONS = ["Developer", "QA", "Analyst", "Manager", "Designer", "DevOps", "Team Lead"]
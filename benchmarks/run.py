@@ -0,0 +1,290 @@
+"""
+Нагрузочный прогон API подразделений.
+
+Генерирует синтетическое дерево в Postgres (настройки подключения - те же DB_*, что у приложения),
+гоняет сценарии и пишет p50/p99 и пропускную способность в JSON для сравнения между коммитами.
+
+Пример:
+```
+python -m benchmarks.run --depth 4 --fanout 5 --employees 10 --requests 500 --concurrency 20 \\
+    --output benchmarks/results/$(git rev-parse --short HEAD).json
+python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+```
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from benchmarks.org_tree import OrgTree, load_org_tree
+from src.data_access.base import Base
+from src.settings import get_settings
+
+# (метод, путь, тело) одного запроса сценария
+RequestSpec = Tuple[str, str, Optional[dict]]
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+@dataclass
+class Scenario:
+    name: str
+    make_request: Callable[[int], RequestSpec]  # номер запроса -> запрос
+    expected_status: int = 200
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Перцентиль по ближайшему рангу (значения уже отсортированы)"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int) -> dict:
+    latencies: List[float] = []
+    db_queries: List[int] = []
+    errors: Dict[str, int] = {}
+    counter = iter(range(requests))
+
+    async def worker() -> None:
+        for i in counter:
+            method, url, body = scenario.make_request(i)
+            start = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            latencies.append(time.perf_counter() - start)
+
+            if response.status_code != scenario.expected_status:
+                errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+            match = SERVER_TIMING_QUERIES.search(response.headers.get("server-timing", ""))
+            if match:
+                db_queries.append(int(match.group(1)))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ms = [value * 1000 for value in latencies]
+    return {
+        "requests": len(ms),
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": round(len(ms) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "min": round(ms[0], 3) if ms else 0.0,
+            "p50": round(percentile(ms, 50), 3),
+            "p90": round(percentile(ms, 90), 3),
+            "p99": round(percentile(ms, 99), 3),
+            "max": round(ms[-1], 3) if ms else 0.0,
+            "mean": round(sum(ms) / len(ms), 3) if ms else 0.0,
+        },
+        "db_queries_per_request": round(sum(db_queries) / len(db_queries), 2) if db_queries else None,
+    }
+
+
+def build_read_scenarios(tree: OrgTree, rnd: random.Random, depths: List[int]) -> List[Scenario]:
+    scenarios = []
+    tree_depth = len(tree.levels) - 1
+    for depth in depths:
+        # Берём узлы, под которыми есть хотя бы depth уровней, чтобы запрос действительно обходил поддерево
+        candidates = [dept_id for level in tree.levels[:max(1, tree_depth - depth + 1)] for dept_id in level]
+        for include_employees in (False, True):
+            name = f"get_depth{depth}{'_employees' if include_employees else ''}"
+            flag = str(include_employees).lower()
+            scenarios.append(Scenario(
+                name=name,
+                make_request=lambda i, c=candidates, d=depth, f=flag: (
+                    "GET", f"/departments/{rnd.choice(c)}?depth={d}&include_employees={f}", None,
+                ),
+            ))
+    return scenarios
+
+
+def build_write_scenarios(tree: OrgTree, rnd: random.Random, run_id: str) -> List[Scenario]:
+    # Перемещаем только листья и только под внутренние узлы: циклов не будет,
+    # а листья остаются листьями, так что сценарий можно гонять сколько угодно раз
+    leaves = tree.leaves
+    inner = [dept_id for level in tree.levels[:-1] for dept_id in level] or [tree.root_id]
+    all_ids = tree.department_ids
+
+    return [
+        Scenario(
+            name="move",
+            make_request=lambda i: ("PATCH", f"/departments/{rnd.choice(leaves)}", {"parent_id": rnd.choice(inner)}),
+        ),
+        Scenario(
+            name="create",
+            make_request=lambda i: ("POST", "/departments", {"name": f"bench {run_id} new {i}", "parent_id": rnd.choice(all_ids)}),
+        ),
+    ]
+
+
+async def prepare_delete_targets(maker: async_sessionmaker[AsyncSession], parent_id: int, count: int, fanout: int, employees: int, seed: int) -> List[int]:
+    """Отдельные маленькие поддеревья под удаление: каждое удаление должно удалять одинаковый объём"""
+    targets = []
+    for i in range(count):
+        async with maker() as session:
+            subtree = await load_org_tree(
+                session, depth=1, fanout=fanout, employees_per_department=employees,
+                seed=seed + i, name_prefix=f"bench delete {i}", parent_id=parent_id,
+            )
+        targets.append(subtree.root_id)
+    return targets
+
+
+def git_revision() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+async def main(args: argparse.Namespace) -> dict:
+    rnd = random.Random(args.seed)
+    run_id = datetime.datetime.now(datetime.UTC).strftime("%Y%m%d%H%M%S")
+    settings = get_settings()
+
+    engine = create_async_engine(settings.database_url)
+    maker = async_sessionmaker(engine, expire_on_commit=False)
+    try:
+        if args.create_schema:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+
+        load_started = time.perf_counter()
+        async with maker() as session:
+            tree = await load_org_tree(
+                session, depth=args.depth, fanout=args.fanout, employees_per_department=args.employees,
+                seed=args.seed, name_prefix=f"bench {run_id}",
+            )
+        cascade_targets = await prepare_delete_targets(maker, tree.root_id, args.delete_requests, args.fanout, args.employees, args.seed)
+        reassign_targets = await prepare_delete_targets(maker, tree.root_id, args.delete_requests, args.fanout, args.employees, args.seed + 10_000)
+        load_seconds = time.perf_counter() - load_started
+        print(f"tree: root={tree.root_id} departments={len(tree.department_ids)} employees={tree.employees} ({load_seconds:.1f}s)", file=sys.stderr)
+
+        scenarios = build_read_scenarios(tree, rnd, args.get_depths) + build_write_scenarios(tree, rnd, run_id)
+        scenarios += [
+            Scenario(
+                name="delete_cascade",
+                make_request=lambda i: ("DELETE", f"/departments/{cascade_targets[i]}?mode=cascade", None),
+                expected_status=204,
+            ),
+            Scenario(
+                name="delete_reassign",
+                make_request=lambda i: (
+                    "DELETE", f"/departments/{reassign_targets[i]}?mode=reassign&reassign_to_department_id={tree.root_id}", None,
+                ),
+                expected_status=204,
+            ),
+        ]
+
+        results = {}
+        async with _client(args) as client:
+            for scenario in scenarios:
+                is_delete = scenario.name.startswith("delete")
+                requests = args.delete_requests if is_delete else args.requests
+                if not is_delete and args.warmup:
+                    await run_scenario(client, scenario, args.warmup, args.concurrency)
+                results[scenario.name] = await run_scenario(client, scenario, requests, args.concurrency)
+                stats = results[scenario.name]
+                print(
+                    f"{scenario.name:<28} p50={stats['latency_ms']['p50']:>9.2f}ms p99={stats['latency_ms']['p99']:>9.2f}ms "
+                    f"{stats['throughput_rps']:>9.1f} rps errors={sum(stats['errors'].values())}",
+                    file=sys.stderr,
+                )
+    finally:
+        await engine.dispose()
+
+    params = vars(args).copy()
+    params.pop("output", None)
+    return {
+        "meta": {
+            **git_revision(),
+            "timestamp": datetime.datetime.now(datetime.UTC).isoformat(),
+            "python": platform.python_version(),
+            "target": args.base_url or "in-process",
+            "params": params,
+            "tree": {
+                "root_id": tree.root_id,
+                "departments": len(tree.department_ids),
+                "employees": tree.employees,
+                "load_seconds": round(load_seconds, 2),
+            },
+        },
+        "scenarios": results,
+    }
+
+
+class _client:
+    """HTTP-клиент к запущенному серверу или к приложению в этом же процессе (с его lifespan)"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self._lifespan = None
+        self._client: httpx.AsyncClient | None = None
+
+    async def __aenter__(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(max_connections=self.args.concurrency, max_keepalive_connections=self.args.concurrency)
+        if self.args.base_url:
+            self._client = httpx.AsyncClient(base_url=self.args.base_url, limits=limits, timeout=60)
+            return self._client
+
+        from main import app
+        from src.dependencies import get_department_reads
+
+        if self.args.disable_read_cache:
+            # Мерим чтение из БД, а не короткий кэш GET (склейка одновременных запросов остаётся)
+            get_department_reads().ttl = 0
+        self._lifespan = app.router.lifespan_context(app)
+        await self._lifespan.__aenter__()
+        self._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+        return self._client
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._client.aclose()
+        if self._lifespan is not None:
+            await self._lifespan.__aexit__(*exc_info)
+
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон API подразделений")
+    parser.add_argument("--depth", type=int, default=4, help="Уровней под корнем синтетического дерева")
+    parser.add_argument("--fanout", type=int, default=5, help="Детей у каждого подразделения")
+    parser.add_argument("--employees", type=int, default=10, help="Сотрудников в каждом подразделении")
+    parser.add_argument("--requests", type=int, default=200, help="Запросов на сценарий")
+    parser.add_argument("--delete-requests", type=int, default=50, help="Запросов на сценарий удаления (столько поддеревьев создаётся заранее)")
+    parser.add_argument("--concurrency", type=int, default=10, help="Одновременных запросов")
+    parser.add_argument("--warmup", type=int, default=20, help="Прогревочных запросов перед сценарием (не учитываются)")
+    parser.add_argument("--get-depths", type=int, nargs="+", default=[0, 1, 3, 5], help="Значения depth для GET")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--base-url", default=None, help="URL запущенного сервера (по умолчанию приложение в этом процессе)")
+    parser.add_argument("--disable-read-cache", action="store_true", help="Выключить кэш GET /departments/{id} (только без --base-url)")
+    parser.add_argument("--create-schema", action="store_true", help="Создать таблицы, если их нет (вместо alembic upgrade head)")
+    parser.add_argument("--output", type=Path, default=None, help="Куда записать JSON (по умолчанию stdout)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    report = asyncio.run(main(arguments))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if arguments.output is None:
+        print(text)
+    else:
+        arguments.output.parent.mkdir(parents=True, exist_ok=True)
+        arguments.output.write_text(text + "\n", encoding="utf-8")
@@ -0,0 +1,144 @@
+"""
+Накладные расходы SQLAlchemy на один запрос: построение выражения каждый раз против готового.
+
+Для каждого горячего запроса репозиториев меряет:
+- ``cache key`` - построение выражения и вычисление ключа кэша компиляции (то, что SQLAlchemy
+  делает на каждом execute до обращения к БД);
+- ``execute`` - полный вызов ``session.execute`` на SQLite в памяти (с ``--execute``).
+
+Пример:
+```
+python -m benchmarks.statements --iterations 2000 --execute
+```
+"""
+import argparse
+import asyncio
+import time
+from typing import Callable, List, NamedTuple
+
+from sqlalchemy import Select, select, exists, bindparam, Integer
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from src.data_access.base import Base
+from src.data_access.entities.entities import Department, Employee
+from src.data_access.repositories import department_repository, employee_repository
+from src.data_access.repositories.department_repository import DEPARTMENT_COLUMNS
+from src.data_access.repositories.employee_repository import EMPLOYEE_COLUMNS
+
+
+class Case(NamedTuple):
+    name: str
+    build: Callable[[], Select]
+    prebuilt: Select
+    params: dict
+
+
+CASES = [
+    Case(
+        "department.get_by_id",
+        lambda: select(*DEPARTMENT_COLUMNS).where(Department.id == bindparam("department_id", type_=Integer)),
+        department_repository.GET_BY_ID,
+        {"department_id": 1},
+    ),
+    Case(
+        "department.is_exists",
+        lambda: select(exists().where(Department.id == bindparam("department_id", type_=Integer))),
+        department_repository.IS_EXISTS,
+        {"department_id": 1},
+    ),
+    Case(
+        "department.get_subtrees",
+        department_repository._subtrees_statement,
+        department_repository.GET_SUBTREES,
+        {"department_ids": [1], "depth": 3},
+    ),
+    Case(
+        "department.get_ancestors",
+        department_repository._ancestors_statement,
+        department_repository.GET_ANCESTORS,
+        {"department_id": 1},
+    ),
+    Case(
+        "department.search_by_name_prefix",
+        department_repository._search_by_name_prefix_statement,
+        department_repository.SEARCH_BY_NAME_PREFIX,
+        {"pattern": "a%", "limit": 20},
+    ),
+    Case(
+        "department.get_all_descendants_ids",
+        department_repository._descendant_ids_statement,
+        department_repository.GET_DESCENDANT_IDS,
+        {"department_id": 1},
+    ),
+    Case(
+        "employee.get_by_id",
+        lambda: select(*EMPLOYEE_COLUMNS).where(Employee.id == bindparam("employee_id", type_=Integer)),
+        employee_repository.GET_BY_ID,
+        {"employee_id": 1},
+    ),
+    Case(
+        "employee.search_within",
+        lambda: employee_repository._search_statement(False, True),
+        employee_repository.SEARCH[False, True],
+        {"pattern": "%a%", "department_id": 1, "limit": 20, "offset": 0},
+    ),
+]
+
+
+def per_call_us(func: Callable[[], object], iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def measure_cache_key(case: Case, iterations: int) -> tuple[float, float]:
+    built = per_call_us(lambda: case.build()._generate_cache_key(), iterations)
+    # Через lambda: ключ запоминается подменой метода на экземпляре после первого вызова
+    prebuilt = per_call_us(lambda: case.prebuilt._generate_cache_key(), iterations)
+    return built, prebuilt
+
+
+async def measure_execute(cases: List[Case], iterations: int) -> List[tuple[float, float]]:
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+    results = []
+    async with async_sessionmaker(engine)() as session:
+        for case in cases:
+            timings = []
+            for make in (case.build, lambda: case.prebuilt):
+                # Первый вызов компилирует SQL и кладёт его в кэш - не считаем
+                await session.execute(make(), case.params)
+                started = time.perf_counter()
+                for _ in range(iterations):
+                    result = await session.execute(make(), case.params)
+                    result.all()
+                timings.append((time.perf_counter() - started) / iterations * 1e6)
+            results.append((timings[0], timings[1]))
+    await engine.dispose()
+    return results
+
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Накладные расходы на построение запросов")
+    parser.add_argument("--iterations", type=int, default=2000, help="Вызовов на запрос")
+    parser.add_argument("--execute", action="store_true", help="Мерить и полный session.execute на SQLite в памяти")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    print(f"{'statement':<36} {'cache key, µs':>24}")
+    print(f"{'':<36} {'build':>11} {'prebuilt':>12}")
+    for case in CASES:
+        built, prebuilt = measure_cache_key(case, arguments.iterations)
+        print(f"{case.name:<36} {built:>11.1f} {prebuilt:>12.2f}")
+
+    if arguments.execute:
+        print()
+        print(f"{'statement':<36} {'execute, µs':>24}")
+        print(f"{'':<36} {'build':>11} {'prebuilt':>12}")
+        for case, (built, prebuilt) in zip(CASES, asyncio.run(measure_execute(CASES, arguments.iterations))):
+            print(f"{case.name:<36} {built:>11.1f} {prebuilt:>12.1f}")
@@ -1,28 +1,85 @@
+from contextlib import asynccontextmanager
 from typing import List, Annotated, Literal
 
-import uvicorn
-from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi import FastAPI, Depends, HTTPException, Query, Header
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
 from starlette import status
 from starlette.status import HTTP_400_BAD_REQUEST
 
 from src.api.contracts.create_department import CreateDepartment as apiCreateDepartment, ResponseCreateDepartment
 from src.api.contracts.create_employee import CreateEmployee as apiCreateEmployee, ResponseCreateEmployee
-from src.api.contracts.get_department import DepartmentGetResponse
-from src.api.contracts.move_department import MoveDepartment as apiMoveDepartment, ResponseMoveDepartment
+from src.api.contracts.get_changes import ResponseChanges
+from src.api.contracts.get_department import DepartmentGetResponse, ResponseDepartmentAncestors, \
+    BatchGetDepartments, ResponseBatchGetDepartments
+from src.api.contracts.move_department import MoveDepartment as apiMoveDepartment, ResponseMoveDepartment, \
+    BatchMoveDepartments, ResponseBatchMoveDepartments
+from src.api.contracts.pool_stats import ResponsePoolStats
+from src.api.contracts.search_departments import ResponseDepartmentSearch
+from src.api.contracts.search_employees import ResponseEmployeeSearch
+from src.api.compression import CompressionMiddleware
+from src.api.employee_export import EXPORT_MEDIA_TYPES, arrow_available, encode_arrow, encode_csv
+from src.api.error_handlers import register_db_error_handlers
+from src.api.negotiation import NegotiatedRoute
+from src.api.middleware import (
+    QueryStatsMiddleware,
+    MetricsMiddleware,
+    RequestDeadlineMiddleware,
+    AdmissionControlMiddleware,
+)
+from src.application.department_events import DepartmentEventStream
+from src.application.event_hub import EventHub
+from src.application.single_flight import SingleFlight
+from src.core.abstractions.changes_service_protocol import ChangesServiceProtocol
 from src.core.abstractions.departments_service_protocol import DeleteMode, DepartmentsServiceProtocol
 from src.core.abstractions.employees_service_protocol import EmployeesServiceProtocol
-from src.core.models.department import CreateDepartment, UpdateDepartment, ReadDepartment, create_department, \
-    create_update_department
+from src.core.models.department import create_department, create_update_department, DepartmentPathItem
 from src.core.models.employee import CreateEmployee, ReadEmployee, create_employee
-from src.data_access.session import lifespan
-from src.dependencies import get_employees_service, get_departments_service
+from src.data_access.context import read_only_endpoint
+from src.data_access.session import lifespan, get_pool_stats, get_session_maker
+from src.dependencies import get_employees_service, get_departments_service, get_department_reads, \
+    get_changes_service, get_event_hub, short_lived_services, change_listener_lifespan, get_export_employees_service
+from src.errors import DepartmentNotFoundError
+from src.metrics import REGISTRY
+from src.settings import get_settings
+from src.startup import app_import_timing, warm_up
+
+@asynccontextmanager
+async def app_lifespan(app: FastAPI):
+    """Подключение к БД, мост событий между воркерами и прогрев"""
+    async with lifespan(app), change_listener_lifespan(get_settings()):
+        started, import_seconds = app_import_timing()
+        await warm_up(app, get_settings(), started=started, import_seconds=import_seconds)
+        yield
 
 app = FastAPI(
     title="Department",
     description="API организационной структуры",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=app_lifespan
+)
+# JSON или MessagePack по Accept и Content-Type для всех маршрутов ниже
+app.router.route_class = NegotiatedRoute
+
+# Последний добавленный middleware - внешний: QueryStats, Metrics, Admission, Deadline (внутри всех).
+#  Ожидание места в очереди не входит в REQUEST_TIMEOUT: у него свой предел ADMISSION_MAX_WAIT.
+app.add_middleware(RequestDeadlineMiddleware, settings=get_settings(), routes=app.router.routes)
+app.add_middleware(AdmissionControlMiddleware, settings=get_settings(), routes=app.router.routes)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(
+    QueryStatsMiddleware,
+    slow_request_threshold_ms=get_settings().slow_request_threshold_ms,
+    log_slow_sql=get_settings().log_slow_request_sql,
 )
+# Сжатие снаружи всех: Server-Timing и метрики не включают время сжатия
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=get_settings().compression_min_size,
+    offload_size=get_settings().compression_offload_size,
+    encodings=get_settings().compression_encodings,
+)
+register_db_error_handlers(app)
 
 @app.post(
     "/departments/{id}/employees",
@@ -32,24 +89,10 @@ async def create_employees_in_department(
     id: int,
     body: apiCreateEmployee,
     employees_service: EmployeesServiceProtocol = Depends(get_employees_service),
-    depart_service: DepartmentsServiceProtocol = Depends(get_departments_service),
 ) -> ResponseCreateEmployee:
     """Создать сотрудника в подразделении"""
     try:
-        # Проверяем, существует ли департамент
-        if id is not None:
-            dept = await depart_service.get_department(id)
-            if not dept:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail={
-                        "error": "department_not_found",
-                        "message": f"Департамент с id={id} не найден",
-                        "provided_id": id
-                    }
-                )
-
-        # Если всё ок — создаём
+        # Существование департамента проверяется в том же INSERT, что и создание
         new_emp, errors = create_employee(
             department_id=id,
             full_name=body.full_name,
@@ -74,12 +117,87 @@ async def create_employees_in_department(
         )
 
         return response
+    except DepartmentNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "error": "department_not_found",
+                "message": f"Департамент с id={id} не найден",
+                "provided_id": id
+            }
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
 
+@app.post(
+    "/departments/batch-get",
+    description="Получить несколько подразделений за один запрос"
+)
+@read_only_endpoint
+async def batch_get_departments(
+    body: BatchGetDepartments,
+    depart_service: DepartmentsServiceProtocol = Depends(get_departments_service),
+    employees_service: EmployeesServiceProtocol = Depends(get_employees_service),
+) -> ResponseBatchGetDepartments:
+    """Получить несколько подразделений за один запрос"""
+    depth = min(max(body.depth, 0), 5)
+    ids = list(dict.fromkeys(body.ids))
+
+    # Все поддеревья - один рекурсивный запрос, сотрудники всех поддеревьев - ещё один
+    subtrees = await depart_service.get_department_subtrees(ids, depth)
+
+    employees_by_department: dict[int, List[ReadEmployee]] = {}
+    if body.include_employees and subtrees:
+        department_ids = {d.id for subtree in subtrees.values() for d in subtree}
+        for employee in await employees_service.get_all_employees_into_departments(department_ids):
+            employees_by_department.setdefault(employee.department_id, []).append(employee)
+
+    items: List[DepartmentGetResponse] = []
+    for department_id in ids:
+        subtree = subtrees.get(department_id)
+        if subtree is None:
+            continue
+
+        employees: List[ReadEmployee] = []
+        for d in subtree:
+            employees.extend(employees_by_department.get(d.id, []))
+        employees.sort(key=lambda x: x.created_at)
+
+        items.append(DepartmentGetResponse(
+            department=subtree[0],
+            children=subtree[1:],
+            employees=employees,
+        ))
+
+    return ResponseBatchGetDepartments(
+        items=items,
+        not_found=[department_id for department_id in ids if department_id not in subtrees],
+    )
+
+# Объявлен раньше /departments/{id}, иначе "search" попадёт в {id}
+@app.get(
+    "/departments/search",
+    description="Поиск подразделений по началу названия (для автодополнения)"
+)
+async def search_departments(
+    prefix: Annotated[str, Query(min_length=1, max_length=200)],  # Начало названия, без учёта регистра
+    limit: Annotated[int, Query(ge=1, le=50)] = 10,
+    depart_service: DepartmentsServiceProtocol = Depends(get_departments_service),
+) -> ResponseDepartmentSearch:
+    """Поиск подразделений по началу названия (для автодополнения)"""
+    prefix = prefix.strip()
+    if not prefix:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail="Префикс не может быть пустым"
+        )
+
+    items = await depart_service.search_departments(prefix, limit)
+    return ResponseDepartmentSearch(items=items)
+
 @app.get(
     "/departments/{id}",
     description="Получить подразделение (детали + сотрудники + поддерево)"
@@ -88,72 +206,128 @@ async def get_department_by_id(
     id: int,
     include_employees: Annotated[bool, Query()] = True,
     depth: Annotated[int, Query()] = 0,
+    include_path: Annotated[bool, Query()] = False,  # Добавить путь от корня (хлебные крошки)
     depart_service: DepartmentsServiceProtocol = Depends(get_departments_service),
     employees_service: EmployeesServiceProtocol = Depends(get_employees_service),
+    reads: SingleFlight = Depends(get_department_reads),
 ):
     """Получить подразделение (детали + сотрудники + поддерево)"""
-    try:
-        if id is not None:
-            dept = await depart_service.get_department(id)
-            if not dept:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail={
-                        "error": "department_not_found",
-                        "message": f"Департамент с id={id} не найден",
-                        "provided_id": id
-                    }
-                )
-
-        if depth > 5:
-            depth = 5
-        if depth < 0:
-            depth = 0
+    # Нормализуем параметры до построения ключа, чтобы depth=7 и depth=5 склеивались
+    if depth > 5:
+        depth = 5
+    if depth < 0:
+        depth = 0
+
+    async def load() -> DepartmentGetResponse:
+        # Поддерево - один рекурсивный запрос, сотрудники всего поддерева - ещё один
+        subtree = await depart_service.get_department_subtree(id, depth)
+        if not subtree:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail={
+                    "error": "department_not_found",
+                    "message": f"Департамент с id={id} не найден",
+                    "provided_id": id
+                }
+            )
 
-        all_children: List[ReadDepartment] = []
+        dept, all_children = subtree[0], subtree[1:]
         all_employees: List[ReadEmployee] = []
 
-        async def collect_children_recursively(department_id: int, current_depth: int = 0):
-            """Рекурсивный сбор всех детей подразделения до заданной глубины"""
-            if current_depth >= depth:
-                return
-
-            children = await depart_service.get_department_children(department_id)
-
-            for c in children:
-                all_children.append(c)
-                # Рекурсивно собираем детей этого ребенка
-                await collect_children_recursively(c.id, current_depth + 1)
-
-        # Запускаем сбор с корневого подразделения
-        await collect_children_recursively(id)
-
         # Если нужны сотрудники
         if include_employees:
-            # 1. Сначала собираем сотрудников из самого корневого подразделения
-            root_employees = await employees_service.get_all_employees_into_department(dept.id)
-            all_employees.extend(root_employees)
-
-            # 2. Затем собираем сотрудников из всех дочерних подразделений
-            for child in all_children:
-                employees = await employees_service.get_all_employees_into_department(child.id)
-                all_employees.extend(employees)
+            all_employees = await employees_service.get_all_employees_into_departments(
+                [d.id for d in subtree]
+            )
 
-            # Сортируем
-            all_employees.sort(key=lambda x: x.created_at)
+        path = None
+        if include_path:
+            ancestors = await depart_service.get_department_ancestors(id)
+            path = [DepartmentPathItem(id=a.id, name=a.name) for a in ancestors[:-1]]
 
-        # noinspection PyUnboundLocalVariable
         return DepartmentGetResponse(
             department=dept,
             children=all_children,
-            employees=all_employees
+            employees=all_employees,
+            path=path,
         )
+
+    try:
+        # Одинаковые конкурентные запросы ждут одно вычисление
+        return await reads.run((id, depth, include_employees, include_path), load)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
 
+@app.get(
+    "/departments/{id}/ancestors",
+    description="Путь от корня до подразделения"
+)
+async def get_department_ancestors(
+    id: int,
+    depart_service: DepartmentsServiceProtocol = Depends(get_departments_service),
+) -> ResponseDepartmentAncestors:
+    """Путь от корня до подразделения"""
+    ancestors = await depart_service.get_department_ancestors(id)
+    if not ancestors:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "error": "department_not_found",
+                "message": f"Департамент с id={id} не найден",
+                "provided_id": id
+            }
+        )
+
+    return ResponseDepartmentAncestors(items=ancestors)
+
+@app.get(
+    "/departments/{id}/events",
+    description="Поток изменений поддерева подразделения (Server-Sent Events)",
+    response_class=StreamingResponse,
+)
+async def department_events(
+    id: int,
+    last_event_id: Annotated[int | None, Header()] = None,  # Браузер присылает сам при переподключении
+    hub: EventHub = Depends(get_event_hub),
+):
+    """Поток изменений поддерева подразделения (Server-Sent Events)"""
+    # Без DbContext запроса: поток живёт долго, а соединение из пула нужно только на короткие запросы
+    async def load_subtree():
+        async with short_lived_services() as (depart_service, _):
+            return await depart_service.get_department_subtree_ids(id)
+
+    async def load_changes(since: int, limit: int):
+        async with short_lived_services() as (_, changes_service):
+            return await changes_service.get_changes(since, limit)
+
+    stream = DepartmentEventStream(
+        hub, id, load_subtree, load_changes,
+        heartbeat_interval=get_settings().events_heartbeat_interval,
+        last_event_id=last_event_id,
+    )
+    try:
+        found = await stream.open()
+    except OverflowError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Слишком много подписчиков, попробуйте позже"
+        )
+    if not found:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="department_not_found"
+        )
+
+    return StreamingResponse(
+        stream.events(),
+        media_type="text/event-stream",
+        # Без кэширования и буферизации в nginx - иначе события приходят пачками
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.patch(
     "/departments/{id}",
     description="Переместить подразделение в другое (изменить parent)"
@@ -165,13 +339,6 @@ async def department_move(
 ) -> ResponseMoveDepartment:
     """Переместить подразделение в другое (изменить parent)"""
     try:
-        dept = await depart_service.get_department(id)
-        if dept is None:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="department_not_found"
-            )
-
         update_depart, errors = create_update_department(
             name=body.name,
             parent_id=body.parent_id
@@ -182,6 +349,7 @@ async def department_move(
                 detail=errors
             )
 
+        # Один UPDATE ... RETURNING: 404 получаем по нулю обновлённых строк
         result = await depart_service.update_department(id, update_depart)
 
         response = ResponseMoveDepartment(
@@ -192,6 +360,46 @@ async def department_move(
         )
 
         return response
+    except DepartmentNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="department_not_found"
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+@app.post(
+    "/departments/batch-move",
+    description="Переместить несколько подразделений за один запрос (реорганизация)"
+)
+async def departments_batch_move(
+    body: BatchMoveDepartments,
+    depart_service: DepartmentsServiceProtocol = Depends(get_departments_service),
+) -> ResponseBatchMoveDepartments:
+    """Переместить несколько подразделений за один запрос (реорганизация)"""
+    try:
+        # Цикл проверяется на итоговом дереве: промежуточные состояния пакета не важны
+        moved = await depart_service.move_departments({move.id: move.parent_id for move in body.moves})
+
+        return ResponseBatchMoveDepartments(
+            items=[
+                ResponseMoveDepartment(
+                    id=d.id,
+                    name=d.name,
+                    parent_id=d.parent_id,
+                    created_at=d.created_at,
+                )
+                for d in moved
+            ]
+        )
+    except DepartmentNotFoundError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -267,16 +475,11 @@ async def departments(
 ) -> ResponseCreateDepartment:
     """Создать подразделение"""
     try:
-        # Проверяем, если такое подразделение, если нету, то depart_id=None
-        depart_id: int | None = None
-        if body.parent_id is not None:
-            result = await depart_service.get_department(body.parent_id)
-            if result is not None:
-                depart_id = result.id
-
+        # Существование родителя проверяется внутри INSERT:
+        #  если такого подразделения нету, то parent_id=None
         create_depart, errors = create_department(
             name=body.name,
-            parent_id=depart_id,
+            parent_id=body.parent_id,
         )
         if errors:
             raise HTTPException(
@@ -300,6 +503,102 @@ async def departments(
             detail=str(e)
         )
 
+@app.get(
+    "/employees/search",
+    description="Поиск сотрудников по ФИО и должности"
+)
+async def search_employees(
+    q: Annotated[str, Query(min_length=2, max_length=200)],      # Строка поиска
+    within_department_id: Annotated[int | None, Query()] = None, # Искать только в поддереве подразделения
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    offset: Annotated[int, Query(ge=0)] = 0,
+    employees_service: EmployeesServiceProtocol = Depends(get_employees_service),
+) -> ResponseEmployeeSearch:
+    """Поиск сотрудников по ФИО и должности"""
+    query = q.strip()
+    if len(query) < 2:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail="Строка поиска должна содержать хотя бы 2 символа"
+        )
+
+    try:
+        # На одну запись больше, чтобы узнать о следующей странице без COUNT(*)
+        employees = await employees_service.search_employees(query, within_department_id, limit + 1, offset)
+    except DepartmentNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "error": "department_not_found",
+                "message": f"Департамент с id={within_department_id} не найден",
+                "provided_id": within_department_id
+            }
+        )
+
+    return ResponseEmployeeSearch(
+        items=employees[:limit],
+        limit=limit,
+        offset=offset,
+        has_more=len(employees) > limit,
+    )
+
+@app.get(
+    "/employees/export",
+    description="Выгрузка всех сотрудников (или поддерева подразделения) в CSV или Arrow IPC stream",
+    response_class=StreamingResponse,
+)
+async def export_employees(
+    format: Literal["csv", "arrow"] = "csv",
+    within_department_id: Annotated[int | None, Query()] = None, # Только поддерево подразделения
+    employees_service: EmployeesServiceProtocol = Depends(get_export_employees_service),
+):
+    """Выгрузка сотрудников пачками с курсора на стороне сервера, память не зависит от числа строк"""
+    if format == "arrow" and not arrow_available():
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Формат arrow недоступен: не установлен pyarrow"
+        )
+
+    try:
+        batches = await employees_service.export_employees(within_department_id, get_settings().export_batch_size)
+    except DepartmentNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "error": "department_not_found",
+                "message": f"Департамент с id={within_department_id} не найден",
+                "provided_id": within_department_id
+            }
+        )
+
+    encode = encode_arrow if format == "arrow" else encode_csv
+    extension = "arrows" if format == "arrow" else "csv"
+    return StreamingResponse(
+        encode(batches),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="employees.{extension}"'},
+    )
+
+@app.get(
+    "/changes",
+    description="Журнал изменений подразделений и сотрудников для инкрементальной синхронизации"
+)
+async def get_changes(
+    since: Annotated[int, Query(ge=0)] = 0,           # next_cursor из предыдущего ответа (0 - с начала)
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+    changes_service: ChangesServiceProtocol = Depends(get_changes_service),
+) -> ResponseChanges:
+    """Журнал изменений подразделений и сотрудников для инкрементальной синхронизации"""
+    # Keyset-пагинация по id: WHERE id > since, без OFFSET. На одну запись больше - для has_more
+    changes = await changes_service.get_changes(since, limit + 1)
+    items = changes[:limit]
+
+    return ResponseChanges(
+        items=items,
+        next_cursor=items[-1].id if items else since,
+        has_more=len(changes) > limit,
+    )
+
 @app.get(
     "/health",
     description="Проверка работоспособности"
@@ -308,6 +607,48 @@ async def health_check():
     """Проверка работоспособности"""
     return {"status": "ok"}
 
+@app.get(
+    "/health/ready",
+    description="Готовность: есть рабочее соединение с БД"
+)
+async def health_ready():
+    """Готовность: есть рабочее соединение с БД"""
+    try:
+        async with get_session_maker()() as session:
+            await session.execute(text("SELECT 1"))
+    except (RuntimeError, SQLAlchemyError, OSError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={"status": "not_ready", "message": str(e)}
+        )
+    return {"status": "ready"}
+
+@app.get(
+    "/health/pool",
+    description="Статистика пула соединений с БД"
+)
+async def health_pool() -> ResponsePoolStats:
+    """Статистика пула соединений с БД"""
+    try:
+        return ResponsePoolStats(**get_pool_stats())
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+
+@app.get(
+    "/metrics",
+    description="Метрики в формате Prometheus",
+    response_class=PlainTextResponse,
+)
+async def metrics():
+    """Метрики в формате Prometheus"""
+    return PlainTextResponse(
+        REGISTRY.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
 @app.get(
     "/",
     description="Проверка работоспособности"
@@ -318,5 +659,7 @@ async def health_check():
 
 
 if __name__ == '__main__':
-    # В Docker этот блок игнорируется, так как запускается через uvicorn CLI
+    import uvicorn
+
+    # Для разработки: один процесс. В Docker запускается python -m src.server (несколько воркеров)
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=False)
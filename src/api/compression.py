@@ -0,0 +1,251 @@
+import asyncio
+import gzip
+import zlib
+from typing import Callable, Dict, List, Protocol, Sequence
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.metrics import REGISTRY
+
+# brotli и zstandard закреплены в requirements.txt; если их всё же нет, кодировка просто не предлагается
+try:
+    import brotli
+except ImportError:  # pragma: no cover - зависит от окружения
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - зависит от окружения
+    zstandard = None
+
+# Уровни подобраны под ответы API: почти максимальное сжатие JSON при малом времени CPU
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+ZSTD_LEVEL = 3
+
+# Уже сжатое или потоковое (SSE должен уходить клиенту сразу, без буфера компрессора)
+UNCOMPRESSIBLE_TYPES = ("image/", "video/", "audio/", "application/zip", "application/gzip", "text/event-stream")
+
+COMPRESSED_RESPONSES = REGISTRY.counter(
+    "http_compressed_responses_total", "Сжатые ответы по кодировкам", ("encoding",),
+)
+COMPRESSION_BYTES = REGISTRY.counter(
+    "http_compression_bytes_total", "Размер тел ответов до и после сжатия", ("encoding", "stage"),
+)
+
+
+class StreamCompressor(Protocol):
+    def compress(self, data: bytes) -> bytes: ...
+
+    def finish(self) -> bytes: ...
+
+
+class _GzipStream:
+    def __init__(self):
+        # wbits=31 - формат gzip (заголовок и контрольная сумма), а не голый deflate
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliStream:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class _ZstdStream:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+def _available_codecs() -> Dict[str, Callable[[], StreamCompressor]]:
+    codecs: Dict[str, Callable[[], StreamCompressor]] = {}
+    if zstandard is not None:
+        codecs["zstd"] = _ZstdStream
+    if brotli is not None:
+        codecs["br"] = _BrotliStream
+    codecs["gzip"] = _GzipStream
+    return codecs
+
+
+CODECS = _available_codecs()
+
+
+def compress_body(encoding: str, data: bytes) -> bytes:
+    """Сжать тело ответа целиком"""
+    if encoding == "gzip":
+        # mtime=0 - одинаковый результат для одинаковых тел
+        return gzip.compress(data, GZIP_LEVEL, mtime=0)
+    compressor = CODECS[encoding]()
+    return compressor.compress(data) + compressor.finish()
+
+
+def choose_encoding(accept_encoding: str, preferred: Sequence[str]) -> str | None:
+    """
+    Кодировка из Accept-Encoding с наибольшим q (с учётом "*"); при равных q - по предпочтению сервера.
+
+    Пример: ``choose_encoding("gzip, br", ["zstd", "br", "gzip"]) == "br"``
+    """
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in preferred:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Сжатие ответов по Accept-Encoding: zstd, br, gzip (из установленных).
+
+    Ответы меньше ``minimum_size`` уходят как есть - заголовки и время CPU дороже выигрыша.
+    Тела больше ``offload_size`` сжимаются в пуле потоков, чтобы не держать event loop.
+    Потоковые ответы (``more_body``) сжимаются по частям, без буферизации всего тела.
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            minimum_size: int = 1024,
+            offload_size: int = 256 * 1024,
+            encodings: Sequence[str] = ("zstd", "br", "gzip"),
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        self.encodings: List[str] = [encoding for encoding in encodings if encoding in CODECS]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.encodings:
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressedResponse(self, encoding, send).run(scope, receive)
+
+    async def _run(self, func, data: bytes) -> bytes:
+        if len(data) >= self.offload_size:
+            return await asyncio.to_thread(func, data)
+        return func(data)
+
+
+class _CompressedResponse:
+    """Состояние одного ответа: решение о сжатии откладывается до первых minimum_size байт"""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+
+        self.start: Message | None = None
+        self.buffer = bytearray()
+        self.compressor: StreamCompressor | None = None
+        self.passthrough = False
+
+    async def run(self, scope: Scope, receive: Receive) -> None:
+        await self.middleware.app(scope, receive, self.on_send)
+
+    async def on_send(self, message: Message) -> None:
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            if "content-encoding" in headers or content_type.startswith(UNCOMPRESSIBLE_TYPES):
+                self.passthrough = True
+                await self.send(message)
+                return
+            self.start = message
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            self.buffer += body
+            if more_body and len(self.buffer) < self.middleware.minimum_size:
+                return
+            if len(self.buffer) < self.middleware.minimum_size:
+                await self._send_start(compressed=False)
+                await self.send({"type": "http.response.body", "body": bytes(self.buffer)})
+                return
+
+            data = bytes(self.buffer)
+            self.buffer.clear()
+            if not more_body:
+                # Тело целиком - сжимаем за раз и знаем итоговую длину
+                compressed = await self.middleware._run(lambda d: compress_body(self.encoding, d), data)
+                self._account(len(data), len(compressed))
+                await self._send_start(compressed=True, length=len(compressed))
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+
+            self.compressor = CODECS[self.encoding]()
+            await self._send_start(compressed=True)
+            body = data
+
+        chunk = await self.middleware._run(self.compressor.compress, body) if body else b""
+        if not more_body:
+            chunk += self.compressor.finish()
+        self._account(len(body), len(chunk), finished=not more_body)
+        if chunk or not more_body:
+            await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    async def _send_start(self, compressed: bool, length: int | None = None) -> None:
+        headers = MutableHeaders(raw=list(self.start["headers"]))
+        # Ответ зависит от Accept-Encoding - кэши должны это учитывать
+        headers.add_vary_header("Accept-Encoding")
+        if compressed:
+            headers["Content-Encoding"] = self.encoding
+            if length is None:
+                # Потоковое сжатие: длина заранее неизвестна, сервер отправит chunked
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(length)
+        await self.send({**self.start, "headers": headers.raw})
+
+    def _account(self, raw: int, compressed: int, finished: bool = True) -> None:
+        COMPRESSION_BYTES.inc(raw, encoding=self.encoding, stage="raw")
+        COMPRESSION_BYTES.inc(compressed, encoding=self.encoding, stage="compressed")
+        if finished:
+            COMPRESSED_RESPONSES.inc(encoding=self.encoding)
@@ -0,0 +1,11 @@
+from typing import List
+
+from pydantic import BaseModel
+
+from src.core.models.change import ReadChange
+
+
+class ResponseChanges(BaseModel):
+    items: List[ReadChange]  # по возрастанию id
+    next_cursor: int         # передать в since следующего запроса
+    has_more: bool           # есть ли ещё изменения сразу, без ожидания
@@ -1,8 +1,8 @@
 from typing import List
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
-from src.core.models.department import ReadDepartment
+from src.core.models.department import ReadDepartment, DepartmentPathItem
 from src.core.models.employee import ReadEmployee
 
 
@@ -10,3 +10,20 @@ class DepartmentGetResponse(BaseModel):
     department: ReadDepartment     # объект подразделения
     employees: List[ReadEmployee]  # если include_employees=true, сортировка по created_at или full_name)
     children: List[ReadDepartment] # вложенные подразделения до depth, рекурсивно
+    path: List[DepartmentPathItem] | None = None  # если include_path=true: предки от корня к родителю
+
+
+class ResponseDepartmentAncestors(BaseModel):
+    items: List[ReadDepartment]    # от корня до самого подразделения включительно
+
+
+
+class BatchGetDepartments(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=100)
+    depth: int = 0                  # как в GET /departments/{id}: обрезается до 0..5
+    include_employees: bool = True
+
+
+class ResponseBatchGetDepartments(BaseModel):
+    items: List[DepartmentGetResponse]  # в порядке запрошенных id, без повторов
+    not_found: List[int]
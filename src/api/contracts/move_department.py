@@ -1,6 +1,7 @@
 import datetime
+from typing import List
 
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator
 
 
 class MoveDepartment(BaseModel):
@@ -19,4 +20,25 @@ class ResponseMoveDepartment(BaseModel):
     id: int
     name: str
     parent_id: int | None
-    created_at: datetime.datetime
\ No newline at end of file
+    created_at: datetime.datetime
+
+
+class DepartmentMoveItem(BaseModel):
+    id: int
+    parent_id: int | None  # None - сделать корневым
+
+
+class BatchMoveDepartments(BaseModel):
+    moves: List[DepartmentMoveItem] = Field(min_length=1, max_length=500)
+
+    @field_validator('moves')
+    @classmethod
+    def unique_ids(cls, v):
+        ids = [move.id for move in v]
+        if len(ids) != len(set(ids)):
+            raise ValueError("Каждое подразделение можно переместить только один раз")
+        return v
+
+
+class ResponseBatchMoveDepartments(BaseModel):
+    items: List[ResponseMoveDepartment]
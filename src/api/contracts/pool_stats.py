@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+
+
+class ResponsePoolStats(BaseModel):
+    size: int                         # pool_size
+    checked_in: int                   # свободные соединения в пуле
+    checked_out: int                  # выданные соединения
+    overflow: int                     # текущий overflow (может быть отрицательным, пока пул не заполнен)
+    max_overflow: int
+    checkouts: int = 0                # сколько раз выдавали соединение
+    timeouts: int = 0                 # сколько раз не дождались соединения
+    wait_time_total_ms: float = 0.0   # суммарное ожидание соединения
+    wait_time_max_ms: float = 0.0     # максимальное ожидание соединения
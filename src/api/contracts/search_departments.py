@@ -0,0 +1,9 @@
+from typing import List
+
+from pydantic import BaseModel
+
+from src.core.models.department import DepartmentWithPath
+
+
+class ResponseDepartmentSearch(BaseModel):
+    items: List[DepartmentWithPath]  # по названию; у каждого - путь от корня
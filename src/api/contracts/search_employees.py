@@ -0,0 +1,12 @@
+from typing import List
+
+from pydantic import BaseModel
+
+from src.core.models.employee import ReadEmployee
+
+
+class ResponseEmployeeSearch(BaseModel):
+    items: List[ReadEmployee]  # самые похожие - первыми
+    limit: int
+    offset: int
+    has_more: bool             # есть ли следующая страница
@@ -0,0 +1,80 @@
+import csv
+import io
+from functools import lru_cache
+from importlib.util import find_spec
+from typing import AsyncIterator, List
+
+from src.core.models.employee import EmployeeRow, EMPLOYEE_ROW_FIELDS
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+@lru_cache
+def arrow_available() -> bool:
+    # pyarrow закреплён в requirements.txt, но импорт у него долгий: загружаем только при первой выгрузке,
+    #  а здесь лишь проверяем, что он установлен
+    return find_spec("pyarrow") is not None
+
+
+async def encode_csv(batches: AsyncIterator[List[EmployeeRow]]) -> AsyncIterator[bytes]:
+    """CSV с заголовком; одна пачка строк - один фрагмент ответа"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(EMPLOYEE_ROW_FIELDS)
+    async for batch in batches:
+        writer.writerows(
+            (id_, department_id, full_name, position, hired_at.isoformat() if hired_at else "", created_at.isoformat())
+            for id_, department_id, full_name, position, hired_at, created_at in batch
+        )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Только заголовок - сотрудников нет
+        yield buffer.getvalue().encode()
+
+
+def _arrow_schema():
+    import pyarrow
+
+    return pyarrow.schema([
+        ("id", pyarrow.int64()),
+        ("department_id", pyarrow.int64()),
+        ("full_name", pyarrow.string()),
+        ("position", pyarrow.string()),
+        ("hired_at", pyarrow.date32()),
+        ("created_at", pyarrow.timestamp("us", tz="UTC")),
+    ])
+
+
+async def encode_arrow(batches: AsyncIterator[List[EmployeeRow]]) -> AsyncIterator[bytes]:
+    """
+    Arrow IPC stream: каждая пачка строк - одна колоночная record batch.
+
+    Читается без разбора строк, например ``pyarrow.ipc.open_stream(body).read_all()`` или ``polars.read_ipc_stream``.
+    """
+    import pyarrow
+    import pyarrow.ipc
+
+    schema = _arrow_schema()
+    sink = io.BytesIO()
+    writer = pyarrow.ipc.new_stream(sink, schema)
+
+    def take() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    async for batch in batches:
+        columns = list(zip(*batch))
+        writer.write_batch(pyarrow.record_batch(
+            [pyarrow.array(column, type=field.type) for column, field in zip(columns, schema)],
+            schema=schema,
+        ))
+        yield take()
+    writer.close()
+    yield take()
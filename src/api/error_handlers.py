@@ -0,0 +1,47 @@
+import logging
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+from starlette import status
+
+logger = logging.getLogger("app.requests")
+
+# SQLSTATE query_canceled: сработал statement_timeout (или запрос отменили)
+QUERY_CANCELED = "57014"
+
+
+def register_db_error_handlers(app: FastAPI) -> None:
+    """
+    Понятные ответы вместо 500, когда база перегружена:
+
+    - нет свободного соединения в пуле за DB_POOL_TIMEOUT - 503 с Retry-After;
+    - запрос прерван по statement_timeout - 504;
+    - соединение с базой потеряно - 503.
+    """
+
+    @app.exception_handler(PoolTimeoutError)
+    async def pool_timeout_handler(request: Request, exc: PoolTimeoutError) -> JSONResponse:
+        logger.warning("db pool exhausted: %s %s", request.method, request.url.path)
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"detail": "database_busy"},
+            headers={"Retry-After": "1"},
+        )
+
+    @app.exception_handler(DBAPIError)
+    async def dbapi_error_handler(request: Request, exc: DBAPIError) -> JSONResponse:
+        if getattr(exc.orig, "sqlstate", None) == QUERY_CANCELED:
+            logger.warning("statement timeout: %s %s", request.method, request.url.path)
+            return JSONResponse(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                content={"detail": "statement_timeout"},
+            )
+        if exc.connection_invalidated:
+            return JSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={"detail": "database_unavailable"},
+                headers={"Retry-After": "1"},
+            )
+        # Остальное - обычная 500 с трассировкой в логе
+        raise exc
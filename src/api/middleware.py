@@ -0,0 +1,319 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Sequence
+
+from starlette.datastructures import MutableHeaders
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.application.admission import AdmissionRejected, ConcurrencyLimiter
+from src.data_access.instrumentation import start_query_stats, stop_query_stats, get_query_stats
+from src.metrics import REGISTRY
+from src.settings import Settings
+
+logger = logging.getLogger("app.requests")
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "Количество HTTP-запросов", ("method", "route", "status"),
+)
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запроса", ("method", "route"),
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "http_requests_in_flight", "HTTP-запросы в обработке",
+)
+DB_STATEMENTS = REGISTRY.counter(
+    "db_statements_total", "SQL-запросы, выполненные при обработке HTTP-запросов", ("route",),
+)
+DB_TIME = REGISTRY.counter(
+    "db_time_seconds_total", "Время в БД при обработке HTTP-запросов", ("route",),
+)
+DB_STATEMENTS_PER_REQUEST = REGISTRY.histogram(
+    "db_statements_per_request", "Количество SQL-запросов на один HTTP-запрос", ("route",),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+HTTP_CANCELLED = REGISTRY.counter(
+    "http_requests_cancelled_total", "Обработчики, отменённые по таймауту или отключению клиента", ("reason",),
+)
+ADMISSION_IN_FLIGHT = REGISTRY.gauge(
+    "admission_in_flight", "Выполняемые запросы по классам маршрутов", ("class",),
+)
+ADMISSION_QUEUE_DEPTH = REGISTRY.gauge(
+    "admission_queue_depth", "Запросы, ждущие места, по классам маршрутов", ("class",),
+)
+ADMISSION_WAIT_SECONDS = REGISTRY.histogram(
+    "admission_wait_seconds", "Ожидание места перед выполнением запроса", ("class",),
+)
+ADMISSION_REJECTED = REGISTRY.counter(
+    "admission_rejected_total", "Запросы, не допущенные к выполнению", ("class", "reason"),
+)
+
+# Клиент закрыл соединение, не дождавшись ответа (как в nginx)
+STATUS_CLIENT_CLOSED_REQUEST = 499
+
+
+class QueryStatsMiddleware:
+    """
+    Считает SQL-запросы и время в БД для каждого HTTP-запроса.
+
+    Результат отдаётся в заголовке ``Server-Timing`` и пишется в лог одной JSON-строкой.
+    Запросы дольше ``slow_request_threshold_ms`` логируются с уровнем WARNING вместе с SQL.
+    """
+
+    def __init__(self, app: ASGIApp, slow_request_threshold_ms: float = 500.0, log_slow_sql: bool = True):
+        self.app = app
+        self.slow_request_threshold_ms = slow_request_threshold_ms
+        self.log_slow_sql = log_slow_sql
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats, token = start_query_stats()
+        start = time.perf_counter()
+        status_code = 500
+        streaming = False
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code, streaming
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                app_ms = (time.perf_counter() - start) * 1000
+                headers = MutableHeaders(scope=message)
+                streaming = headers.get("content-type", "").startswith("text/event-stream")
+                headers.append(
+                    "Server-Timing",
+                    f'db;dur={stats.total_time * 1000:.2f};desc="{stats.count} queries", app;dur={app_ms:.2f}',
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            stop_query_stats(token)
+            self._log(scope, status_code, (time.perf_counter() - start) * 1000, stats, streaming)
+
+    def _log(self, scope: Scope, status_code: int, duration_ms: float, stats, streaming: bool = False) -> None:
+        route = scope.get("route")
+        record = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": getattr(route, "path", None),
+            "status": status_code,
+            "duration_ms": round(duration_ms, 2),
+            "db_queries": stats.count,
+            "db_time_ms": round(stats.total_time * 1000, 2),
+            "db_slowest_ms": round(stats.slowest_time * 1000, 2),
+        }
+
+        # Поток событий (SSE) длится, пока открыт клиент - это не медленный запрос
+        if duration_ms >= self.slow_request_threshold_ms and not streaming:
+            if self.log_slow_sql:
+                record["db_slowest_statement"] = stats.slowest_statement
+                record["db_statements"] = [
+                    {"sql": sql, "ms": round(elapsed * 1000, 2)} for sql, elapsed in stats.statements
+                ]
+            logger.warning("slow request %s", json.dumps(record, ensure_ascii=False))
+        elif logger.isEnabledFor(logging.INFO):
+            logger.info("request %s", json.dumps(record, ensure_ascii=False))
+
+
+class MetricsMiddleware:
+    """
+    Метрики HTTP-запросов: количество, гистограмма времени по маршрутам, запросы в обработке.
+
+    Должен стоять внутри QueryStatsMiddleware, чтобы видеть статистику SQL текущего запроса.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # Метка - шаблон маршрута, а не путь: иначе каждый id станет отдельным рядом
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+
+            HTTP_REQUESTS.inc(method=method, route=route, status=str(status_code))
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, method=method, route=route)
+
+            stats = get_query_stats()
+            if stats is not None:
+                DB_STATEMENTS.inc(stats.count, route=route)
+                DB_TIME.inc(stats.total_time, route=route)
+                DB_STATEMENTS_PER_REQUEST.observe(stats.count, route=route)
+
+
+class RequestDeadlineMiddleware:
+    """
+    Ограничение времени ответа и отмена обработчика при отключении клиента.
+
+    Обработчик выполняется отдельной задачей. Если он не начал отвечать за отведённое время
+    (``Settings.timeout_for`` для маршрута), задача отменяется и клиент получает 504; если
+    клиент отключился раньше - задача тоже отменяется. Отмена прерывает текущий запрос asyncpg:
+    драйвер сам отправляет серверу cancel, и соединение возвращается в пул, а не ждёт
+    тяжёлый рекурсивный запрос. Потоковые ответы (SSE) ограничение не затрагивает - оно
+    действует только до начала ответа.
+
+    Должен стоять внутри QueryStatsMiddleware и MetricsMiddleware, чтобы они видели 504 и 499.
+    """
+
+    def __init__(self, app: ASGIApp, settings: Settings, routes: Sequence[BaseRoute] = ()):
+        self.app = app
+        self.settings = settings
+        self.routes = routes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Только если для маршрутов заданы свои ограничения - иначе незачем искать маршрут
+        route_path = _route_path(self.routes, scope) if self.settings.request_timeouts else None
+        timeout = self.settings.timeout_for(scope["method"], route_path)
+        response_started = False
+        response_done = False
+        reason: str | None = None
+        messages: asyncio.Queue[Message] = asyncio.Queue()
+
+        async def send_tracking(message: Message) -> None:
+            nonlocal response_started, response_done
+            if message["type"] == "http.response.start":
+                response_started = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_done = True
+            await send(message)
+
+        async def receive_from_queue() -> Message:
+            return await messages.get()
+
+        app_task = asyncio.create_task(self.app(scope, receive_from_queue, send_tracking))
+
+        async def watch_client() -> None:
+            # Читаем receive сами (тело пересылаем обработчику), чтобы заметить http.disconnect
+            nonlocal reason
+            while True:
+                message = await receive()
+                messages.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    if not response_done and not app_task.done():
+                        reason = reason or "disconnect"
+                        app_task.cancel()
+                    return
+
+        def on_deadline() -> None:
+            nonlocal reason
+            if not response_started and not app_task.done():
+                reason = "timeout"
+                app_task.cancel()
+
+        watcher = asyncio.create_task(watch_client())
+        timer = asyncio.get_running_loop().call_later(timeout, on_deadline) if timeout > 0 else None
+        try:
+            await app_task
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling() or reason is None:
+                # Отменили нас самих (остановка сервера) - отмена уже передана обработчику
+                raise
+            HTTP_CANCELLED.inc(reason=reason)
+            if response_started:
+                return
+            if reason == "timeout":
+                await _send_json(send, 504, {"detail": "request_timeout"})
+            else:
+                # Клиенту уже не отправится, но внешние middleware увидят статус
+                await _send_json(send, STATUS_CLIENT_CLOSED_REQUEST, {"detail": "client_closed_request"})
+        finally:
+            if timer is not None:
+                timer.cancel()
+            watcher.cancel()
+
+
+class AdmissionControlMiddleware:
+    """
+    Ограничение одновременных запросов по классам маршрутов (тяжёлые чтения, записи, health).
+
+    Каждый класс получает свой ConcurrencyLimiter, поэтому всплеск выгрузок поддеревьев
+    не отнимает пул соединений у дешёвых созданий и проверок живости. Не дождавшиеся места
+    получают 503, не поместившиеся в очередь - сразу 429; в обоих случаях с Retry-After.
+    Классы без лимита (в том числе потоковые SSE, которые не держат соединение с БД) пропускаются.
+    """
+
+    def __init__(self, app: ASGIApp, settings: Settings, routes: Sequence[BaseRoute] = ()):
+        self.app = app
+        self.settings = settings
+        self.routes = routes
+        self.limiters = {
+            route_class: ConcurrencyLimiter(limit, settings.admission_queue_size, settings.admission_max_wait)
+            for route_class, limit in settings.admission_limits.items()
+            if limit > 0
+        }
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.limiters:
+            await self.app(scope, receive, send)
+            return
+
+        route_class = self.settings.admission_class_for(scope["method"], _route_path(self.routes, scope))
+        limiter = self.limiters.get(route_class)
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        ADMISSION_QUEUE_DEPTH.inc(**{"class": route_class})
+        try:
+            await limiter.acquire()
+        except AdmissionRejected as e:
+            ADMISSION_REJECTED.inc(**{"class": route_class, "reason": e.reason})
+            status_code = 429 if e.reason == "queue_full" else 503
+            await _send_json(send, status_code, {"detail": "overloaded"}, retry_after=1)
+            return
+        finally:
+            ADMISSION_QUEUE_DEPTH.dec(**{"class": route_class})
+        ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - start, **{"class": route_class})
+
+        ADMISSION_IN_FLIGHT.inc(**{"class": route_class})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            ADMISSION_IN_FLIGHT.dec(**{"class": route_class})
+            limiter.release()
+
+
+def _route_path(routes: Sequence[BaseRoute], scope: Scope) -> str | None:
+    """Шаблон пути маршрута ("/departments/{id}"): роутер сопоставляет его только внутри приложения"""
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", None)
+    return None
+
+
+async def _send_json(send: Send, status_code: int, content: dict, retry_after: int | None = None) -> None:
+    body = json.dumps(content).encode()
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    if retry_after is not None:
+        headers.append((b"retry-after", str(retry_after).encode()))
+    await send({"type": "http.response.start", "status": status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,105 @@
+from typing import Any, Callable, Coroutine
+
+import msgpack
+from fastapi import Request, Response
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.routing import APIRoute
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+
+class MsgpackResponse(Response):
+    """Ответ в MessagePack: то же содержимое, что и в JSON, но без разбора текста на клиенте"""
+
+    media_type = "application/msgpack"
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, use_bin_type=True)
+
+
+class _MsgpackRequest(Request):
+    """
+    Запрос с телом в MessagePack.
+
+    FastAPI разбирает тело только для JSON - поэтому запрос притворяется JSON-запросом,
+    а ``json()`` распаковывает MessagePack.
+    """
+
+    def __init__(self, request: Request):
+        headers = [
+            (name, b"application/json" if name == b"content-type" else value)
+            for name, value in request.scope["headers"]
+        ]
+        super().__init__({**request.scope, "headers": headers}, request.receive)
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = msgpack.unpackb(await self.body())
+        return self._json
+
+
+def _media_type(content_type: str | None) -> str:
+    return (content_type or "").split(";", 1)[0].strip().lower()
+
+
+def wants_msgpack(accept: str | None) -> bool:
+    """Клиент предпочитает MessagePack: его q выше, чем у JSON (при равенстве - явно указанный msgpack)"""
+    if not accept:
+        return False
+    weights = {}
+    for part in accept.split(","):
+        media_type, _, params = part.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[media_type.strip().lower()] = q
+
+    msgpack_q = max(weights.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES)
+    json_q = weights.get("application/json", weights.get("application/*", weights.get("*/*", 0.0)))
+    return msgpack_q > 0 and msgpack_q >= json_q
+
+
+class NegotiatedRoute(APIRoute):
+    """
+    Маршрут, который понимает MessagePack.
+
+    - Тело с ``Content-Type: application/msgpack`` разбирается так же, как JSON.
+    - ``Accept: application/msgpack`` - ответ в MessagePack. Только для маршрутов с ответом
+      по умолчанию (JSON); свои Response (SSE, метрики) не меняются.
+
+    Подключается для всех маршрутов приложения:
+    ```python
+    app.router.route_class = NegotiatedRoute
+    ```
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        json_handler = super().get_route_handler()
+        msgpack_handler = None
+        if isinstance(self.response_class, DefaultPlaceholder):
+            # Второй обработчик с тем же разбором и валидацией, но другим классом ответа
+            default_class = self.response_class
+            self.response_class = MsgpackResponse
+            try:
+                msgpack_handler = super().get_route_handler()
+            finally:
+                self.response_class = default_class
+
+        async def route_handler(request: Request) -> Response:
+            if _media_type(request.headers.get("content-type")) in MSGPACK_MEDIA_TYPES:
+                request = _MsgpackRequest(request)
+            if msgpack_handler is None:
+                return await json_handler(request)
+
+            use_msgpack = wants_msgpack(request.headers.get("accept"))
+            response = await (msgpack_handler if use_msgpack else json_handler)(request)
+            # Ответ зависит от Accept - кэши должны это учитывать
+            response.headers.append("Vary", "Accept")
+            return response
+
+        return route_handler
@@ -0,0 +1,91 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+
+class AdmissionRejected(Exception):
+    """
+    Запрос не допущен к выполнению.
+
+    ``reason``: "queue_full" - очередь ожидания заполнена, "wait_timeout" - не дождались места.
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class ConcurrencyLimiter:
+    """
+    Ограничение числа одновременно выполняемых запросов с очередью ожидания.
+
+    Не больше ``limit`` запросов выполняются одновременно, ещё ``queue_size`` ждут своей
+    очереди (FIFO) не дольше ``max_wait`` секунд. Остальным отказ сразу - это дешевле,
+    чем держать их в очереди к пулу соединений.
+
+    Пример:
+    ```python
+    limiter = ConcurrencyLimiter(limit=8, queue_size=50, max_wait=2.0)
+    async with limiter.slot():
+        ...
+    ```
+    """
+
+    def __init__(self, limit: int, queue_size: int = 100, max_wait: float = 2.0):
+        if limit < 1:
+            raise ValueError("limit must be positive")
+        self.limit = limit
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+
+        self.active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        """
+        Занять место.
+
+        :raises AdmissionRejected: Очередь заполнена или место не освободилось за max_wait.
+        """
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.queue_size:
+            raise AdmissionRejected("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            async with asyncio.timeout(self.max_wait):
+                await waiter
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # Место передали одновременно с таймаутом или отменой - отдаём следующему
+                self.release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            if isinstance(e, TimeoutError):
+                raise AdmissionRejected("wait_timeout") from None
+            raise
+
+    def release(self) -> None:
+        """Освободить место: оно передаётся первому в очереди, счётчик active не меняется"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
@@ -0,0 +1,146 @@
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, List, Set
+
+from src.application.event_hub import EventHub, Subscription
+from src.core.models.change import ReadChange, ChangeEntity, ChangeKind
+
+# Сколько последних id помнить, чтобы не отдать одно изменение дважды (догоняющее чтение + очередь)
+SEEN_IDS_LIMIT = 1000
+REPLAY_PAGE_SIZE = 500
+
+
+class DepartmentEventStream:
+    """
+    Поток SSE с изменениями поддерева подразделения.
+
+    Множество id поддерева загружается при подключении и поддерживается по событиям;
+    перемещения и удаления внутри поддерева перезагружают его (один запрос, случаются редко).
+    Удаление снаружи тоже перезагружает: каскадом мог удалиться предок, а с ним и само подразделение.
+    При переподключении с Last-Event-ID пропущенное догоняется по журналу изменений.
+
+    Пример:
+    ```python
+    stream = DepartmentEventStream(hub, department_id, load_subtree, load_changes)
+    if not await stream.open():
+        raise HTTPException(404)
+    return StreamingResponse(stream.events(), media_type="text/event-stream")
+    ```
+    """
+
+    def __init__(
+            self,
+            hub: EventHub,
+            department_id: int,
+            load_subtree: Callable[[], Awaitable[Set[int]]],
+            load_changes: Callable[[int, int], Awaitable[List[ReadChange]]],
+            heartbeat_interval: float = 15.0,
+            last_event_id: int | None = None,
+    ):
+        self.hub = hub
+        self.department_id = department_id
+        self.load_subtree = load_subtree
+        self.load_changes = load_changes
+        self.heartbeat_interval = heartbeat_interval
+        self.last_event_id = last_event_id
+
+        self.subtree: Set[int] = set()
+        self._subscription: Subscription | None = None
+        self._seen: deque[int] = deque(maxlen=SEEN_IDS_LIMIT)
+
+    async def open(self) -> bool:
+        """
+        Подписаться и загрузить поддерево.
+
+        :raises OverflowError: Достигнут лимит подписчиков.
+        :return: False, если подразделения нет.
+        """
+        # Подписка раньше загрузки: изменения между ними попадут в очередь
+        self._subscription = self.hub.subscribe()
+        try:
+            self.subtree = await self.load_subtree()
+        except BaseException:
+            self._subscription.close()
+            raise
+        if not self.subtree:
+            self._subscription.close()
+            return False
+        return True
+
+    async def events(self) -> AsyncIterator[str]:
+        """Строки протокола SSE. Генератор закрывает подписку при отключении клиента"""
+        try:
+            # Через сколько мс браузер переподключится после обрыва
+            yield "retry: 3000\n\n"
+
+            if self.last_event_id is not None:
+                cursor = self.last_event_id
+                while True:
+                    changes = await self.load_changes(cursor, REPLAY_PAGE_SIZE)
+                    for change in changes:
+                        async for chunk in self._handle(change):
+                            yield chunk
+                        if not self.subtree:
+                            return
+                    if len(changes) < REPLAY_PAGE_SIZE:
+                        break
+                    cursor = changes[-1].id
+
+            while True:
+                try:
+                    change = await self._subscription.get(self.heartbeat_interval)
+                except TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if change is None:
+                    # Клиент не успевал читать: закрываем, он переподключится с Last-Event-ID
+                    yield "event: overflow\ndata: {}\n\n"
+                    return
+
+                async for chunk in self._handle(change):
+                    yield chunk
+                if not self.subtree:
+                    # Подразделение удалено
+                    return
+        finally:
+            self._subscription.close()
+
+    async def _handle(self, change: ReadChange) -> AsyncIterator[str]:
+        if change.id in self._seen:
+            return
+        self._seen.append(change.id)
+
+        if await self._affects(change):
+            yield f"id: {change.id}\nevent: {change.entity.value}.{change.kind.value}\ndata: {change.model_dump_json()}\n\n"
+
+    async def _affects(self, change: ReadChange) -> bool:
+        """Относится ли изменение к поддереву; заодно обновляет множество id поддерева"""
+        if change.entity == ChangeEntity.EMPLOYEE:
+            # Перевод наружу тоже касается поддерева: сотрудник его покинул
+            return change.parent_id in self.subtree or change.previous_parent_id in self.subtree
+
+        if change.kind == ChangeKind.CREATED:
+            if change.parent_id in self.subtree:
+                self.subtree.add(change.entity_id)
+                return True
+            return False
+
+        if change.kind == ChangeKind.RENAMED:
+            return change.entity_id in self.subtree
+
+        if change.entity_id == self.department_id:
+            if change.kind == ChangeKind.DELETED:
+                self.subtree = set()
+            return True
+
+        # Перемещение или удаление: узел с потомками мог войти в поддерево или покинуть его
+        if change.entity_id in self.subtree or change.parent_id in self.subtree:
+            self.subtree = await self.load_subtree()
+            return True
+
+        if change.kind == ChangeKind.DELETED:
+            # Каскадное удаление пишет одно событие на корень удалённого поддерева: если это был
+            #  наш предок, подразделение исчезло вместе с ним. Отдаём это событие и закрываем поток.
+            self.subtree = await self.load_subtree()
+            return not self.subtree
+        return False
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from typing import Callable, Iterable, List, Set
+
+from src.core.models.change import ReadChange, RecordChange
+from src.data_access.context import DbContext
+
+logger = logging.getLogger("app.events")
+
+
+class Subscription:
+    """
+    Подписка на изменения с ограниченной очередью.
+
+    Если подписчик не успевает читать и очередь заполнилась, подписка закрывается
+    (``overflowed``): публикующий никогда не ждёт медленного клиента. Клиент переподключается
+    с Last-Event-ID и догоняет пропущенное по журналу изменений.
+    """
+
+    def __init__(self, hub: "EventHub", queue_size: int):
+        self._hub = hub
+        self._queue: asyncio.Queue[ReadChange | None] = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def _offer(self, change: ReadChange) -> bool:
+        if self.overflowed:
+            return False
+        try:
+            self._queue.put_nowait(change)
+            return True
+        except asyncio.QueueFull:
+            self._shut()
+            return False
+
+    def _shut(self) -> None:
+        # Освобождаем очередь и оставляем в ней только сигнал закрытия
+        self.overflowed = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    async def get(self, timeout: float) -> ReadChange | None:
+        """
+        Следующее изменение.
+
+        :raises TimeoutError: За timeout секунд изменений не было.
+        :return: None, если подписка закрыта из-за переполнения.
+        """
+        return await asyncio.wait_for(self._queue.get(), timeout)
+
+    def close(self) -> None:
+        self._hub.unsubscribe(self)
+
+
+class EventHub:
+    """
+    Рассылка зафиксированных изменений подписчикам внутри процесса (SSE).
+
+    Изменения приходят либо от своих транзакций после коммита (``committed``), либо,
+    при нескольких воркерах, через мост LISTEN/NOTIFY из Postgres (``publish``) - тогда
+    NOTIFY доставляет и свои изменения, и ``committed`` их не дублирует.
+
+    ``on_change`` вызывается на каждое зафиксированное изменение - своё сразу после коммита
+    и чужое (другого воркера) из моста. Через него сбрасываются кэши чтения.
+    """
+
+    def __init__(
+            self,
+            queue_size: int = 100,
+            max_subscribers: int = 1000,
+            on_change: Callable[[], None] | None = None,
+    ):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.on_change = on_change
+        # Подключён ли мост из Postgres
+        self.bridged = False
+
+        self._subscribers: Set[Subscription] = set()
+
+        # Статистика
+        self.published = 0  # изменений разослано
+        self.dropped = 0    # подписок закрыто из-за переполнения
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Subscription:
+        """
+        Новая подписка. Закрывать через ``Subscription.close()``.
+
+        :raises OverflowError: Достигнут лимит подписчиков.
+        """
+        if len(self._subscribers) >= self.max_subscribers:
+            raise OverflowError("too many subscribers")
+        subscription = Subscription(self, self.queue_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+
+    def publish(self, changes: Iterable[ReadChange]) -> None:
+        """Разослать изменения всем подписчикам, не дожидаясь их"""
+        changes = list(changes)
+        if changes and self.on_change is not None:
+            self.on_change()
+        for change in changes:
+            self.published += 1
+            for subscription in list(self._subscribers):
+                if not subscription._offer(change):
+                    self.dropped += 1
+                    self._subscribers.discard(subscription)
+                    logger.warning("events subscriber dropped: queue is full")
+
+    def close_all(self) -> None:
+        """Закрыть все подписки (остановка воркера): клиенты переподключатся с Last-Event-ID"""
+        for subscription in list(self._subscribers):
+            subscription._shut()
+        self._subscribers.clear()
+
+    def committed(self, changes: List[ReadChange]) -> None:
+        """Изменения своей транзакции после коммита: рассылаем сами, если они не придут через NOTIFY"""
+        if not self.bridged:
+            self.publish(changes)
+        elif changes and self.on_change is not None:
+            # Через NOTIFY они придут позже, а кэши должны сброситься сразу после коммита
+            self.on_change()
+
+
+async def record_changes(db: DbContext, events: EventHub | None, changes: List[RecordChange]) -> None:
+    """Записать изменения в журнал и разослать их подписчикам после коммита транзакции"""
+    recorded = await db.changes.record(changes)
+    if events is not None and recorded:
+        db.after_commit(lambda: events.committed(recorded))
@@ -0,0 +1,14 @@
+from typing import List
+
+from src.core.abstractions.changes_service_protocol import ChangesServiceProtocol
+from src.core.models.change import ReadChange
+from src.data_access.context import DbContext
+
+
+class ChangesService(ChangesServiceProtocol):
+
+    def __init__(self, db: DbContext):
+        self.db = db
+
+    async def get_changes(self, since: int, limit: int) -> List[ReadChange]:
+        return await self.db.changes.list_since(since, limit)
@@ -1,17 +1,22 @@
-from typing import List, Optional
+from typing import List, Optional, Dict, Iterable, Mapping, Set
 
+from src.application.event_hub import EventHub, record_changes
 from src.core.abstractions.departments_service_protocol import DepartmentsServiceProtocol, DeleteMode
-from src.core.models.department import CreateDepartment, ReadDepartment, UpdateDepartment
+from src.core.models.change import RecordChange, ChangeEntity, ChangeKind
+from src.core.models.department import CreateDepartment, ReadDepartment, UpdateDepartment, DepartmentWithPath
 from src.data_access.context import DbContext
 
 
 class DepartmentsService(DepartmentsServiceProtocol):
 
-    def __init__(self, db: DbContext):
+    def __init__(self, db: DbContext, events: EventHub | None = None):
         self.db = db
+        self.events = events
 
     async def create_department(self, department: CreateDepartment) -> ReadDepartment:
-        return await self.db.department.add(department)
+        created = await self.db.department.add(department)
+        await record_changes(self.db, self.events, [_department_change(created, ChangeKind.CREATED)])
+        return created
 
     async def get_department(self, department_id: int) -> Optional[ReadDepartment]:
         return await self.db.department.get_by_id(department_id)
@@ -19,21 +24,40 @@ class DepartmentsService(DepartmentsServiceProtocol):
     async def get_department_children(self, department_id: int) -> List[ReadDepartment]:
         return await self.db.department.get_children(department_id)
 
+    async def get_department_subtree(self, department_id: int, depth: int) -> List[ReadDepartment]:
+        return await self.db.department.get_subtree(department_id, depth)
+
+    async def get_department_subtrees(self, department_ids: Iterable[int], depth: int) -> Dict[int, List[ReadDepartment]]:
+        return await self.db.department.get_subtrees(department_ids, depth)
+
+    async def get_department_subtree_ids(self, department_id: int) -> Set[int]:
+        if not await self.db.department.is_exists(department_id):
+            return set()
+        return {department_id} | await self.db.department.get_all_descendants_ids(department_id)
+
+    async def get_department_ancestors(self, department_id: int) -> List[ReadDepartment]:
+        return await self.db.department.get_ancestors(department_id)
+
+    async def search_departments(self, prefix: str, limit: int) -> List[DepartmentWithPath]:
+        return await self.db.department.search_by_name_prefix(prefix, limit)
+
     async def update_department(self, department_id: int, update_dto: UpdateDepartment) -> ReadDepartment:
-        department = await self.db.department.get_by_id(department_id)
-        if not department:
-            raise ValueError("department with id {} does not exist".format(department_id))
+        # Существование и проверка на цикл выполняются внутри одного UPDATE в репозитории
+        updated = await self.db.department.update(department_id, update_dto)
+
+        # PATCH всегда выставляет parent_id, название - только если передано
+        changes = [_department_change(updated, ChangeKind.MOVED)]
+        if update_dto.name is not None:
+            changes.append(_department_change(updated, ChangeKind.RENAMED))
+        await record_changes(self.db, self.events, changes)
 
-        # Проверяем, меняется ли parent_id
-        if update_dto.parent_id is not None and update_dto.parent_id != department.parent_id:
-            # Проверка на цикл
-            if await self.db.department.has_cycle(department_id, update_dto.parent_id):
-                raise ValueError(
-                    f"Нельзя установить родителя: департамент {update_dto.parent_id} "
-                    f"находится в поддереве департамента {department_id}"
-                )
+        return updated
 
-        return await self.db.department.update(department_id, update_dto)
+    async def move_departments(self, moves: Mapping[int, int | None]) -> List[ReadDepartment]:
+        # Проверка всего пакета и UPDATE - внутри репозитория, ошибка откатывает транзакцию целиком
+        moved = await self.db.department.move_many(moves)
+        await record_changes(self.db, self.events, [_department_change(d, ChangeKind.MOVED) for d in moved])
+        return moved
 
     async def delete_department(self, department_id: int, mode: DeleteMode, reassign_to_department_id: int | None) -> str:
 
@@ -46,20 +70,39 @@ class DepartmentsService(DepartmentsServiceProtocol):
             is_exists = await self.db.department.is_exists(department_id)
             if not is_exists:
                 errors.append("department with id {} does not exist".format(department_id))
+            elif reassign_to_department_id is not None and not await self.db.department.is_exists(reassign_to_department_id):
+                errors.append("department with id {} does not exist".format(reassign_to_department_id))
 
             if errors:
                 return "\n".join(errors)
 
-            # Меняем у сотрудников подразделение
-            employees = await self.db.employee.get_all_employees_into_department(department_id)
-            for employee in employees:
-                employee.department_id = reassign_to_department_id
+            # Меняем у сотрудников подразделение одним UPDATE
+            moved_employee_ids = await self.db.employee.reassign_department(department_id, reassign_to_department_id)
 
             # Удаляем ненужное нам подразделение
             result = await self.db.department.delete_without_cascade(department_id)
+            if result:
+                await record_changes(self.db, self.events, [
+                    *(
+                        RecordChange(
+                            entity=ChangeEntity.EMPLOYEE,
+                            entity_id=employee_id,
+                            kind=ChangeKind.MOVED,
+                            parent_id=reassign_to_department_id,
+                            previous_parent_id=department_id,
+                        )
+                        for employee_id in moved_employee_ids
+                    ),
+                    RecordChange(entity=ChangeEntity.DEPARTMENT, entity_id=department_id, kind=ChangeKind.DELETED),
+                ])
 
         elif mode == DeleteMode.CASCADE:
             result = await self.db.department.delete_with_cascade(department_id)
+            if result:
+                # Одно событие на всё поддерево: потомки и сотрудники удаляются вместе с корнем
+                await record_changes(self.db, self.events, [
+                    RecordChange(entity=ChangeEntity.DEPARTMENT, entity_id=department_id, kind=ChangeKind.DELETED),
+                ])
 
         if result is not None and result == False:
             errors.append("couldn't delete Department, id {}".format(department_id))
@@ -68,9 +111,11 @@ class DepartmentsService(DepartmentsServiceProtocol):
         return errors_str
 
 
-
-
-
-
-
-
+def _department_change(department: ReadDepartment, kind: ChangeKind) -> RecordChange:
+    return RecordChange(
+        entity=ChangeEntity.DEPARTMENT,
+        entity_id=department.id,
+        kind=kind,
+        parent_id=department.parent_id,
+        name=department.name,
+    )
@@ -1,24 +1,65 @@
-from typing import List
+from typing import List, Iterable, AsyncIterator
 
+from src.application.event_hub import EventHub, record_changes
 from src.core.abstractions.employees_service_protocol import EmployeesServiceProtocol
-from src.core.models.employee import CreateEmployee, ReadEmployee
+from src.core.models.change import RecordChange, ChangeEntity, ChangeKind
+from src.core.models.employee import CreateEmployee, ReadEmployee, EmployeeRow
 from src.data_access.context import DbContext
+from src.errors import DepartmentNotFoundError
 
 
 class EmployeesService(EmployeesServiceProtocol):
 
-    def __init__(self, db: DbContext):
+    def __init__(self, db: DbContext, events: EventHub | None = None):
         self.db = db
+        self.events = events
 
     async def create_employee(self, employee: CreateEmployee) -> ReadEmployee:
-        # Проверяем существует ли подразделение в которые добавим сотрудника
-        is_exist = await self.db.department.is_exists(employee.department_id)
-        if not is_exist:
-            raise ValueError("There is no such Department.")
+        # Существование подразделения проверяется внутри INSERT в репозитории
+        #  (DepartmentNotFoundError, если его нет).
 
         # Валидация происходит в момент создания CreateEmployee
 
-        return await self.db.employee.add(employee)
+        created = await self.db.employee.add(employee)
+        await record_changes(self.db, self.events, [
+            RecordChange(
+                entity=ChangeEntity.EMPLOYEE,
+                entity_id=created.id,
+                kind=ChangeKind.CREATED,
+                parent_id=created.department_id,
+                name=created.full_name,
+            )
+        ])
+        return created
 
     async def get_all_employees_into_department(self, department_id: int) -> List[ReadEmployee]:
         return await self.db.employee.get_all_employees_into_department(department_id)
+
+    async def get_all_employees_into_departments(self, department_ids: Iterable[int]) -> List[ReadEmployee]:
+        return await self.db.employee.get_all_employees_into_departments(department_ids)
+
+    async def search_employees(
+            self,
+            query: str,
+            within_department_id: int | None,
+            limit: int,
+            offset: int,
+    ) -> List[ReadEmployee]:
+        employees = await self.db.employee.search(query, within_department_id, limit, offset)
+
+        # Пустой результат может означать несуществующее подразделение - проверяем только в этом случае
+        if not employees and within_department_id is not None:
+            if not await self.db.department.is_exists(within_department_id):
+                raise DepartmentNotFoundError(within_department_id)
+
+        return employees
+
+    async def export_employees(
+            self,
+            within_department_id: int | None,
+            batch_size: int,
+    ) -> AsyncIterator[List[EmployeeRow]]:
+        # Проверка до начала ответа - чтобы вернуть 404, а не оборванный поток
+        if within_department_id is not None and not await self.db.department.is_exists(within_department_id):
+            raise DepartmentNotFoundError(within_department_id)
+        return self.db.employee.stream_rows(within_department_id, batch_size)
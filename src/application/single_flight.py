@@ -0,0 +1,120 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Склейка одинаковых конкурентных запросов (single-flight) и короткий кэш результатов.
+
+    Все вызовы ``run`` с одинаковым ключом, пришедшие пока первый вызов ещё считается,
+    ждут его результат, а не запускают вычисление заново. Готовый результат хранится
+    ``ttl`` секунд. ``invalidate`` сбрасывает кэш и отцепляет идущие вычисления: пришедшие
+    после сброса к ним не присоединяются, а их результат в кэш не попадает.
+    """
+
+    def __init__(self, ttl: float = 1.0, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self._cache: Dict[Hashable, Tuple[float, Any]] = {}
+        self._generation = 0
+
+        # Статистика
+        self.hits = 0       # результат взят из кэша
+        self.shared = 0     # дождались чужого вычисления
+        self.misses = 0     # вычисляли сами
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> T:
+        """
+        Получить результат для ключа: из кэша, из уже идущего вычисления или посчитав самим.
+
+        :param key: Ключ запроса (должен однозначно определять результат)
+        :param compute: Фабрика корутины, которая считает результат
+        :return: Результат вычисления
+        """
+        while True:
+            cached = self._cache.get(key)
+            if cached is not None:
+                expires_at, value = cached
+                if expires_at > time.monotonic():
+                    self.hits += 1
+                    return value
+                del self._cache[key]
+
+            future = self._in_flight.get(key)
+            if future is None:
+                break
+
+            try:
+                # shield: отмена одного ожидающего не должна отменять общее вычисление
+                result = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Отменили вычисляющего, а не нас - пробуем ещё раз
+                if future.cancelled() and not _current_task_cancelling():
+                    continue
+                raise
+            self.shared += 1
+            return result
+
+        self.misses += 1
+        generation = self._generation
+        future = asyncio.get_running_loop().create_future()
+        # Чтобы asyncio не ругался на исключение, которое никто не дождался
+        future.add_done_callback(_consume_exception)
+        self._in_flight[key] = future
+
+        try:
+            result = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            if self.ttl > 0 and generation == self._generation:
+                self._store(key, result)
+            return result
+        finally:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def invalidate(self) -> None:
+        """Сбросить кэш (вызывается после любых изменений данных)"""
+        self._generation += 1
+        self._cache.clear()
+        # Уже ждущие получат старый результат, новые вызовы считают заново.
+        # Вычисление само удаляет из _in_flight только свою запись.
+        self._in_flight.clear()
+
+    def clear(self) -> None:
+        """Полный сброс состояния (для тестов)"""
+        self.invalidate()
+        self.hits = 0
+        self.shared = 0
+        self.misses = 0
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        if len(self._cache) >= self.max_entries:
+            now = time.monotonic()
+            for k in [k for k, (expires_at, _) in self._cache.items() if expires_at <= now]:
+                del self._cache[k]
+            if len(self._cache) >= self.max_entries:
+                # Выкидываем самую старую запись
+                del self._cache[next(iter(self._cache))]
+        self._cache[key] = (time.monotonic() + self.ttl, value)
+
+
+def _consume_exception(future: asyncio.Future) -> None:
+    if not future.cancelled():
+        future.exception()
+
+
+def _current_task_cancelling() -> bool:
+    task = asyncio.current_task()
+    return task is not None and task.cancelling() > 0
@@ -0,0 +1,28 @@
+from typing import Protocol, List, Iterable
+
+from src.core.models.change import RecordChange, ReadChange
+
+
+class ChangeLogRepositoryProtocol(Protocol):
+
+    async def record(self, changes: Iterable[RecordChange]) -> List[ReadChange]:
+        """
+        Записать изменения в журнал одним INSERT в текущей транзакции.
+
+        Записи становятся видны вместе с самими изменениями (после коммита), а их id
+        возрастают в порядке коммитов - потребитель, читающий по курсору, ничего не пропустит.
+        В Postgres каждая запись после коммита публикуется в NOTIFY (для PgChangeListener).
+
+        :return: Записанные изменения с id.
+        """
+        ...
+
+    async def list_since(self, since: int, limit: int) -> List[ReadChange]:
+        """
+        Изменения после курсора (keyset-пагинация).
+
+        :param since: id последнего полученного изменения (0 - с начала журнала).
+        :param limit: Сколько изменений вернуть.
+        :return: Изменения по возрастанию id.
+        """
+        ...
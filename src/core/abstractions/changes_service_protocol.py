@@ -0,0 +1,10 @@
+from typing import Protocol, List
+
+from src.core.models.change import ReadChange
+
+
+class ChangesServiceProtocol(Protocol):
+
+    async def get_changes(self, since: int, limit: int) -> List[ReadChange]:
+        """Изменения после курсора since, по возрастанию id"""
+        ...
@@ -1,12 +1,12 @@
-from typing import Protocol, Optional, List
+from typing import Protocol, Optional, List, Dict, Iterable, Mapping
 
-from src.core.models.department import CreateDepartment, ReadDepartment, UpdateDepartment
+from src.core.models.department import CreateDepartment, ReadDepartment, UpdateDepartment, DepartmentWithPath
 
 
 class DepartmentRepositoryProtocol(Protocol):
 
     async def add(self, department: CreateDepartment) -> ReadDepartment:
-        """Создание подразделения."""
+        """Создание подразделения. Если родителя не существует, подразделение создаётся корневым."""
         ...
 
     async def get_by_id(self, department_id: int) -> Optional[ReadDepartment]:
@@ -17,6 +17,43 @@ class DepartmentRepositoryProtocol(Protocol):
         """Поиск дочерних подразделений"""
         ...
 
+    async def get_subtree(self, department_id: int, depth: int) -> List[ReadDepartment]:
+        """
+        Подразделение и его потомки до глубины depth одним запросом.
+
+        :param department_id: ID корня поддерева.
+        :param depth: Сколько уровней потомков брать (0 - только само подразделение).
+        :return: Корень первым, затем потомки в порядке обхода в глубину. Пустой список, если подразделения нет.
+        """
+        ...
+
+    async def get_subtrees(self, department_ids: Iterable[int], depth: int) -> Dict[int, List[ReadDepartment]]:
+        """
+        Поддеревья нескольких подразделений одним запросом (как get_subtree для каждого id).
+
+        :return: id -> поддерево (корень первым). Несуществующих id в словаре нет.
+        """
+        ...
+
+    async def get_ancestors(self, department_id: int) -> List[ReadDepartment]:
+        """
+        Цепочка от корня до подразделения одним запросом.
+
+        :param department_id: ID подразделения.
+        :return: Корень первым, само подразделение последним. Пустой список, если подразделения нет.
+        """
+        ...
+
+    async def search_by_name_prefix(self, prefix: str, limit: int) -> List[DepartmentWithPath]:
+        """
+        Поиск подразделений по началу названия (без учёта регистра) вместе с путём от корня.
+
+        :param prefix: Начало названия.
+        :param limit: Сколько подразделений вернуть.
+        :return: Подразделения в порядке названий, у каждого - предки от корня к родителю.
+        """
+        ...
+
     async def is_exists(self, department_id: int) -> bool:
         """Проверка, существует ли такое подразделение?"""
         ...
@@ -38,15 +75,32 @@ class DepartmentRepositoryProtocol(Protocol):
         ...
 
     async def update(self, department_id: int, depart: UpdateDepartment) -> ReadDepartment:
-        """Обновляет поля у указанного подразделения."""
+        """
+        Обновляет поля у указанного подразделения.
+
+        :raises DepartmentNotFoundError: Подразделение не найдено.
+        :raises ValueError: Новый родитель находится в поддереве подразделения или не существует.
+        """
+        ...
+
+    async def move_many(self, moves: Mapping[int, int | None]) -> List[ReadDepartment]:
+        """
+        Пакетное перемещение подразделений: два запроса на любое количество.
+
+        Связи загружаются одним запросом, итоговый граф проверяется в памяти,
+        изменения применяются одним UPDATE.
+
+        :param moves: id -> новый parent_id (None - сделать корневым).
+        :return: Обновлённые подразделения в порядке moves.
+        :raises DepartmentNotFoundError: Перемещаемое подразделение не найдено.
+        :raises ValueError: Новый родитель не существует, или после перемещения появится цикл.
+        """
         ...
 
     async def delete_with_cascade(self, department_id: int) -> bool:
         """
         Полное удаление подразделения и всех дочерних подразделений со всеми сотрудниками (каскадное).
 
-        Работает через ORM="all, delete-orphan".
-
         :param department_id: ID подразделения.
         :return: Удалось ли удалить?
         """
@@ -1,7 +1,7 @@
 from enum import Enum
-from typing import Protocol, List, Optional
+from typing import Protocol, List, Optional, Dict, Iterable, Mapping, Set
 
-from src.core.models.department import CreateDepartment, ReadDepartment, UpdateDepartment
+from src.core.models.department import CreateDepartment, ReadDepartment, UpdateDepartment, DepartmentWithPath
 
 class DeleteMode(str, Enum):
     CASCADE =  "cascade"
@@ -17,8 +17,31 @@ class DepartmentsServiceProtocol(Protocol):
     async def get_department_children(self, department_id: int) -> List[ReadDepartment]:
         ...
 
+    async def get_department_subtree(self, department_id: int, depth: int) -> List[ReadDepartment]:
+        """Подразделение (первым) и потомки до глубины depth; пустой список, если подразделения нет"""
+        ...
+
+    async def get_department_subtrees(self, department_ids: Iterable[int], depth: int) -> Dict[int, List[ReadDepartment]]:
+        """id -> поддерево (корень первым); несуществующих id в словаре нет"""
+        ...
+
+    async def get_department_subtree_ids(self, department_id: int) -> Set[int]:
+        """id подразделения и всех его потомков (без ограничения глубины); пустое множество, если подразделения нет"""
+        ...
+
+    async def get_department_ancestors(self, department_id: int) -> List[ReadDepartment]:
+        """Цепочка от корня до подразделения (включительно); пустой список, если подразделения нет"""
+        ...
+
+    async def search_departments(self, prefix: str, limit: int) -> List[DepartmentWithPath]:
+        ...
+
     async def update_department(self, department_id: int, update_dto: UpdateDepartment) -> ReadDepartment:
         ...
 
+    async def move_departments(self, moves: Mapping[int, int | None]) -> List[ReadDepartment]:
+        """Пакетное перемещение (id -> новый parent_id) в одной транзакции; всё или ничего"""
+        ...
+
     async def delete_department(self, department_id: int, mode: DeleteMode, reassign_to_department_id: int | None) -> str:
         ...
\ No newline at end of file
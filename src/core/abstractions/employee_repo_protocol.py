@@ -1,6 +1,6 @@
-from typing import Protocol, Optional
+from typing import Protocol, Optional, Iterable, AsyncIterator, List
 
-from src.core.models.employee import CreateEmployee, ReadEmployee
+from src.core.models.employee import CreateEmployee, ReadEmployee, EmployeeRow
 
 
 class EmployeeRepositoryProtocol(Protocol):
@@ -10,6 +10,7 @@ class EmployeeRepositoryProtocol(Protocol):
         Создание сотрудника и добавление его в подразделение
         :param employee: Новый сотрудник
         :return: Созданный сотрудник
+        :raises DepartmentNotFoundError: Подразделение не найдено.
         """
         ...
 
@@ -29,10 +30,51 @@ class EmployeeRepositoryProtocol(Protocol):
         """
         ...
 
+    async def get_all_employees_into_departments(self, department_ids: Iterable[int]) -> list[ReadEmployee]:
+        """
+        Получить сотрудников нескольких подразделений одним запросом.
+        :param department_ids: ID подразделений.
+        :return: Список сотрудников, отсортированный по дате создания.
+        """
+        ...
+
+    async def search(
+            self,
+            query: str,
+            within_department_id: int | None = None,
+            limit: int = 20,
+            offset: int = 0,
+    ) -> list[ReadEmployee]:
+        """
+        Поиск сотрудников по подстроке в ФИО или должности, самые похожие - первыми.
+        :param query: Строка поиска.
+        :param within_department_id: Искать только в этом подразделении и его потомках.
+        :param limit: Сколько сотрудников вернуть.
+        :param offset: Сколько первых результатов пропустить.
+        :return: Список сотрудников.
+        """
+        ...
+
+    def stream_rows(self, within_department_id: int | None, batch_size: int) -> AsyncIterator[List[EmployeeRow]]:
+        """
+        Все сотрудники пачками по batch_size строк (курсор на стороне сервера, память не растёт).
+        :param within_department_id: Только это подразделение и его потомки.
+        :param batch_size: Строк в пачке.
+        :return: Пачки строк в порядке id, поля - EMPLOYEE_ROW_FIELDS.
+        """
+        ...
+
     async def is_exists(self, employee_id: int) -> bool:
         """Проверка, существует ли такой сотрудник?"""
         ...
 
+    async def reassign_department(self, from_department_id: int, to_department_id: int) -> list[int]:
+        """
+        Перевести всех сотрудников одного подразделения в другое.
+        :return: ID переведённых сотрудников.
+        """
+        ...
+
     async def delete(self, employee_id: int) -> bool:
         """
         Удаляет сотрудника по id.
@@ -1,6 +1,6 @@
-from typing import Protocol, List
+from typing import Protocol, List, Iterable, AsyncIterator
 
-from src.core.models.employee import ReadEmployee, CreateEmployee
+from src.core.models.employee import ReadEmployee, CreateEmployee, EmployeeRow
 
 
 class EmployeesServiceProtocol(Protocol):
@@ -10,3 +10,27 @@ class EmployeesServiceProtocol(Protocol):
 
     async def get_all_employees_into_department(self, department_id: int) -> List[ReadEmployee]:
         ...
+
+    async def get_all_employees_into_departments(self, department_ids: Iterable[int]) -> List[ReadEmployee]:
+        ...
+
+    async def search_employees(
+            self,
+            query: str,
+            within_department_id: int | None,
+            limit: int,
+            offset: int,
+    ) -> List[ReadEmployee]:
+        """:raises DepartmentNotFoundError: Подразделение within_department_id не найдено."""
+        ...
+
+    async def export_employees(
+            self,
+            within_department_id: int | None,
+            batch_size: int,
+    ) -> AsyncIterator[List[EmployeeRow]]:
+        """
+        Пачки строк для выгрузки. Существование подразделения проверяется сразу, строки - по мере чтения.
+        :raises DepartmentNotFoundError: Подразделение within_department_id не найдено.
+        """
+        ...
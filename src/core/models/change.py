@@ -0,0 +1,33 @@
+import datetime
+from enum import Enum
+
+from pydantic import BaseModel
+
+
+class ChangeEntity(str, Enum):
+    DEPARTMENT = "department"
+    EMPLOYEE = "employee"
+
+
+class ChangeKind(str, Enum):
+    CREATED = "created"
+    MOVED = "moved"      # новый родитель (для сотрудника - новое подразделение)
+    RENAMED = "renamed"
+    DELETED = "deleted"
+
+
+class RecordChange(BaseModel):
+    """Изменение для записи в журнал"""
+    entity: ChangeEntity
+    entity_id: int
+    kind: ChangeKind
+    parent_id: int | None = None  # подразделение: родитель; сотрудник: его подразделение
+    # Перевод сотрудника (MOVED): подразделение, из которого он ушёл - подписчики на поддерево
+    #  источника узнают, что сотрудник его покинул
+    previous_parent_id: int | None = None
+    name: str | None = None       # подразделение: название; сотрудник: ФИО
+
+
+class ReadChange(RecordChange):
+    id: int  # курсор: возрастает в порядке фиксации транзакций
+    created_at: datetime.datetime
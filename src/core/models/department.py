@@ -1,7 +1,10 @@
 import datetime
+from typing import List, Dict, Mapping
 
 from pydantic import BaseModel
 
+from src.errors import DepartmentNotFoundError
+
 NAME_MAX_LENGTH = 250
 
 class CreateDepartment(BaseModel):
@@ -21,6 +24,17 @@ class ReadDepartment(BaseModel):
     created_at: datetime.datetime
 
 
+class DepartmentPathItem(BaseModel):
+    """Элемент пути (хлебных крошек) к подразделению"""
+    id: int
+    name: str
+
+
+class DepartmentWithPath(BaseModel):
+    department: ReadDepartment
+    path: List[DepartmentPathItem]  # предки от корня к родителю
+
+
 def create_department(
         name: str,
         parent_id: int | None = None,
@@ -71,4 +85,45 @@ def create_update_department(
     return UpdateDepartment(
         name=name,
         parent_id=parent_id,
-    ), errors_str
\ No newline at end of file
+    ), errors_str
+
+
+def validate_moves(parents: Mapping[int, int | None], moves: Mapping[int, int | None]) -> Dict[int, int | None]:
+    """
+    Проверка пакетного перемещения на итоговом графе, без запросов в БД
+
+    :param parents: id -> текущий parent_id для перемещаемых подразделений, новых родителей и всех их предков
+    :param moves: id -> новый parent_id
+    :return: Итоговые родители (id -> parent_id) для всех известных подразделений
+    :raises DepartmentNotFoundError: Перемещаемого подразделения нет
+    :raises ValueError: Нового родителя нет, или после перемещения появится цикл
+    """
+
+    for department_id in moves:
+        if department_id not in parents:
+            raise DepartmentNotFoundError(department_id)
+    for department_id, parent_id in moves.items():
+        if parent_id is not None and parent_id not in parents:
+            raise ValueError(f'ID: {parent_id}, такое родительское подразделение не найдено!')
+
+    final_parents = {**parents, **moves}
+
+    # Поднимаемся от каждого перемещённого узла к корню по итоговым родителям.
+    #  Узлы, от которых корень уже достигнут, запоминаем - каждый узел проходится один раз.
+    reaches_root: set[int] = set()
+    for department_id in moves:
+        path: List[int] = []
+        on_path: set[int] = set()
+        current = department_id
+        while current is not None and current not in reaches_root:
+            if current in on_path:
+                raise ValueError(
+                    f"Нельзя переместить подразделения: департамент {current} "
+                    f"оказался бы в собственном поддереве"
+                )
+            path.append(current)
+            on_path.add(current)
+            current = final_parents.get(current)
+        reaches_root.update(path)
+
+    return final_parents
@@ -1,4 +1,5 @@
 import datetime
+from typing import Tuple
 
 from pydantic import BaseModel
 
@@ -21,6 +22,11 @@ class ReadEmployee(BaseModel):
     created_at: datetime.datetime
 
 
+# Строка выгрузки: кортеж без модели - на сотнях тысяч строк создание ReadEmployee дороже самой выгрузки
+EmployeeRow = Tuple[int, int, str, str, datetime.date | None, datetime.datetime]
+EMPLOYEE_ROW_FIELDS = ("id", "department_id", "full_name", "position", "hired_at", "created_at")
+
+
 def create_employee(
     department_id: int,
     full_name: str,
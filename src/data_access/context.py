@@ -1,12 +1,19 @@
-from typing import Optional, Self, AsyncGenerator
+from typing import Optional, Self, AsyncGenerator, Callable, List
 
+from fastapi import Request
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.core.abstractions.change_log_repo_protocol import ChangeLogRepositoryProtocol
 from src.core.abstractions.department_repo_protocol import DepartmentRepositoryProtocol
 from src.core.abstractions.employee_repo_protocol import EmployeeRepositoryProtocol
+from src.data_access.repositories.asyncpg_department_repository import AsyncpgDepartmentRepository
+from src.data_access.repositories.asyncpg_employee_repository import AsyncpgEmployeeRepository
+from src.data_access.repositories.change_log_repository import ChangeLogRepository
 from src.data_access.repositories.department_repository import DepartmentRepository
 from src.data_access.repositories.employee_repository import EmployeeRepository
 from src.data_access.session import get_session_maker
+from src.settings import get_settings
 
 
 class DbContext:
@@ -14,40 +21,97 @@ class DbContext:
     Контекст базы данных.
 
     Управляет транзакциями и предоставляет доступ к репозиториям.
+
+    Сессия создаётся лениво - при первом обращении к репозиториям, а соединение из пула
+    SQLAlchemy берёт только на первом запросе. Поэтому запросы, завершившиеся на
+    валидации (404/422), соединение не занимают.
     """
 
-    def __init__(self, session: AsyncSession):
-        self.session = session
+    def __init__(
+            self,
+            session: AsyncSession | None = None,
+            session_factory: Callable[[], AsyncSession] | None = None,
+            read_only: bool = False,
+            statement_timeout_ms: int | None = None,
+            raw_reads: bool | None = None,
+    ):
+        if session is None and session_factory is None:
+            raise ValueError("DbContext requires session or session_factory")
+
+        self._session = session
+        self._session_factory = session_factory
+        # Только чтение: коммит на выходе не нужен
+        self.read_only = read_only
+        # Своё ограничение времени запросов для транзакции (SET LOCAL statement_timeout)
+        self.statement_timeout_ms = statement_timeout_ms
+        # Репозитории с чтениями через asyncpg (по умолчанию - из настройки DB_RAW_READS)
+        self.raw_reads = get_settings().db_raw_reads if raw_reads is None else raw_reads
 
         self._department_repo: Optional[DepartmentRepositoryProtocol] = None
         self._employee_repo: Optional[EmployeeRepositoryProtocol] = None
+        self._change_log_repo: Optional[ChangeLogRepositoryProtocol] = None
         self._committed = False
+        self._after_commit: List[Callable[[], None]] = []
+
+    @property
+    def session(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._session_factory()
+            # В AUTOCOMMIT (чтение) SET LOCAL бесполезен: там действует значение из настроек подключения
+            if self.statement_timeout_ms and not self.read_only:
+                _set_local_statement_timeout(self._session, self.statement_timeout_ms)
+        return self._session
+
+    @property
+    def has_session(self) -> bool:
+        """Была ли сессия уже создана"""
+        return self._session is not None
 
     @property
     def department(self) -> DepartmentRepositoryProtocol:
         if self._department_repo is None:
-            self._department_repo = DepartmentRepository(self.session)
+            repo_class = AsyncpgDepartmentRepository if self.raw_reads else DepartmentRepository
+            self._department_repo = repo_class(self.session)
         return self._department_repo
 
     @property
     def employee(self) -> EmployeeRepositoryProtocol:
         if self._employee_repo is None:
-            self._employee_repo = EmployeeRepository(self.session)
+            repo_class = AsyncpgEmployeeRepository if self.raw_reads else EmployeeRepository
+            self._employee_repo = repo_class(self.session)
         return self._employee_repo
 
+    @property
+    def changes(self) -> ChangeLogRepositoryProtocol:
+        if self._change_log_repo is None:
+            self._change_log_repo = ChangeLogRepository(self.session)
+        return self._change_log_repo
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        """Вызвать callback после успешного коммита (при откате - не вызывается)"""
+        self._after_commit.append(callback)
+
     async def commit(self) -> None:
         """Зафиксировать транзакцию"""
-        await self.session.commit()
+        if self._session is not None:
+            await self._session.commit()
         self._committed = True
 
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+
     async def rollback(self) -> None:
         """Откатить транзакцию"""
-        await self.session.rollback()
+        if self._session is not None:
+            await self._session.rollback()
         self._committed = False
+        self._after_commit = []
 
     async def close(self) -> None:
         """Закрыть сессию"""
-        await self.session.close()
+        if self._session is not None:
+            await self._session.close()
 
     async def __aenter__(self) -> Self:
         return self
@@ -56,16 +120,61 @@ class DbContext:
         if exc_type is not None:
             # При ошибке откатываем транзакцию
             await self.rollback()
-        elif not self._committed:
+        elif not self._committed and not self.read_only:
             # Если не было коммита - коммитим автоматически
             await self.commit()
         await self.close()
 
 
-async def get_db_context() -> AsyncGenerator[DbContext, None]:
+def _set_local_statement_timeout(session: AsyncSession, timeout_ms: int) -> None:
+    """SET LOCAL statement_timeout в начале каждой транзакции сессии (только Postgres)"""
+
+    @event.listens_for(session.sync_session, "after_begin")
+    def set_timeout(_session, _transaction, connection) -> None:
+        if connection.dialect.name == "postgresql":
+            connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+
+
+# Методы, которые ничего не меняют - их можно отдавать репликам
+READ_ONLY_METHODS = frozenset({"GET", "HEAD"})
+
+
+def read_only_endpoint(endpoint: Callable) -> Callable:
+    """
+    Пометить обработчик как только читающий, даже если это не GET (например, POST с телом-запросом).
+
+    Такие запросы, как и GET, получают сессию на реплике без транзакции.
+
+    Пример:
+    ```python
+    @app.post("/departments/batch-get")
+    @read_only_endpoint
+    async def batch_get(...):
+        ...
+    ```
+    """
+    endpoint.read_only = True
+    return endpoint
+
+
+def _is_read_only(request: Request) -> bool:
+    if request.method in READ_ONLY_METHODS:
+        return True
+    # scope["route"] выставляется при сопоставлении маршрута, до вызова зависимостей
+    endpoint = getattr(request.scope.get("route"), "endpoint", None)
+    return getattr(endpoint, "read_only", False)
+
+
+async def get_db_context(request: Request) -> AsyncGenerator[DbContext, None]:
     """
     Dependency для FastAPI.
 
+    Один DbContext на запрос: FastAPI кэширует зависимость, поэтому сервисы,
+    которые зависят от get_db_context, получают один и тот же объект.
+
+    Читающие запросы (GET/HEAD и обработчики с @read_only_endpoint) получают сессию на реплике
+    (если они настроены), остальные - на primary. Читающие сессии работают в AUTOCOMMIT: без BEGIN/COMMIT.
+
     Пример использования:
     ```python
     @app.post("/users")
@@ -75,11 +184,24 @@ async def get_db_context() -> AsyncGenerator[DbContext, None]:
     ```
     :return:
     """
-    session_maker = get_session_maker()
-    async with session_maker() as session:
-        async with DbContext(session) as db:
-            try:
-                yield db
-            except Exception:
-                await db.rollback()
-                raise
+    read_only = _is_read_only(request)
+
+    def session_factory() -> AsyncSession:
+        # Реплика выбирается в момент первого обращения к БД
+        return get_session_maker(read_only=read_only)()
+
+    # Только явно настроенные маршруты: значение по умолчанию уже выставлено при подключении
+    route_path = getattr(request.scope.get("route"), "path", None)
+    timeout = get_settings().request_timeouts.get(f"{request.method} {route_path}")
+    statement_timeout_ms = int(timeout * 1000) if timeout else None
+
+    async with DbContext(
+            session_factory=session_factory,
+            read_only=read_only,
+            statement_timeout_ms=statement_timeout_ms,
+    ) as db:
+        try:
+            yield db
+        except Exception:
+            await db.rollback()
+            raise
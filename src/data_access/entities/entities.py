@@ -1,6 +1,6 @@
 import datetime
 
-from sqlalchemy import String, ForeignKey, DateTime, Date, TIMESTAMP
+from sqlalchemy import String, ForeignKey, DateTime, Date, TIMESTAMP, Index, DDL, event, func, BigInteger, Integer
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.data_access.base import Base
@@ -18,7 +18,8 @@ class Department(Base):
     name: Mapped[str] = mapped_column(String(200), nullable=False)
     parent_id: Mapped[int | None] = mapped_column(
         ForeignKey('departments.id', ondelete='SET NULL'),
-        nullable=True
+        nullable=True,
+        index=True,  # Обход поддерева вниз: JOIN по parent_id
     )
     created_at: Mapped[datetime.datetime] = mapped_column(
         TIMESTAMP(timezone=True),
@@ -49,16 +50,37 @@ class Department(Base):
     )
 
 
+# Поиск по началу названия без учёта регистра: lower(name) LIKE 'abc%'.
+#  text_pattern_ops нужен, чтобы LIKE по префиксу использовал индекс при любой локали базы.
+Index(
+    'ix_departments_name_lower_pattern',
+    func.lower(Department.name).label('name_lower'),
+    postgresql_ops={'name_lower': 'text_pattern_ops'},
+)
+
+
 class Employee(Base):
     """
     Сотрудник
     """
     __tablename__ = 'employees'
+    __table_args__ = (
+        # Поиск по подстроке и по похожести (GET /employees/search) - триграммы pg_trgm
+        Index(
+            'ix_employees_full_name_trgm', 'full_name',
+            postgresql_using='gin', postgresql_ops={'full_name': 'gin_trgm_ops'},
+        ),
+        Index(
+            'ix_employees_position_trgm', 'position',
+            postgresql_using='gin', postgresql_ops={'position': 'gin_trgm_ops'},
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     department_id: Mapped[int | None] = mapped_column(
         ForeignKey('departments.id', ondelete='SET NULL'),
         nullable=True,
+        index=True,  # Сотрудники поддерева: department_id IN (...)
     )
     full_name: Mapped[str] = mapped_column(String(200), nullable=False)
     position: Mapped[str] = mapped_column(String(200), nullable=False)
@@ -68,4 +90,31 @@ class Employee(Base):
         default=utc_now
     )
 
-    department: Mapped[Department] = relationship(back_populates='employees')
\ No newline at end of file
+    department: Mapped[Department] = relationship(back_populates='employees')
+
+class ChangeLog(Base):
+    """
+    Журнал изменений подразделений и сотрудников (GET /changes)
+    """
+    __tablename__ = 'change_log'
+
+    # Курсор для потребителей. В SQLite автоинкремент есть только у INTEGER PRIMARY KEY
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True)
+    entity: Mapped[str] = mapped_column(String(20), nullable=False)
+    entity_id: Mapped[int] = mapped_column(nullable=False)
+    kind: Mapped[str] = mapped_column(String(20), nullable=False)
+    # Без внешних ключей: записи живут дольше удалённых подразделений
+    parent_id: Mapped[int | None] = mapped_column(nullable=True)
+    previous_parent_id: Mapped[int | None] = mapped_column(nullable=True)
+    name: Mapped[str | None] = mapped_column(String(200), nullable=True)
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        TIMESTAMP(timezone=True),
+        default=utc_now
+    )
+
+# Триграммные индексы требуют расширения pg_trgm (для Base.metadata.create_all; в миграциях - отдельно)
+event.listen(
+    Base.metadata,
+    'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'),
+)
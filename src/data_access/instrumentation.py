@@ -0,0 +1,94 @@
+import time
+from contextvars import ContextVar, Token
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Сколько запросов запоминать с текстом SQL (для лога медленных запросов)
+MAX_CAPTURED_STATEMENTS = 50
+
+
+class QueryStats:
+    """Статистика SQL-запросов в рамках одного HTTP-запроса"""
+
+    __slots__ = ("count", "total_time", "slowest_time", "slowest_statement", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement: Optional[str] = None
+        # (SQL, секунды) - первые MAX_CAPTURED_STATEMENTS запросов
+        self.statements: List[Tuple[str, float]] = []
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.total_time += elapsed
+        if elapsed >= self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest_statement = statement
+        if len(self.statements) < MAX_CAPTURED_STATEMENTS:
+            self.statements.append((statement, elapsed))
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def start_query_stats() -> Tuple[QueryStats, Token]:
+    """
+    Начать сбор статистики для текущего контекста (запроса).
+
+    Пример:
+    ```python
+    stats, token = start_query_stats()
+    try:
+        ...
+    finally:
+        stop_query_stats(token)
+    ```
+    """
+    stats = QueryStats()
+    return stats, _current_stats.set(stats)
+
+
+def stop_query_stats(token: Token) -> None:
+    _current_stats.reset(token)
+
+
+def get_query_stats() -> Optional[QueryStats]:
+    """Статистика текущего запроса (None, если сбор не запущен)"""
+    return _current_stats.get()
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Подписаться на выполнение запросов движка и писать их в статистику текущего запроса"""
+    sync_engine = engine.sync_engine
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    start = conn.info["query_start_time"].pop()
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, time.perf_counter() - start)
+
+
+def _handle_error(context) -> None:
+    # Упавший запрос тоже учитываем, иначе стек времён старта разъедется
+    conn = context.connection
+    if conn is None or not conn.info.get("query_start_time"):
+        return
+    start = conn.info["query_start_time"].pop()
+    stats = _current_stats.get()
+    if stats is not None and context.statement is not None:
+        stats.record(context.statement, time.perf_counter() - start)
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+from typing import Callable
+
+from sqlalchemy import make_url
+
+from src.core.models.change import ReadChange
+
+logger = logging.getLogger("app.events")
+
+# Канал NOTIFY, в который журнал изменений публикует каждую запись (см. ChangeLogRepository.record)
+CHANGES_CHANNEL = "org_changes"
+
+
+class PgChangeListener:
+    """
+    Мост LISTEN/NOTIFY: изменения, зафиксированные любым воркером, доставляются во все процессы.
+
+    Держит отдельное соединение asyncpg (не из пула) и переподключается при обрыве.
+    Пока соединения нет, ``on_state(False)``: процесс рассылает свои изменения сам.
+
+    Пример:
+    ```python
+    listener = PgChangeListener(
+        settings.database_url,
+        on_change=lambda change: hub.publish([change]),
+        on_state=lambda connected: setattr(hub, "bridged", connected),
+    )
+    task = asyncio.create_task(listener.run())
+    ```
+    """
+
+    def __init__(
+            self,
+            database_url: str,
+            on_change: Callable[[ReadChange], None],
+            on_state: Callable[[bool], None],
+            retry_interval: float = 5.0,
+    ):
+        # asyncpg принимает обычный DSN без "+asyncpg"
+        self.dsn = make_url(database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self.on_change = on_change
+        self.on_state = on_state
+        self.retry_interval = retry_interval
+
+    def _notified(self, connection, pid: int, channel: str, payload: str) -> None:
+        try:
+            change = ReadChange.model_validate_json(payload)
+        except ValueError:
+            logger.exception("bad change notification: %s", payload)
+            return
+        self.on_change(change)
+
+    async def run(self) -> None:
+        import asyncpg
+
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(CHANGES_CHANNEL, self._notified)
+                self.on_state(True)
+                await closed.wait()
+                logger.warning("change listener connection lost, reconnecting")
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.warning("change listener cannot connect: %s", e)
+            finally:
+                self.on_state(False)
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(self.retry_interval)
@@ -0,0 +1,45 @@
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
+
+# QueuePool._do_get вызывает сам себя при гонке за overflow - считаем только внешний вызов
+_in_checkout: ContextVar[bool] = ContextVar("_in_checkout", default=False)
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений, который считает, сколько запросы ждут соединение.
+
+    Время ожидания включает создание нового соединения, если свободного в пуле не было.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        if _in_checkout.get():
+            return super()._do_get()
+
+        token = _in_checkout.set(True)
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            _in_checkout.reset(token)
+
+        # Только выданные соединения: таймауты считаются отдельно и не портят среднее ожидание
+        waited = time.perf_counter() - start
+        self.checkouts += 1
+        self.wait_time_total += waited
+        if waited > self.wait_time_max:
+            self.wait_time_max = waited
+        return connection
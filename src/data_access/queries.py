@@ -0,0 +1,25 @@
+from sqlalchemy import select, CTE, BindParameter
+
+from src.data_access.entities.entities import Department
+
+
+def subtree_ids_cte(department_id: int | BindParameter, name: str = "subtree") -> CTE:
+    """
+    Рекурсивный CTE с id подразделения и всех его потомков (колонка ``id``).
+
+    Для запросов, которые строятся один раз, вместо id передаётся ``bindparam``.
+
+    Пример:
+    ```python
+    subtree = subtree_ids_cte(department_id)
+    select(Employee).where(Employee.department_id.in_(select(subtree.c.id)))
+    ```
+    """
+    subtree = (
+        select(Department.id)
+        .where(Department.id == department_id)
+        .cte(name=name, recursive=True)
+    )
+    return subtree.union_all(
+        select(Department.id).join(subtree, Department.parent_id == subtree.c.id)
+    )
@@ -0,0 +1,47 @@
+import time
+from typing import Any, List
+
+import asyncpg
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.data_access.instrumentation import get_query_stats
+
+
+async def raw_connection(session: AsyncSession) -> asyncpg.Connection | None:
+    """
+    Соединение asyncpg под сессией - то же, что взято из пула SQLAlchemy.
+
+    None, если запрос надо выполнить через ORM:
+    - драйвер не asyncpg (например, SQLite в тестах);
+    - сессия в транзакции. Адаптер SQLAlchemy открывает BEGIN лениво, перед первым своим запросом:
+      запрос в обход него мог бы выполниться вне транзакции и без SET LOCAL statement_timeout.
+      Читающие сессии (GET, @read_only_endpoint) работают в AUTOCOMMIT, им это не грозит.
+    """
+    if session.get_bind().dialect.driver != "asyncpg":
+        return None
+    connection = await session.connection()
+    adapted = (await connection.get_raw_connection()).dbapi_connection
+    if not adapted.autocommit:
+        return None
+    return adapted.driver_connection
+
+
+async def fetch(connection: asyncpg.Connection, statement: str, *args: Any) -> List[asyncpg.Record]:
+    """
+    ``connection.fetch`` с учётом в статистике запросов (Server-Timing, лог медленных запросов).
+
+    Ошибки asyncpg оборачиваются в DBAPIError, как у SQLAlchemy: их разбирают общие
+    обработчики (statement_timeout - 504, потерянное соединение - 503).
+    """
+    start = time.perf_counter()
+    try:
+        return await connection.fetch(statement, *args)
+    except asyncpg.PostgresError as e:
+        raise DBAPIError(statement, args, e) from e
+    except (asyncpg.InterfaceError, ConnectionError) as e:
+        raise DBAPIError(statement, args, e, connection_invalidated=connection.is_closed()) from e
+    finally:
+        stats = get_query_stats()
+        if stats is not None:
+            stats.record(statement, time.perf_counter() - start)
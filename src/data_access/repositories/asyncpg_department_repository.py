@@ -0,0 +1,82 @@
+from typing import Optional, List, Dict, Iterable
+
+from src.core.models.department import ReadDepartment
+from src.data_access.raw import raw_connection, fetch
+from src.data_access.repositories.department_repository import DepartmentRepository, depth_first_subtrees
+
+# Тот же SQL, что собирают запросы DepartmentRepository, но записанный руками:
+#  asyncpg сам кэширует prepared statements по тексту запроса.
+GET_BY_ID_SQL = "SELECT id, name, parent_id, created_at FROM departments WHERE id = $1"
+
+GET_CHILDREN_SQL = "SELECT id, name, parent_id, created_at FROM departments WHERE parent_id = $1"
+
+GET_SUBTREES_SQL = """
+WITH RECURSIVE subtree(id, name, parent_id, created_at, level) AS (
+    SELECT id, name, parent_id, created_at, 0
+    FROM departments
+    WHERE id = ANY($1::integer[])
+    UNION ALL
+    SELECT d.id, d.name, d.parent_id, d.created_at, s.level + 1
+    FROM departments d JOIN subtree s ON d.parent_id = s.id
+    WHERE s.level < $2
+)
+SELECT DISTINCT id, name, parent_id, created_at FROM subtree ORDER BY id
+"""
+
+GET_ANCESTORS_SQL = """
+WITH RECURSIVE ancestors(id, name, parent_id, created_at, level) AS (
+    SELECT id, name, parent_id, created_at, 0
+    FROM departments
+    WHERE id = $1
+    UNION ALL
+    SELECT d.id, d.name, d.parent_id, d.created_at, a.level + 1
+    FROM departments d JOIN ancestors a ON d.id = a.parent_id
+)
+SELECT id, name, parent_id, created_at FROM ancestors ORDER BY level DESC
+"""
+
+
+class AsyncpgDepartmentRepository(DepartmentRepository):
+    """
+    Репозиторий подразделений с самыми частыми чтениями напрямую через asyncpg.
+
+    Сессия, identity map и обработка результата в ORM на чтении поддерева стоят больше CPU,
+    чем сам Postgres. Здесь запросы идут в соединение asyncpg из того же пула, а модели
+    собираются прямо из записей. Остальные методы (и эти же в транзакции или не на Postgres) -
+    от DepartmentRepository. Включается настройкой DB_RAW_READS.
+    """
+
+    async def get_by_id(self, department_id: int) -> Optional[ReadDepartment]:
+        connection = await raw_connection(self.session)
+        if connection is None:
+            return await super().get_by_id(department_id)
+
+        rows = await fetch(connection, GET_BY_ID_SQL, department_id)
+        return ReadDepartment(**rows[0]) if rows else None
+
+    async def get_children(self, department_id: int) -> List[ReadDepartment]:
+        connection = await raw_connection(self.session)
+        if connection is None:
+            return await super().get_children(department_id)
+
+        rows = await fetch(connection, GET_CHILDREN_SQL, department_id)
+        return [ReadDepartment(**row) for row in rows]
+
+    async def get_subtrees(self, department_ids: Iterable[int], depth: int) -> Dict[int, List[ReadDepartment]]:
+        department_ids = list(dict.fromkeys(department_ids))
+        if not department_ids:
+            return {}
+        connection = await raw_connection(self.session)
+        if connection is None:
+            return await super().get_subtrees(department_ids, depth)
+
+        rows = await fetch(connection, GET_SUBTREES_SQL, department_ids, depth)
+        return depth_first_subtrees(department_ids, (ReadDepartment(**row) for row in rows), depth)
+
+    async def get_ancestors(self, department_id: int) -> List[ReadDepartment]:
+        connection = await raw_connection(self.session)
+        if connection is None:
+            return await super().get_ancestors(department_id)
+
+        rows = await fetch(connection, GET_ANCESTORS_SQL, department_id)
+        return [ReadDepartment(**row) for row in rows]
@@ -0,0 +1,44 @@
+from typing import Optional, Iterable
+
+from src.core.models.employee import ReadEmployee
+from src.data_access.raw import raw_connection, fetch
+from src.data_access.repositories.employee_repository import EmployeeRepository
+
+GET_BY_ID_SQL = """
+SELECT id, department_id, full_name, position, hired_at, created_at
+FROM employees
+WHERE id = $1
+"""
+
+GET_IN_DEPARTMENTS_SQL = """
+SELECT id, department_id, full_name, position, hired_at, created_at
+FROM employees
+WHERE department_id = ANY($1::integer[])
+ORDER BY created_at, id
+"""
+
+
+class AsyncpgEmployeeRepository(EmployeeRepository):
+    """
+    Репозиторий сотрудников со списками сотрудников подразделений напрямую через asyncpg
+    (подробнее - в AsyncpgDepartmentRepository). Включается настройкой DB_RAW_READS.
+    """
+
+    async def get_by_id(self, employee_id: int) -> Optional[ReadEmployee]:
+        connection = await raw_connection(self.session)
+        if connection is None:
+            return await super().get_by_id(employee_id)
+
+        rows = await fetch(connection, GET_BY_ID_SQL, employee_id)
+        return ReadEmployee(**rows[0]) if rows else None
+
+    async def get_all_employees_into_departments(self, department_ids: Iterable[int]) -> list[ReadEmployee]:
+        department_ids = list(department_ids)
+        if not department_ids:
+            return []
+        connection = await raw_connection(self.session)
+        if connection is None:
+            return await super().get_all_employees_into_departments(department_ids)
+
+        rows = await fetch(connection, GET_IN_DEPARTMENTS_SQL, department_ids)
+        return [ReadEmployee(**row) for row in rows]
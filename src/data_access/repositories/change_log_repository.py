@@ -0,0 +1,110 @@
+from typing import List, Iterable
+
+from sqlalchemy import select, insert, values, column, cast, true, func, bindparam, Integer, String, Text, TIMESTAMP
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.abstractions.change_log_repo_protocol import ChangeLogRepositoryProtocol
+from src.core.models.change import RecordChange, ReadChange
+from src.data_access.entities.entities import ChangeLog, utc_now
+from src.data_access.notifications import CHANGES_CHANNEL
+
+# Ключ pg_advisory_xact_lock, которым сериализуются записи в журнал
+CHANGE_LOG_LOCK_KEY = 0x6368616E
+
+CHANGE_LOG_COLUMNS = ("entity", "entity_id", "kind", "parent_id", "previous_parent_id", "name", "created_at")
+
+CHANGE_LOG_RETURNING = (
+    ChangeLog.id, ChangeLog.entity, ChangeLog.entity_id, ChangeLog.kind,
+    ChangeLog.parent_id, ChangeLog.previous_parent_id, ChangeLog.name, ChangeLog.created_at,
+)
+
+# Строится один раз: догоняющие подписчики SSE вызывают его часто
+LIST_SINCE = (
+    select(*CHANGE_LOG_RETURNING)
+    .where(ChangeLog.id > bindparam("since", type_=Integer))
+    .order_by(ChangeLog.id)
+    .limit(bindparam("limit", type_=Integer))
+)
+
+
+class ChangeLogRepository(ChangeLogRepositoryProtocol):
+    """Репозиторий журнала изменений"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def record(self, changes: Iterable[RecordChange]) -> List[ReadChange]:
+        now = utc_now()
+        rows = [
+            (
+                change.entity.value, change.entity_id, change.kind.value,
+                change.parent_id, change.previous_parent_id, change.name, now,
+            )
+            for change in changes
+        ]
+        if not rows:
+            return []
+
+        if self.session.get_bind().dialect.name != "postgresql":
+            # SQLite и так пропускает писателей по одному
+            result = await self.session.execute(
+                insert(ChangeLog)
+                .values([dict(zip(CHANGE_LOG_COLUMNS, row)) for row in rows])
+                .returning(*CHANGE_LOG_RETURNING)
+            )
+            return _read_changes(result.all())
+
+        # id из sequence выдаются в момент INSERT, а видны после COMMIT: без блокировки транзакция
+        #  с меньшим id может закоммититься позже, и читатель, ушедший курсором дальше, её пропустит.
+        #  pg_advisory_xact_lock держится до конца транзакции, поэтому id коммитятся по порядку.
+        #  Блокировка взята в том же INSERT (через CTE), отдельного запроса нет.
+        lock = select(func.pg_advisory_xact_lock(CHANGE_LOG_LOCK_KEY).label("locked")).cte("change_log_lock")
+        data = (
+            values(
+                column("entity", String), column("entity_id", Integer), column("kind", String),
+                column("parent_id", Integer), column("previous_parent_id", Integer), column("name", String),
+                column("created_at", TIMESTAMP(timezone=True)),
+                name="changes",
+            )
+            .data(rows)
+            .cte("changes")
+        )
+        # NOTIFY для других воркеров (PgChangeListener) - тоже в RETURNING, без отдельного запроса.
+        #  Postgres доставляет уведомления только после COMMIT.
+        notification = func.pg_notify(
+            CHANGES_CHANNEL,
+            cast(func.json_build_object(*(arg for c in CHANGE_LOG_RETURNING for arg in (c.key, c))), Text),
+        )
+        result = await self.session.execute(
+            insert(ChangeLog).from_select(
+                list(CHANGE_LOG_COLUMNS),
+                select(
+                    data.c.entity, data.c.entity_id, data.c.kind,
+                    # Колонка VALUES из одних NULL получила бы тип text
+                    cast(data.c.parent_id, Integer), cast(data.c.previous_parent_id, Integer), cast(data.c.name, String),
+                    data.c.created_at,
+                ).select_from(data.join(lock, true())),
+            )
+            .returning(*CHANGE_LOG_RETURNING, notification)
+        )
+        return _read_changes(result.all())
+
+    async def list_since(self, since: int, limit: int) -> List[ReadChange]:
+        result = await self.session.execute(LIST_SINCE, {"since": since, "limit": limit})
+        return _read_changes(result.all())
+
+
+def _read_changes(rows) -> List[ReadChange]:
+    return [
+        ReadChange(
+            id = row.id,
+            entity = row.entity,
+            entity_id = row.entity_id,
+            kind = row.kind,
+            parent_id = row.parent_id,
+            previous_parent_id = row.previous_parent_id,
+            name = row.name,
+            created_at = row.created_at,
+        )
+        for row in rows
+    ]
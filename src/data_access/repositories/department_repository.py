@@ -1,11 +1,154 @@
-from typing import Optional, List
+from typing import Optional, List, Dict, Iterable, Mapping
 
-from sqlalchemy import select, update, delete
+from sqlalchemy import select, update, delete, insert, exists, literal, func, values, column, cast, bindparam, \
+    Integer, Select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.core.abstractions.department_repo_protocol import DepartmentRepositoryProtocol
-from src.core.models.department import ReadDepartment, CreateDepartment, UpdateDepartment
-from src.data_access.entities.entities import Department
+from src.core.models.department import ReadDepartment, CreateDepartment, UpdateDepartment, DepartmentWithPath, \
+    DepartmentPathItem, validate_moves
+from src.data_access.entities.entities import Department, Employee
+from src.data_access.queries import subtree_ids_cte
+from src.errors import DepartmentNotFoundError
+
+# Выбираем колонки, а не сущности: у Department жадные связи (selectin/joined),
+#  и select(Department) тянет за собой детей и сотрудников отдельными запросами.
+DEPARTMENT_COLUMNS = (Department.id, Department.name, Department.parent_id, Department.created_at)
+
+# Ключ pg_advisory_xact_lock, которым сериализуются перемещения подразделений
+TREE_MOVE_LOCK_KEY = 0x74726565
+
+
+# Горячие запросы чтения строятся один раз при импорте, значения передаются через bindparam.
+#  Построение рекурсивного CTE и вычисление его ключа кэша компиляции стоят около миллисекунды
+#  на каждый вызов; у готового объекта ключ кэша запомнен, и SQLAlchemy сразу берёт
+#  скомпилированный SQL из кэша. Бенчмарк: python -m benchmarks.statements
+
+def _subtrees_statement() -> Select:
+    tree = (
+        select(*DEPARTMENT_COLUMNS, literal(0).label("level"))
+        .where(Department.id.in_(bindparam("department_ids", expanding=True)))
+        .cte(name="subtree", recursive=True)
+    )
+    tree = tree.union_all(
+        select(*DEPARTMENT_COLUMNS, (tree.c.level + 1).label("level"))
+        .join(tree, Department.parent_id == tree.c.id)
+        .where(tree.c.level < bindparam("depth", type_=Integer))
+    )
+    # Пересекающиеся поддеревья (один id - потомок другого) отдаём без повторов
+    return (
+        select(tree.c.id, tree.c.name, tree.c.parent_id, tree.c.created_at)
+        .distinct()
+        .order_by(tree.c.id)
+    )
+
+
+def _ancestors_statement() -> Select:
+    # Подъём к корню одним рекурсивным CTE по первичному ключу
+    chain = (
+        select(*DEPARTMENT_COLUMNS, literal(0).label("level"))
+        .where(Department.id == bindparam("department_id", type_=Integer))
+        .cte(name="ancestors", recursive=True)
+    )
+    chain = chain.union_all(
+        select(*DEPARTMENT_COLUMNS, (chain.c.level + 1).label("level"))
+        .join(chain, Department.id == chain.c.parent_id)
+    )
+    return (
+        select(chain.c.id, chain.c.name, chain.c.parent_id, chain.c.created_at)
+        .order_by(chain.c.level.desc())
+    )
+
+
+def _search_by_name_prefix_statement() -> Select:
+    # Один запрос: найденные подразделения (по индексу lower(name) text_pattern_ops)
+    #  и цепочки их предков из рекурсивного CTE, склеенные LEFT JOIN.
+    matches = (
+        select(*DEPARTMENT_COLUMNS)
+        .where(func.lower(Department.name).like(bindparam("pattern"), escape="\\"))
+        .order_by(func.lower(Department.name), Department.id)
+        .limit(bindparam("limit", type_=Integer))
+        .cte(name="matches")
+    )
+
+    ancestors = (
+        select(
+            matches.c.id.label("match_id"),
+            Department.id, Department.name, Department.parent_id,
+            literal(1).label("level"),
+        )
+        .join(matches, Department.id == matches.c.parent_id)
+        .cte(name="match_ancestors", recursive=True)
+    )
+    ancestors = ancestors.union_all(
+        select(
+            ancestors.c.match_id,
+            Department.id, Department.name, Department.parent_id,
+            (ancestors.c.level + 1).label("level"),
+        )
+        .join(ancestors, Department.id == ancestors.c.parent_id)
+    )
+
+    return (
+        select(
+            matches.c.id, matches.c.name, matches.c.parent_id, matches.c.created_at,
+            ancestors.c.id.label("ancestor_id"), ancestors.c.name.label("ancestor_name"),
+        )
+        .select_from(matches.outerjoin(ancestors, ancestors.c.match_id == matches.c.id))
+        # Дальние предки первыми - путь от корня
+        .order_by(func.lower(matches.c.name), matches.c.id, ancestors.c.level.desc())
+    )
+
+
+def _descendant_ids_statement() -> Select:
+    department_id = bindparam("department_id", type_=Integer)
+    tree = subtree_ids_cte(department_id, name="department_tree")
+    # Все ID кроме корневого
+    return select(tree.c.id).where(tree.c.id != department_id)
+
+
+GET_BY_ID = select(*DEPARTMENT_COLUMNS).where(Department.id == bindparam("department_id", type_=Integer))
+GET_CHILDREN = select(*DEPARTMENT_COLUMNS).where(Department.parent_id == bindparam("department_id", type_=Integer))
+# SELECT EXISTS не тянет сущность вместе с её связями
+IS_EXISTS = select(exists().where(Department.id == bindparam("department_id", type_=Integer)))
+GET_SUBTREES = _subtrees_statement()
+GET_ANCESTORS = _ancestors_statement()
+SEARCH_BY_NAME_PREFIX = _search_by_name_prefix_statement()
+GET_DESCENDANT_IDS = _descendant_ids_statement()
+
+
+def depth_first_subtrees(
+        department_ids: List[int],
+        departments: Iterable[ReadDepartment],
+        depth: int,
+) -> Dict[int, List[ReadDepartment]]:
+    """Разложить подразделения из запроса поддеревьев по корням в порядке обхода в глубину"""
+    by_id: Dict[int, ReadDepartment] = {}
+    children_by_parent: Dict[int, List[ReadDepartment]] = {}
+    for depart in departments:
+        by_id[depart.id] = depart
+        children_by_parent.setdefault(depart.parent_id, []).append(depart)
+
+    # Порядок обхода в глубину, как при рекурсивном сборе детей по одному уровню
+    subtrees: Dict[int, List[ReadDepartment]] = {}
+    for root_id in department_ids:
+        root = by_id.get(root_id)
+        if root is None:
+            continue
+
+        subtree = [root]
+        # Другой запрошенный id может оказаться ребёнком этого корня: в выборке он есть
+        #  и при depth=0, поэтому глубину проверяем и для первого уровня
+        stack = [(child, 1) for child in reversed(children_by_parent.get(root_id, []))] if depth > 0 else []
+        while stack:
+            depart, level = stack.pop()
+            subtree.append(depart)
+            if level < depth:
+                stack.extend((child, level + 1) for child in reversed(children_by_parent.get(depart.id, [])))
+        subtrees[root_id] = subtree
+
+    return subtrees
 
 
 class DepartmentRepository(DepartmentRepositoryProtocol):
@@ -15,29 +158,35 @@ class DepartmentRepository(DepartmentRepositoryProtocol):
         self.session = session
 
     async def add(self, depart: CreateDepartment) -> ReadDepartment:
-        new_department = Department(
-            name = depart.name,
-            parent_id = depart.parent_id,
-        )
+        # Проверка родителя встроена в INSERT: если родителя нет,
+        #  подзапрос вернёт NULL и подразделение станет корневым.
+        parent_id = None
+        if depart.parent_id is not None:
+            parent_id = (
+                select(Department.id)
+                .where(Department.id == depart.parent_id)
+                .scalar_subquery()
+            )
 
-        self.session.add(new_department)
-        await self.session.flush()  # Получаем ID без коммита
-        await self.session.refresh(new_department)
+        result = await self.session.execute(
+            insert(Department)
+            .values(name=depart.name, parent_id=parent_id)
+            .returning(Department.id, Department.name, Department.parent_id, Department.created_at)
+        )
+        row = result.one()
 
         created_department = ReadDepartment(
-            id = new_department.id,
-            name = new_department.name,
-            parent_id = new_department.parent_id,
-            created_at = new_department.created_at,
+            id = row.id,
+            name = row.name,
+            parent_id = row.parent_id,
+            created_at = row.created_at,
         )
 
         return created_department
 
     async def get_by_id(self, department_id: int) -> Optional[ReadDepartment]:
-        result = await self.session.execute(
-            select(Department).where(Department.id == department_id)
-        )
-        depart = result.scalar_one_or_none()
+        result = await self.session.execute(GET_BY_ID, {"department_id": department_id})
+        depart = result.one_or_none()
         if not depart:
             return None
 
@@ -51,10 +200,8 @@ class DepartmentRepository(DepartmentRepositoryProtocol):
         return read_department
 
     async def get_children(self, department_id: int) -> List[ReadDepartment]:
-        result = await self.session.execute(
-            select(Department).where(Department.parent_id == department_id)
-        )
-        children_raw = result.scalars()
+        result = await self.session.execute(GET_CHILDREN, {"department_id": department_id})
+        children_raw = result.all()
 
         children: List[ReadDepartment] = []
 
@@ -69,29 +216,75 @@ class DepartmentRepository(DepartmentRepositoryProtocol):
 
         return children
 
-    async def is_exists(self, department_id: int) -> bool:
+    async def get_subtree(self, department_id: int, depth: int) -> List[ReadDepartment]:
+        subtrees = await self.get_subtrees([department_id], depth)
+        return subtrees.get(department_id, [])
+
+    async def get_subtrees(self, department_ids: Iterable[int], depth: int) -> Dict[int, List[ReadDepartment]]:
+        department_ids = list(dict.fromkeys(department_ids))
+        if not department_ids:
+            return {}
+
+        # Один рекурсивный CTE, засеянный всеми id, вместо запроса на каждый узел каждого поддерева
         result = await self.session.execute(
-            select(Department).where(Department.id == department_id)
+            GET_SUBTREES, {"department_ids": department_ids, "depth": depth}
         )
-        return result.scalar_one_or_none() is not None
 
-    async def get_all_descendants_ids(self, department_id: int) -> set[int]:
-        cte = (
-            select(Department.id, Department.parent_id)
-            .where(Department.id == department_id)
-            .cte(name="department_tree", recursive=True)
+        return depth_first_subtrees(
+            department_ids,
+            (
+                ReadDepartment(
+                    id = row.id,
+                    name = row.name,
+                    parent_id = row.parent_id,
+                    created_at = row.created_at,
+                )
+                for row in result.all()
+            ),
+            depth,
         )
 
-        recursive_part = select(Department.id, Department.parent_id).join(
-            cte, Department.parent_id == cte.c.id
-        )
+    async def get_ancestors(self, department_id: int) -> List[ReadDepartment]:
+        result = await self.session.execute(GET_ANCESTORS, {"department_id": department_id})
 
-        cte = cte.union_all(recursive_part)
+        return [
+            ReadDepartment(
+                id = row.id,
+                name = row.name,
+                parent_id = row.parent_id,
+                created_at = row.created_at,
+            )
+            for row in result.all()
+        ]
+
+    async def search_by_name_prefix(self, prefix: str, limit: int) -> List[DepartmentWithPath]:
+        pattern = prefix.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        result = await self.session.execute(SEARCH_BY_NAME_PREFIX, {"pattern": pattern, "limit": limit})
+
+        found: Dict[int, DepartmentWithPath] = {}
+        for row in result.all():
+            item = found.get(row.id)
+            if item is None:
+                item = found[row.id] = DepartmentWithPath(
+                    department=ReadDepartment(
+                        id = row.id,
+                        name = row.name,
+                        parent_id = row.parent_id,
+                        created_at = row.created_at,
+                    ),
+                    path=[],
+                )
+            if row.ancestor_id is not None:
+                item.path.append(DepartmentPathItem(id=row.ancestor_id, name=row.ancestor_name))
+
+        return list(found.values())
 
-        # Получаем все ID кроме корневого
-        result = await self.session.execute(
-            select(cte.c.id).where(cte.c.id != department_id)
-        )
+    async def is_exists(self, department_id: int) -> bool:
+        result = await self.session.execute(IS_EXISTS, {"department_id": department_id})
+        return bool(result.scalar())
+
+    async def get_all_descendants_ids(self, department_id: int) -> set[int]:
+        result = await self.session.execute(GET_DESCENDANT_IDS, {"department_id": department_id})
         return {row[0] for row in result.fetchall()}
 
     async def has_cycle(self, department_id: int | None, new_parent_id: int | None) -> bool:
@@ -114,44 +307,140 @@ class DepartmentRepository(DepartmentRepositoryProtocol):
         return new_parent_id in descendants
 
     async def update(self, department_id: int, depart: UpdateDepartment) -> ReadDepartment:
-        d = await self.session.execute(
-            select(Department).where(Department.id == department_id)
-        )
-        dept: Department | None = d.scalar_one_or_none()
-        if dept is None:
-            raise ValueError(f'ID: {department_id}, такое подразделение не найдено!')
-
-        update_values = {}
-        if depart.name is not None and dept.name != depart.name:
+        # Один UPDATE ... RETURNING: проверка на цикл идёт в WHERE,
+        #  0 строк означает либо отсутствие подразделения, либо цикл.
+        update_values = {'parent_id': depart.parent_id}
+        if depart.name is not None:
             update_values['name'] = depart.name
-        if dept.parent_id != depart.parent_id:
-            update_values['parent_id'] = depart.parent_id
 
-        result = await self.session.execute(
+        stmt = (
             update(Department)
             .where(Department.id == department_id)
             .values(**update_values)
-            .returning(Department)
+            .returning(Department.id, Department.name, Department.parent_id, Department.created_at)
+            .execution_options(synchronize_session=False)
         )
 
-        r = result.scalar_one_or_none()
+        if depart.parent_id is not None:
+            await self._lock_moves()
+            # Поднимаемся от нового родителя к корню: цепочка предков короче поддерева
+            ancestors = (
+                select(Department.id, Department.parent_id)
+                .where(Department.id == depart.parent_id)
+                .cte(name="new_parent_ancestors", recursive=True)
+            )
+            ancestors = ancestors.union_all(
+                select(Department.id, Department.parent_id).join(
+                    ancestors, Department.id == ancestors.c.parent_id
+                )
+            )
+            stmt = stmt.where(~exists().where(ancestors.c.id == department_id))
+
+        try:
+            result = await self.session.execute(stmt)
+        except IntegrityError:
+            # Нарушение внешнего ключа - нового родителя не существует
+            raise ValueError(f'ID: {depart.parent_id}, такое родительское подразделение не найдено!')
+
+        row = result.one_or_none()
+        if row is None:
+            # Дополнительный запрос только на пути ошибки
+            if not await self.is_exists(department_id):
+                raise DepartmentNotFoundError(department_id)
+            raise ValueError(
+                f"Нельзя установить родителя: департамент {depart.parent_id} "
+                f"находится в поддереве департамента {department_id}"
+            )
 
-        if r is None:
-            raise ValueError(f'ID: {department_id}, такое подразделение не найдено!')
+        return ReadDepartment(
+            id = row.id,
+            name = row.name,
+            parent_id = row.parent_id,
+            created_at = row.created_at,
+        )
 
-        return r
+    async def move_many(self, moves: Mapping[int, int | None]) -> List[ReadDepartment]:
+        if not moves:
+            return []
 
-    async def delete_with_cascade(self, department_id: int) -> bool:
+        await self._lock_moves()
+
+        # 1. Перемещаемые подразделения, новые родители и все их предки - одним рекурсивным CTE.
+        #  UNION (а не UNION ALL) убирает общие цепочки предков.
+        seed_ids = set(moves) | {parent_id for parent_id in moves.values() if parent_id is not None}
+        adjacency = (
+            select(Department.id, Department.parent_id)
+            .where(Department.id.in_(seed_ids))
+            .cte(name="move_adjacency", recursive=True)
+        )
+        adjacency = adjacency.union(
+            select(Department.id, Department.parent_id)
+            .join(adjacency, Department.id == adjacency.c.parent_id)
+        )
+        result = await self.session.execute(select(adjacency.c.id, adjacency.c.parent_id))
+        parents = {row.id: row.parent_id for row in result.all()}
+
+        # 2. Существование и отсутствие циклов проверяем в памяти на итоговом графе
+        validate_moves(parents, moves)
+
+        # 3. Все перемещения - один UPDATE ... FROM (VALUES ...).
+        #  VALUES вынесен в CTE: SQLite не понимает список колонок у алиаса подзапроса.
+        #  CAST нужен Postgres, если во всех строках parent_id = NULL (иначе колонка VALUES будет text).
+        rows = (
+            values(column("id", Integer), column("parent_id", Integer), name="moves")
+            .data(list(moves.items()))
+            .cte(name="moves")
+        )
         result = await self.session.execute(
-            select(Department).where(Department.id == department_id)
+            update(Department)
+            .where(Department.id == rows.c.id)
+            .values(parent_id=cast(rows.c.parent_id, Integer))
+            .returning(*DEPARTMENT_COLUMNS)
+            .execution_options(synchronize_session=False)
         )
-        depart = result.scalar_one_or_none()
-        if not depart:
-            return False
+        updated = {
+            row.id: ReadDepartment(
+                id = row.id,
+                name = row.name,
+                parent_id = row.parent_id,
+                created_at = row.created_at,
+            )
+            for row in result.all()
+        }
+
+        # В порядке запроса
+        return [updated[department_id] for department_id in moves]
+
+    async def _lock_moves(self) -> None:
+        """
+        Перемещения подразделений - по одному до конца транзакции.
 
-        # ORM автоматически удалит все связанные транзакции
-        await self.session.delete(depart)
-        return True
+        Проверка на цикл читает дерево, а UPDATE меняет только перемещаемые строки. В READ COMMITTED
+        два встречных перемещения (A под B и B под A) проходят проверку одновременно, не блокируют
+        друг друга и вместе фиксируют цикл. Блокировка берётся отдельным запросом: следующий запрос
+        получит снимок уже после неё и увидит закоммиченное перемещение соседа.
+        SQLite и так пропускает писателей по одному.
+        """
+        if self.session.get_bind().dialect.name == "postgresql":
+            await self.session.execute(select(func.pg_advisory_xact_lock(TREE_MOVE_LOCK_KEY)))
+
+    async def delete_with_cascade(self, department_id: int) -> bool:
+        # Два DELETE по поддереву из рекурсивного CTE, без загрузки сущностей через ORM
+        subtree_ids = select(subtree_ids_cte(department_id).c.id).scalar_subquery()
+
+        await self.session.execute(
+            delete(Employee)
+            .where(Employee.department_id.in_(subtree_ids))
+            .execution_options(synchronize_session=False)
+        )
+        # RETURNING вместо rowcount: драйвер SQLite не считает строки для запросов, начинающихся с WITH
+        result = await self.session.execute(
+            delete(Department)
+            .where(Department.id.in_(subtree_ids))
+            .returning(Department.id)
+            .execution_options(synchronize_session=False)
+        )
+        return len(result.all()) > 0
 
     async def delete_without_cascade(self, department_id: int) -> bool:
         result = await self.session.execute(
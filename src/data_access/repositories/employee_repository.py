@@ -1,11 +1,71 @@
-from typing import Optional, List
+from typing import Optional, List, Iterable, AsyncIterator, Dict, Tuple
 
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, insert, update, exists, literal, func, bindparam, Integer, Select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.core.abstractions.employee_repo_protocol import EmployeeRepositoryProtocol
-from src.core.models.employee import CreateEmployee, ReadEmployee
-from src.data_access.entities.entities import Department, Employee
+from src.core.models.employee import CreateEmployee, ReadEmployee, EmployeeRow
+from src.data_access.entities.entities import Department, Employee, utc_now
+from src.data_access.queries import subtree_ids_cte
+from src.errors import DepartmentNotFoundError
+
+# Колонки вместо сущности: select(Employee) подтянул бы подразделение через связь
+EMPLOYEE_COLUMNS = (
+    Employee.id, Employee.department_id, Employee.full_name,
+    Employee.position, Employee.hired_at, Employee.created_at,
+)
+
+
+# Горячие запросы чтения строятся один раз, значения передаются через bindparam:
+#  SQLAlchemy не пересобирает выражение и сразу находит скомпилированный SQL в кэше
+#  (подробнее - в department_repository).
+
+def _in_subtree(stmt: Select) -> Select:
+    subtree = subtree_ids_cte(bindparam("department_id", type_=Integer))
+    return stmt.where(Employee.department_id.in_(select(subtree.c.id)))
+
+
+def _search_statement(postgresql: bool, within_department: bool) -> Select:
+    # ILIKE '%...%' по ФИО и должности обслуживают триграммные GIN-индексы (pg_trgm)
+    pattern = bindparam("pattern")
+    stmt = select(*EMPLOYEE_COLUMNS).where(
+        Employee.full_name.ilike(pattern, escape="\\") | Employee.position.ilike(pattern, escape="\\")
+    )
+
+    if within_department:
+        stmt = _in_subtree(stmt)
+
+    if postgresql:
+        # Сначала самые похожие (по лучшему из двух полей)
+        query = bindparam("query")
+        rank = func.greatest(
+            func.similarity(Employee.full_name, query),
+            func.similarity(Employee.position, query),
+        )
+        stmt = stmt.order_by(rank.desc(), Employee.id)
+    else:
+        stmt = stmt.order_by(Employee.full_name, Employee.id)
+
+    return stmt.limit(bindparam("limit", type_=Integer)).offset(bindparam("offset", type_=Integer))
+
+
+GET_BY_ID = select(*EMPLOYEE_COLUMNS).where(Employee.id == bindparam("employee_id", type_=Integer))
+# Один запрос на все подразделения поддерева
+GET_IN_DEPARTMENTS = (
+    select(*EMPLOYEE_COLUMNS)
+    .where(Employee.department_id.in_(bindparam("department_ids", expanding=True)))
+    .order_by(Employee.created_at, Employee.id)
+)
+# SELECT EXISTS не тянет сущность вместе с её связями
+IS_EXISTS = select(exists().where(Employee.id == bindparam("employee_id", type_=Integer)))
+# Ключ: (Postgres, поиск внутри поддерева)
+SEARCH: Dict[Tuple[bool, bool], Select] = {
+    (postgresql, within_department): _search_statement(postgresql, within_department)
+    for postgresql in (False, True)
+    for within_department in (False, True)
+}
+STREAM_ALL = select(*EMPLOYEE_COLUMNS).order_by(Employee.id)
+STREAM_IN_SUBTREE = _in_subtree(STREAM_ALL)
 
 
 class EmployeeRepository(EmployeeRepositoryProtocol):
@@ -15,42 +75,42 @@ class EmployeeRepository(EmployeeRepositoryProtocol):
         self.session = session
 
     async def add(self, employee: CreateEmployee) -> ReadEmployee:
-        # В принципе можно убрать проверку на существование подразделения
-        #  перед добавлением.
+        # Проверка существования подразделения встроена в INSERT ... SELECT WHERE EXISTS:
+        #  если подразделения нет, вставится 0 строк.
+        values = select(
+            literal(employee.department_id, Employee.department_id.type),
+            literal(employee.full_name, Employee.full_name.type),
+            literal(employee.position, Employee.position.type),
+            literal(employee.hired_at, Employee.hired_at.type),
+            literal(utc_now(), Employee.created_at.type),
+        ).where(exists().where(Department.id == employee.department_id))
 
         result = await self.session.execute(
-            select(Department).where(Department.id == employee.department_id)
-        )
-        if result is None:
-            raise ValueError("There is no such Department.")
-
-        new_employee = Employee(
-            department_id = employee.department_id,
-            full_name = employee.full_name,
-            position = employee.position,
-            hired_at = employee.hired_at,
+            insert(Employee)
+            .from_select(
+                ["department_id", "full_name", "position", "hired_at", "created_at"],
+                values,
+            )
+            .returning(*EMPLOYEE_COLUMNS)
         )
-
-        self.session.add(new_employee)
-        await self.session.flush() # Получаем ID без коммита
-        await self.session.refresh(new_employee)
+        row = result.one_or_none()
+        if row is None:
+            raise DepartmentNotFoundError(employee.department_id)
 
         created_employee = ReadEmployee(
-            id = new_employee.id,
-            department_id = new_employee.department_id,
-            full_name = new_employee.full_name,
-            position = new_employee.position,
-            hired_at = new_employee.hired_at,
-            created_at = new_employee.created_at,
+            id = row.id,
+            department_id = row.department_id,
+            full_name = row.full_name,
+            position = row.position,
+            hired_at = row.hired_at,
+            created_at = row.created_at,
         )
 
         return created_employee
 
     async def get_by_id(self, employee_id: int) -> Optional[ReadEmployee]:
-        result = await self.session.execute(
-            select(Employee).where(Employee.id == employee_id)
-        )
-        employee = result.scalar_one_or_none()
+        result = await self.session.execute(GET_BY_ID, {"employee_id": employee_id})
+        employee = result.one_or_none()
         if not employee:
             return None
 
@@ -66,10 +126,15 @@ class EmployeeRepository(EmployeeRepositoryProtocol):
         return read_employee
 
     async def get_all_employees_into_department(self, department_id: int) -> list[ReadEmployee]:
-        result = await self.session.execute(
-            select(Employee).where(Employee.department_id == department_id)
-        )
-        employees = result.scalars()
+        return await self.get_all_employees_into_departments([department_id])
+
+    async def get_all_employees_into_departments(self, department_ids: Iterable[int]) -> list[ReadEmployee]:
+        department_ids = list(department_ids)
+        if not department_ids:
+            return []
+
+        result = await self.session.execute(GET_IN_DEPARTMENTS, {"department_ids": department_ids})
+        employees = result.all()
 
         list_employees: List[ReadEmployee] = []
 
@@ -87,11 +152,64 @@ class EmployeeRepository(EmployeeRepositoryProtocol):
 
         return list_employees
 
+    async def search(
+            self,
+            query: str,
+            within_department_id: int | None = None,
+            limit: int = 20,
+            offset: int = 0,
+    ) -> list[ReadEmployee]:
+        pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        params = {"pattern": pattern, "limit": limit, "offset": offset}
+        postgresql = self.session.get_bind().dialect.name == "postgresql"
+        if postgresql:
+            params["query"] = query
+        if within_department_id is not None:
+            params["department_id"] = within_department_id
+
+        result = await self.session.execute(SEARCH[postgresql, within_department_id is not None], params)
+
+        return [
+            ReadEmployee(
+                id = row.id,
+                department_id = row.department_id,
+                full_name = row.full_name,
+                position = row.position,
+                hired_at = row.hired_at,
+                created_at = row.created_at,
+            )
+            for row in result.all()
+        ]
+
+    async def stream_rows(self, within_department_id: int | None, batch_size: int) -> AsyncIterator[List[EmployeeRow]]:
+        if within_department_id is None:
+            stmt, params = STREAM_ALL, {}
+        else:
+            stmt, params = STREAM_IN_SUBTREE, {"department_id": within_department_id}
+
+        # yield_per - курсор на стороне сервера: в памяти только текущая пачка.
+        #  В asyncpg такой курсор живёт только внутри транзакции.
+        #  Опция передаётся при вызове: копия запроса через .execution_options() потеряла бы запомненный ключ кэша.
+        result = await self.session.stream(stmt, params, execution_options={"yield_per": batch_size})
+        try:
+            async for partition in result.partitions():
+                yield [tuple(row) for row in partition]
+        finally:
+            await result.close()
+
     async def is_exists(self, employee_id: int) -> bool:
+        result = await self.session.execute(IS_EXISTS, {"employee_id": employee_id})
+        return bool(result.scalar())
+
+    async def reassign_department(self, from_department_id: int, to_department_id: int) -> list[int]:
         result = await self.session.execute(
-            select(Employee).where(Employee.id == employee_id)
+            update(Employee)
+            .where(Employee.department_id == from_department_id)
+            .values(department_id=to_department_id)
+            .returning(Employee.id)
+            .execution_options(synchronize_session=False)
         )
-        return result.scalar_one_or_none() is not None
+        return list(result.scalars().all())
 
     async def delete(self, employee_id: int) -> bool:
         stmt = delete(Employee).where(Employee.id == employee_id)
@@ -0,0 +1,61 @@
+import itertools
+import time
+from typing import Callable, Dict, Generic, List, Sequence, TypeVar
+
+T = TypeVar("T")
+
+
+class ReplicaRouter(Generic[T]):
+    """
+    Выбор цели для читающих запросов: round-robin по здоровым репликам, иначе primary.
+
+    Реплика, помеченная нездоровой, пропускается ``retry_interval`` секунд,
+    после чего снова получает запросы (если она всё ещё лежит - её пометят опять).
+    """
+
+    def __init__(
+            self,
+            primary: T,
+            replicas: Sequence[T],
+            retry_interval: float = 30.0,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.primary = primary
+        self.replicas: List[T] = list(replicas)
+        self.retry_interval = retry_interval
+
+        self._clock = clock
+        self._counter = itertools.count()
+        # индекс реплики -> момент, до которого она считается нездоровой
+        self._unhealthy_until: Dict[int, float] = {}
+
+    def pick(self) -> T:
+        """Следующая здоровая реплика или primary, если здоровых нет"""
+        if not self.replicas:
+            return self.primary
+
+        now = self._clock()
+        start = next(self._counter)
+        for offset in range(len(self.replicas)):
+            index = (start + offset) % len(self.replicas)
+            if self._unhealthy_until.get(index, 0.0) <= now:
+                return self.replicas[index]
+        return self.primary
+
+    def mark_unhealthy(self, replica: T) -> None:
+        """Убрать реплику из ротации на retry_interval секунд"""
+        for index, r in enumerate(self.replicas):
+            if r is replica:
+                self._unhealthy_until[index] = self._clock() + self.retry_interval
+
+    def mark_healthy(self, replica: T) -> None:
+        for index, r in enumerate(self.replicas):
+            if r is replica:
+                self._unhealthy_until.pop(index, None)
+
+    def is_healthy(self, replica: T) -> bool:
+        now = self._clock()
+        return all(
+            self._unhealthy_until.get(index, 0.0) <= now
+            for index, r in enumerate(self.replicas) if r is replica
+        )
@@ -1,8 +1,11 @@
-import os
-from contextlib import asynccontextmanager
+import asyncio
+import uuid
+from contextlib import asynccontextmanager, AsyncExitStack
 from typing import AsyncGenerator
 
 from fastapi import FastAPI
+from sqlalchemy import make_url, event
+from sqlalchemy.engine import ExceptionContext
 from sqlalchemy.ext.asyncio import (
     create_async_engine,
     async_sessionmaker,
@@ -10,9 +13,18 @@ from sqlalchemy.ext.asyncio import (
     AsyncEngine
 )
 
+from src.data_access.instrumentation import instrument_engine
+from src.data_access.pool import InstrumentedAsyncQueuePool
+from src.data_access.routing import ReplicaRouter
+from src.metrics import REGISTRY, Gauge, Counter
+from src.settings import Settings, get_settings
+
 # Глобальные переменные для переиспользования
 _engine: AsyncEngine | None = None
 _async_session_maker: async_sessionmaker[AsyncSession] | None = None
+_read_session_maker: async_sessionmaker[AsyncSession] | None = None
+_replica_engines: list[AsyncEngine] = []
+_read_router: ReplicaRouter[async_sessionmaker[AsyncSession]] | None = None
 
 def create_database_url(
         username: str,
@@ -23,30 +35,107 @@ def create_database_url(
 ) -> str:
     return f"postgresql+asyncpg://{username}:{password}@{host}:{port}/{database}"
 
-def init_db(database_url: str) -> None:
+def create_engine_from_settings(database_url: str, settings: Settings) -> AsyncEngine:
+    """Создать движок с параметрами пула и кэшей из настроек"""
+    connect_args = {}
+    if make_url(database_url).get_driver_name() == "asyncpg":
+        connect_args["statement_cache_size"] = settings.db_statement_cache_size
+        connect_args["prepared_statement_cache_size"] = settings.db_prepared_statement_cache_size
+        if settings.db_unique_prepared_statement_names:
+            connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+        if settings.db_statement_timeout_ms > 0:
+            # Ограничение по умолчанию выставляется при подключении - без лишнего SET на каждый запрос
+            connect_args["server_settings"] = {"statement_timeout": str(settings.db_statement_timeout_ms)}
+
+    engine = create_async_engine(
+        database_url,
+        echo=settings.db_echo,  # Включить для отладки SQL
+        poolclass=InstrumentedAsyncQueuePool,  # Пул со статистикой ожидания
+        pool_pre_ping=settings.db_pool_pre_ping,  # Проверять соединения перед использованием
+        pool_size=settings.db_pool_size,  # Размер пула соединений
+        max_overflow=settings.db_max_overflow,  # Максимальное количество дополнительных соединений
+        pool_timeout=settings.db_pool_timeout,  # Сколько ждать свободное соединение
+        pool_recycle=settings.db_pool_recycle,  # Пересоздавать старые соединения вместо pre-ping
+        connect_args=connect_args,
+    )
+    # Счётчик запросов и времени в БД для каждого HTTP-запроса
+    instrument_engine(engine)
+    return engine
+
+
+def init_db(database_url: str, settings: Settings | None = None) -> None:
     """
     Инициализация базы данных.
 
     Вызывается один раз при старте приложения.
     """
-    global _engine, _async_session_maker
+    global _engine, _async_session_maker, _read_session_maker, _replica_engines, _read_router
 
-    _engine = create_async_engine(
-        database_url,
-        echo=False,  # Включить для отладки SQL
-        pool_pre_ping=True,  # Проверять соединения перед использованием
-        pool_size=10,  # Размер пула соединений
-        max_overflow=20,  # Максимальное количество дополнительных соединений
+    settings = settings or get_settings()
+
+    _engine = create_engine_from_settings(database_url, settings)
+    _async_session_maker = _create_session_maker(_engine)
+    # Чтение без транзакции: не тратим round-trip на BEGIN и COMMIT.
+    #  Пул общий с _engine, меняется только режим соединения.
+    _read_session_maker = _create_session_maker(_autocommit(_engine))
+
+    # Реплики для читающих запросов
+    _replica_engines = [create_engine_from_settings(url, settings) for url in settings.db_replica_urls]
+    replica_makers = [_create_session_maker(_autocommit(engine)) for engine in _replica_engines]
+    _read_router = ReplicaRouter(
+        primary=_read_session_maker,
+        replicas=replica_makers,
+        retry_interval=settings.db_replica_retry_interval,
     )
+    for engine, maker in zip(_replica_engines, replica_makers):
+        _watch_replica_health(engine, maker, _read_router)
+
+
+async def warm_pool(connections: int) -> int:
+    """
+    Открыть соединения пула заранее, чтобы первые запросы не ждали подключения к БД.
+
+    Открывается не больше pool_size: соединения сверх него пул закрыл бы при возврате.
+
+    :return: Сколько соединений открыто.
+    """
+    if _engine is None:
+        raise RuntimeError("Database not initialized. Call init_db() first")
+
+    count = min(connections, _engine.pool.size())
+    # Держим все сразу, иначе пул раз за разом выдавал бы одно и то же соединение
+    async with AsyncExitStack() as stack:
+        await asyncio.gather(*(stack.enter_async_context(_engine.connect()) for _ in range(count)))
+    return count
+
+
+def _autocommit(engine: AsyncEngine) -> AsyncEngine:
+    return engine.execution_options(isolation_level="AUTOCOMMIT")
+
 
-    _async_session_maker = async_sessionmaker(
-        bind=_engine,
+def _create_session_maker(engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(
+        bind=engine,
         class_=AsyncSession,
         expire_on_commit=False,  # Не истощать объекты после коммита
         autoflush=False,  # Отключить автоматический flush
     )
 
 
+def _watch_replica_health(
+        engine: AsyncEngine,
+        maker: async_sessionmaker[AsyncSession],
+        router: ReplicaRouter[async_sessionmaker[AsyncSession]],
+) -> None:
+    """Выводить реплику из ротации, если к ней не удаётся подключиться или соединение рвётся"""
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def on_error(context: ExceptionContext) -> None:
+        # connection is None - ошибка при установке соединения
+        if context.is_disconnect or context.connection is None:
+            router.mark_unhealthy(maker)
+
+
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     """
     Dependency для FastAPI или другого ASGI фреймворка.
@@ -70,10 +159,13 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
             raise
 
 
-def get_session_maker() -> async_sessionmaker[AsyncSession]:
+def get_session_maker(read_only: bool = False) -> async_sessionmaker[AsyncSession]:
     """
     Получить sessionmaker напрямую (для использования вне зависимостей).
 
+    :param read_only: Сессия только для чтения - без транзакции (AUTOCOMMIT),
+        может быть привязана к реплике.
+
     Пример:
     ```python
     async def some_function():
@@ -84,12 +176,82 @@ def get_session_maker() -> async_sessionmaker[AsyncSession]:
     """
     if _async_session_maker is None:
         raise RuntimeError("Database not initialized. Call init_db() first")
+    if read_only and _read_router is not None:
+        return _read_router.pick()
     return _async_session_maker
 
 
+def get_pool_stats() -> dict:
+    """
+    Статистика пула соединений основного движка.
+
+    Пример:
+    ```python
+    stats = get_pool_stats()
+    stats["checked_out"]  # сколько соединений сейчас выдано
+    ```
+    """
+    if _engine is None:
+        raise RuntimeError("Database not initialized. Call init_db() first")
+
+    pool = _engine.pool
+    stats = {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "max_overflow": pool._max_overflow,
+    }
+    if isinstance(pool, InstrumentedAsyncQueuePool):
+        stats.update(
+            checkouts=pool.checkouts,
+            timeouts=pool.timeouts,
+            wait_time_total_ms=pool.wait_time_total * 1000,
+            wait_time_max_ms=pool.wait_time_max * 1000,
+        )
+    return stats
+
+
+def _collect_pool_metrics():
+    """Состояние пула соединений для /metrics"""
+    if _engine is None:
+        return
+    stats = get_pool_stats()
+    gauges = {
+        "db_pool_size": ("Размер пула соединений", "size"),
+        "db_pool_checked_out": ("Выданные соединения", "checked_out"),
+        "db_pool_checked_in": ("Свободные соединения в пуле", "checked_in"),
+        "db_pool_overflow": ("Текущий overflow пула", "overflow"),
+        "db_pool_max_overflow": ("Максимальный overflow пула", "max_overflow"),
+        "db_pool_wait_seconds_max": ("Максимальное ожидание соединения", "wait_time_max_ms"),
+    }
+    counters = {
+        "db_pool_checkouts_total": ("Сколько раз выдавали соединение", "checkouts"),
+        "db_pool_checkout_timeouts_total": ("Сколько раз не дождались соединения", "timeouts"),
+        "db_pool_wait_seconds_total": ("Суммарное ожидание соединения", "wait_time_total_ms"),
+    }
+    for metrics, cls in ((gauges, Gauge), (counters, Counter)):
+        for name, (help_text, key) in metrics.items():
+            if key not in stats:
+                continue
+            value = stats[key]
+            if key.endswith("_ms"):
+                value = value / 1000
+            yield cls(name, help_text), [(name, {}, value)]
+
+
+REGISTRY.register_collector(_collect_pool_metrics)
+
+
 async def dispose_db() -> None:
     """Закрыть все соединения с базой данных"""
-    global _engine
+    global _engine, _async_session_maker, _read_session_maker, _replica_engines, _read_router
+    for engine in _replica_engines:
+        await engine.dispose()
+    _replica_engines = []
+    _read_router = None
+    _read_session_maker = None
+    _async_session_maker = None
     if _engine is not None:
         await _engine.dispose()
         _engine = None
@@ -107,14 +269,8 @@ async def lifespan(app: FastAPI):
     ```
     """
     # Startup
-    database_url = create_database_url(
-        username=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        host=os.getenv("DB_HOST"),
-        port=os.getenv("DB_PORT"),
-        database=os.getenv("DB_NAME")
-    )
-    init_db(database_url)
+    settings = get_settings()
+    init_db(settings.database_url, settings)
 
     # FastAPI работает
     yield
@@ -0,0 +1,23 @@
+from src.data_access.context import DbContext
+from src.data_access.session import get_session_maker
+
+# Заведомо несуществующие id: запросы проходят весь путь (компиляция SQL, prepare в asyncpg), но ничего не читают
+MISSING_ID = -1
+
+
+async def warm_statements() -> None:
+    """
+    Выполнить горячие запросы чтения по одному разу.
+
+    SQLAlchemy кэширует скомпилированный SQL в движке, asyncpg - подготовленные запросы
+    в соединении: после прогрева первые настоящие запросы не платят за компиляцию.
+    """
+    async with DbContext(session_factory=get_session_maker(), read_only=True) as db:
+        await db.department.get_subtree(MISSING_ID, 1)
+        await db.department.get_subtrees([MISSING_ID], 1)
+        await db.department.get_ancestors(MISSING_ID)
+        await db.department.search_by_name_prefix("warmup", 1)
+        await db.employee.get_all_employees_into_departments([MISSING_ID])
+        await db.employee.search("warmup", None, 1, 0)
+        await db.employee.search("warmup", MISSING_ID, 1, 0)
+        await db.changes.list_since(2 ** 62, 1)
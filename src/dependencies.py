@@ -1,18 +1,138 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from typing import AsyncGenerator
+
 from fastapi import Depends
+from sqlalchemy import make_url
 
+from src.application.services.changes_service import ChangesService
 from src.application.services.departments_service import DepartmentsService
 from src.application.services.employees_service import EmployeesService
+from src.application.event_hub import EventHub
+from src.application.single_flight import SingleFlight
+from src.core.abstractions.changes_service_protocol import ChangesServiceProtocol
 from src.core.abstractions.departments_service_protocol import DepartmentsServiceProtocol
 from src.core.abstractions.employees_service_protocol import EmployeesServiceProtocol
 from src.data_access.context import DbContext, get_db_context
+from src.data_access.session import get_session_maker
+from src.data_access.notifications import PgChangeListener
+from src.metrics import REGISTRY, Counter, Gauge
+from src.settings import get_settings, Settings
+
+# Общий на процесс кэш чтения подразделений (GET /departments/{id}).
+#  Сбрасывается после коммита любой записи (своей - сразу, других воркеров - через мост
+#  LISTEN/NOTIFY). Без моста другие воркеры отдают старые данные не дольше ttl.
+_department_reads = SingleFlight(ttl=1.0)
+
+# Общая на процесс рассылка изменений для SSE
+_event_hub = EventHub(
+    queue_size=get_settings().events_queue_size,
+    max_subscribers=get_settings().events_max_subscribers,
+    on_change=_department_reads.invalidate,
+)
+
+
+def _collect_cache_metrics():
+    """Попадания в кэши для /metrics"""
+    caches = {"department_reads": _department_reads}
+
+    requests = Counter("cache_requests_total", "Обращения к кэшу по результату", ("cache", "result"))
+    samples = []
+    for name, cache in caches.items():
+        for result, value in (("hit", cache.hits), ("shared", cache.shared), ("miss", cache.misses)):
+            samples.append((requests.name, {"cache": name, "result": result}, value))
+    yield requests, samples
+
+    # hit + shared: запросы, которые не пошли в БД сами
+    ratio = Gauge("cache_hit_ratio", "Доля обращений к кэшу без своего похода в БД", ("cache",))
+    samples = []
+    for name, cache in caches.items():
+        total = cache.hits + cache.shared + cache.misses
+        samples.append((ratio.name, {"cache": name}, (cache.hits + cache.shared) / total if total else 0.0))
+    yield ratio, samples
+
+
+REGISTRY.register_collector(_collect_cache_metrics)
+
+
+def _collect_event_metrics():
+    """Подписчики SSE для /metrics"""
+    metrics = (
+        (Gauge("events_subscribers", "Открытые подписки на события"), _event_hub.subscribers),
+        (Counter("events_published_total", "Разосланные изменения"), _event_hub.published),
+        (Counter("events_dropped_subscribers_total", "Подписки, закрытые из-за переполнения очереди"), _event_hub.dropped),
+        (Gauge("events_pg_bridge_connected", "Подключён ли мост LISTEN/NOTIFY"), int(_event_hub.bridged)),
+    )
+    for metric, value in metrics:
+        yield metric, [(metric.name, {}, value)]
+
 
+REGISTRY.register_collector(_collect_event_metrics)
 
+
+# scope="function": DbContext коммитит до отправки ответа, а не после. Иначе клиент,
+#  получивший ответ на запись, мог бы перечитать данные до коммита.
 def get_departments_service(
-    db: DbContext = Depends(get_db_context)
+    db: DbContext = Depends(get_db_context, scope="function")
 ) -> DepartmentsServiceProtocol:
-    return DepartmentsService(db=db)
+    return DepartmentsService(db=db, events=_event_hub)
 
 def get_employees_service(
-    db: DbContext = Depends(get_db_context)
+    db: DbContext = Depends(get_db_context, scope="function")
 ) -> EmployeesServiceProtocol:
-    return EmployeesService(db=db)
+    return EmployeesService(db=db, events=_event_hub)
+
+def get_changes_service(
+    db: DbContext = Depends(get_db_context, scope="function")
+) -> ChangesServiceProtocol:
+    return ChangesService(db=db)
+
+async def get_export_employees_service() -> AsyncGenerator[EmployeesServiceProtocol, None]:
+    """
+    Сервис сотрудников для выгрузки: своя сессия на primary в транзакции.
+
+    Курсор на стороне сервера (asyncpg) работает только внутри транзакции, а сессии чтения - в AUTOCOMMIT.
+    Сессия живёт, пока отдаётся ответ.
+    """
+    async with DbContext(session_factory=get_session_maker()) as db:
+        yield EmployeesService(db=db)
+
+def get_department_reads() -> SingleFlight:
+    return _department_reads
+
+@asynccontextmanager
+async def short_lived_services():
+    """
+    Сервисы со своей короткой сессией на primary, вне DbContext запроса.
+
+    Для долгих ответов (SSE): соединение берётся на время пары запросов и сразу возвращается в пул.
+    """
+    async with DbContext(session_factory=get_session_maker(), read_only=True) as db:
+        yield DepartmentsService(db=db), ChangesService(db=db)
+
+def get_event_hub() -> EventHub:
+    return _event_hub
+
+
+@asynccontextmanager
+async def change_listener_lifespan(settings: Settings):
+    """Мост LISTEN/NOTIFY в рассылку событий на время работы приложения (если база - Postgres)"""
+    if not settings.events_pg_bridge or make_url(settings.database_url).get_driver_name() != "asyncpg":
+        yield
+        return
+
+    def set_bridged(connected: bool) -> None:
+        _event_hub.bridged = connected
+
+    listener = PgChangeListener(
+        settings.database_url,
+        on_change=lambda change: _event_hub.publish([change]),
+        on_state=set_bridged,
+    )
+    task = asyncio.create_task(listener.run())
+    try:
+        yield
+    finally:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
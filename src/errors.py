@@ -2,4 +2,12 @@
 
 #TODO: Надо унифицировать исключения, чтобы кидать их, а не строки с комментариями, что происходит :3
 
-# DepartmentNotFoundError, ValidationError
\ No newline at end of file
+# DepartmentNotFoundError, ValidationError
+
+
+class DepartmentNotFoundError(ValueError):
+    """Подразделение не найдено. Наследуется от ValueError, чтобы старые обработчики не ломались."""
+
+    def __init__(self, department_id: int):
+        super().__init__("department with id {} does not exist".format(department_id))
+        self.department_id = department_id
@@ -0,0 +1,137 @@
+import logging
+import math
+import os
+import time
+from typing import Tuple
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from src.settings import Settings, get_settings
+
+logger = logging.getLogger("app.server")
+
+
+def available_cpus() -> int:
+    """Ядра, доступные процессу: с учётом квоты cgroup (Docker --cpus) и привязки к ядрам"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover - нет на macOS и Windows
+        cpus = os.cpu_count() or 1
+    try:
+        # cgroup v2: "<квота> <период>" или "max <период>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(cpus, 1)
+
+
+def worker_count(settings: Settings) -> int:
+    """Воркеров столько, сколько ядер: каждый - однопоточный event loop"""
+    return settings.server_workers if settings.server_workers > 0 else available_cpus()
+
+
+def pool_size_per_worker(settings: Settings, workers: int) -> Tuple[int, int]:
+    """
+    pool_size и max_overflow одного воркера, чтобы все воркеры вместе не превысили DB_MAX_CONNECTIONS.
+
+    Лимит считается для каждого сервера БД отдельно (у реплик свои пулы). Соединение моста
+    LISTEN/NOTIFY - вне пула, его тоже вычитаем.
+
+    :raises ValueError: Лимита не хватает даже на одно соединение на воркер.
+    """
+    if settings.db_max_connections <= 0:
+        return settings.db_pool_size, settings.db_max_overflow
+
+    per_worker = settings.db_max_connections // workers - (1 if settings.events_pg_bridge else 0)
+    if per_worker < 1:
+        raise ValueError(
+            f"DB_MAX_CONNECTIONS={settings.db_max_connections} мало для {workers} воркеров"
+        )
+    pool_size = min(settings.db_pool_size, per_worker)
+    max_overflow = max(min(settings.db_max_overflow, per_worker - pool_size), 0)
+    return pool_size, max_overflow
+
+
+class GracefulServer(uvicorn.Server):
+    """
+    Сервер с остановкой без обрыва запросов.
+
+    uvicorn при SIGTERM перестаёт принимать соединения, ждёт текущие запросы (не дольше
+    SERVER_GRACEFUL_TIMEOUT) и только потом выполняет lifespan shutdown, где закрывается пул БД.
+    Подписки SSE сами не заканчиваются - закрываем их сразу, клиенты переподключатся к другому воркеру.
+    """
+
+    async def shutdown(self, sockets=None) -> None:
+        from src.dependencies import get_event_hub
+
+        get_event_hub().close_all()
+        await super().shutdown(sockets)
+
+
+class TimedConfig(uvicorn.Config):
+    """Конфигурация, замеряющая импорт приложения: uvicorn импортирует main:app в каждом воркере"""
+
+    def load(self) -> None:
+        if self.loaded:
+            return
+        started = time.perf_counter()
+        super().load()
+        # src.startup тянет FastAPI и SQLAlchemy - импортируем после замера
+        from src.startup import record_app_import
+
+        record_app_import(started, time.perf_counter() - started)
+
+
+def build_config(settings: Settings, workers: int) -> uvicorn.Config:
+    return TimedConfig(
+        "main:app",
+        host=settings.server_host,
+        port=settings.server_port,
+        workers=workers,
+        # auto: uvloop и httptools, если установлены, иначе asyncio и h11
+        loop="auto",
+        http="auto",
+        timeout_graceful_shutdown=settings.server_graceful_timeout,
+        timeout_keep_alive=settings.server_keep_alive,
+        # Access-лог на каждый запрос заметно стоит под нагрузкой; метрики и медленные запросы пишем сами
+        access_log=settings.server_access_log,
+        proxy_headers=True,
+    )
+
+
+def serve(settings: Settings | None = None) -> None:
+    """
+    Запуск в продакшене: несколько воркеров uvicorn на одном сокете.
+
+    Пример:
+    ```
+    python -m src.server
+    ```
+    """
+    settings = settings or get_settings()
+    workers = worker_count(settings)
+
+    # Воркеры - отдельные процессы и читают настройки из окружения заново
+    pool_size, max_overflow = pool_size_per_worker(settings, workers)
+    os.environ["DB_POOL_SIZE"] = str(pool_size)
+    os.environ["DB_MAX_OVERFLOW"] = str(max_overflow)
+    get_settings.cache_clear()
+
+    logging.basicConfig(level=logging.INFO)
+    logger.info("starting %s workers, db pool %s + %s overflow per worker", workers, pool_size, max_overflow)
+
+    config = build_config(settings, workers)
+    server = GracefulServer(config)
+    if workers > 1:
+        sock = config.bind_socket()
+        Multiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    serve()
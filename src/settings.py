@@ -0,0 +1,146 @@
+from functools import lru_cache
+from typing import Annotated, List, Dict
+
+from pydantic import field_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict, NoDecode
+
+
+class Settings(BaseSettings):
+    """
+    Настройки приложения.
+
+    Читаются из переменных окружения (имя поля в верхнем регистре, например DB_POOL_SIZE)
+    и из файла .env, если он есть.
+    """
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+    # Подключение к БД
+    db_user: str = "postgres_user"
+    db_password: str = "postgres_password"
+    db_host: str = "localhost"
+    db_port: int = 5432
+    db_name: str = "postgres_db"
+    db_echo: bool = False                       # Логировать SQL (для отладки)
+
+    # Пул соединений
+    db_pool_size: int = 10                      # Постоянные соединения в пуле
+    db_max_overflow: int = 20                   # Дополнительные соединения сверх pool_size
+    db_pool_timeout: float = 30.0               # Сколько ждать свободное соединение, сек
+    db_pool_recycle: int = 1800                 # Пересоздавать соединения старше N сек (-1 - никогда)
+    db_pool_pre_ping: bool = False              # SELECT 1 при каждой выдаче соединения (лишний round-trip)
+
+    # Сколько соединений с каждым сервером БД могут открыть все воркеры вместе (0 - не ограничивать).
+    #  При запуске через src.server pool_size и max_overflow воркера уменьшаются под этот лимит.
+    db_max_connections: int = 0
+
+    # Кэши подготовленных запросов (asyncpg)
+    db_statement_cache_size: int = 100          # Кэш prepared statements в самом asyncpg (0 - выключить, нужно для pgbouncer)
+    db_prepared_statement_cache_size: int = 100 # Кэш prepared statements в диалекте SQLAlchemy
+    db_unique_prepared_statement_names: bool = False  # Уникальные имена prepared statements (pgbouncer в режиме transaction)
+
+    # Горячие чтения (поддеревья, сотрудники подразделений) напрямую через asyncpg, минуя ORM.
+    #  Только в читающих сессиях на Postgres; в транзакциях и на других БД - через ORM.
+    db_raw_reads: bool = False
+
+    # Сервер (python -m src.server)
+    server_host: str = "0.0.0.0"
+    server_port: int = 8000
+    server_workers: int = 0                     # Процессов-воркеров (0 - по числу доступных ядер)
+    server_graceful_timeout: float = 30.0       # Сколько ждать текущие запросы при остановке, сек
+    server_keep_alive: int = 5                  # Сколько держать простаивающее keep-alive соединение, сек
+    server_access_log: bool = False             # Лог uvicorn на каждый запрос
+
+    # Прогрев при запуске воркера (до приёма запросов)
+    warmup_db_connections: int = 0             # Сколько соединений пула открыть заранее (0 - не открывать)
+    warmup_statements: bool = True              # Выполнить горячие запросы: компиляция SQL и prepare в asyncpg
+    warmup_schemas: bool = True                 # Построить схему OpenAPI
+
+    # Ограничения времени
+    db_statement_timeout_ms: int = 30000        # statement_timeout на стороне Postgres для каждого запроса (0 - без ограничения)
+    request_timeout: float = 30.0               # Сколько секунд ждать ответ обработчика, потом 504 и отмена запросов в БД
+    # Свои ограничения для маршрутов, JSON: {"GET /departments/{id}": 5, "DELETE /departments/{id}": 60}.
+    #  Для пишущих маршрутов то же значение ставится в SET LOCAL statement_timeout.
+    request_timeouts: Dict[str, float] = {}
+
+    # Допуск запросов: сколько запросов каждого класса выполняются одновременно (0 - без ограничения).
+    #  Тяжёлые чтения и записи не должны занимать весь пул (db_pool_size + db_max_overflow).
+    admission_limits: Dict[str, int] = {"heavy": 8, "write": 16, "read": 0, "health": 4}
+    admission_queue_size: int = 100             # Сколько запросов класса ждут места; остальным сразу 429
+    admission_max_wait: float = 2.0             # Сколько секунд ждать места, потом 503
+    # Класс маршрута, JSON: {"GET /departments/{id}": "heavy"}. Остальные GET - read, прочие методы - write.
+    admission_route_classes: Dict[str, str] = {
+        "GET /departments/{id}": "heavy",
+        "POST /departments/batch-get": "heavy",
+        "GET /employees/export": "heavy",
+        "GET /departments/{id}/events": "stream",
+        "GET /health": "health",
+        "GET /health/ready": "health",
+        "GET /health/pool": "health",
+        "GET /metrics": "health",
+    }
+
+    # Выгрузка сотрудников (GET /employees/export)
+    export_batch_size: int = 5000               # Строк в одной пачке курсора и одном фрагменте ответа
+
+    # Сжатие ответов
+    compression_min_size: int = 1024            # Ответы меньше N байт не сжимаются
+    compression_offload_size: int = 262144      # Тела от N байт сжимаются в пуле потоков, не в event loop
+    # Кодировки в порядке предпочтения, через запятую (пусто - не сжимать). br и zstd - если установлены brotli и zstandard
+    compression_encodings: Annotated[List[str], NoDecode] = ["zstd", "br", "gzip"]
+
+    # Реплики для чтения (GET-запросы)
+    db_replica_urls: Annotated[List[str], NoDecode] = []  # URL через запятую
+    db_replica_retry_interval: float = 30.0     # Сколько секунд не слать запросы в упавшую реплику
+
+    # Наблюдаемость
+    slow_request_threshold_ms: float = 500.0    # Запросы дольше - в лог WARNING вместе с SQL
+    log_slow_request_sql: bool = True           # Писать SQL медленных запросов в лог
+
+    # События для UI (SSE, GET /departments/{id}/events)
+    events_queue_size: int = 100                # Очередь на подписчика; переполнилась - подписка закрывается
+    events_max_subscribers: int = 1000          # Больше одновременных подписок - 503
+    events_heartbeat_interval: float = 15.0     # Пустая строка-комментарий раз в N сек, чтобы прокси не рвали соединение
+    events_pg_bridge: bool = True               # LISTEN/NOTIFY между воркерами (только Postgres)
+
+    @field_validator("db_replica_urls", "compression_encodings", mode="before")
+    @classmethod
+    def split_comma_list(cls, v):
+        if isinstance(v, str):
+            return [item.strip() for item in v.split(",") if item.strip()]
+        return v
+
+    def timeout_for(self, method: str, route_path: str | None) -> float:
+        """Ограничение времени для маршрута ("GET /departments/{id}"), 0 - без ограничения"""
+        if route_path is not None:
+            timeout = self.request_timeouts.get(f"{method} {route_path}")
+            if timeout is not None:
+                return timeout
+        return self.request_timeout
+
+    def admission_class_for(self, method: str, route_path: str | None) -> str:
+        """Класс маршрута для ограничения одновременных запросов"""
+        if route_path is not None:
+            route_class = self.admission_route_classes.get(f"{method} {route_path}")
+            if route_class is not None:
+                return route_class
+        return "read" if method in ("GET", "HEAD") else "write"
+
+    @property
+    def database_url(self) -> str:
+        # Импорт здесь, чтобы настройки не тянули за собой слой доступа к данным
+        from src.data_access.session import create_database_url
+
+        return create_database_url(
+            username=self.db_user,
+            password=self.db_password,
+            host=self.db_host,
+            port=str(self.db_port),
+            database=self.db_name,
+        )
+
+
+@lru_cache
+def get_settings() -> Settings:
+    """Настройки, прочитанные один раз на процесс"""
+    return Settings()
@@ -0,0 +1,78 @@
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Tuple
+
+from fastapi import FastAPI
+from sqlalchemy.exc import SQLAlchemyError
+
+from src.data_access.session import warm_pool
+from src.data_access.warmup import warm_statements
+from src.metrics import REGISTRY
+from src.settings import Settings
+
+logger = logging.getLogger("app.startup")
+
+STARTUP_SECONDS = REGISTRY.gauge(
+    "app_startup_seconds", "Длительность этапов запуска воркера", ("phase",),
+)
+
+# (начало, длительность) импорта приложения; замеряет src.server, загружая main:app
+_app_import: Tuple[float, float] | None = None
+
+
+def record_app_import(started: float, seconds: float) -> None:
+    """Запомнить время импорта приложения (вызывается сервером до lifespan)"""
+    global _app_import
+    _app_import = (started, seconds)
+
+
+def app_import_timing() -> Tuple[float, float | None]:
+    """
+    Начало запуска и длительность импорта приложения.
+
+    Если приложение запущено не через src.server (uvicorn main:app, тесты), импорт не замерен:
+    отсчёт идёт с момента вызова, длительность импорта - None.
+    """
+    if _app_import is None:
+        return time.perf_counter(), None
+    return _app_import
+
+
+async def warm_up(
+    app: FastAPI, settings: Settings, started: float, import_seconds: float | None,
+) -> Dict[str, float]:
+    """
+    Прогрев воркера до приёма запросов: соединения пула, горячие SQL-запросы, схема OpenAPI.
+
+    Ошибка БД прогрев не прерывает - воркер стартует, а /health/ready покажет состояние базы.
+
+    :param started: time.perf_counter() в начале импорта приложения.
+    :param import_seconds: Сколько занял импорт приложения; None - не замерялось.
+    :return: Длительность этапов в секундах (их же отдают метрики app_startup_seconds).
+    """
+    timings = {} if import_seconds is None else {"import": import_seconds}
+
+    async def phase(name: str, run: Callable[[], Awaitable[object]]) -> None:
+        start = time.perf_counter()
+        try:
+            await run()
+        except (SQLAlchemyError, OSError) as e:
+            logger.warning("warm-up %s failed: %s", name, e)
+        timings[name] = time.perf_counter() - start
+
+    if settings.warmup_db_connections > 0:
+        await phase("db_connections", lambda: warm_pool(settings.warmup_db_connections))
+    if settings.warmup_statements:
+        await phase("statements", warm_statements)
+    if settings.warmup_schemas:
+        # Схема кэшируется в приложении: /docs и /openapi.json не строят её на первом запросе
+        async def build_schema():
+            app.openapi()
+
+        await phase("schemas", build_schema)
+
+    timings["total"] = time.perf_counter() - started
+    for name, seconds in timings.items():
+        STARTUP_SECONDS.set(seconds, phase=name)
+    logger.info("startup: %s", ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in timings.items()))
+    return timings
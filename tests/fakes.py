@@ -1,12 +1,14 @@
-from typing import Optional, List, Dict, Set
+from typing import Any, Optional, List, Dict, Set, Iterable, Mapping, AsyncIterator, Tuple
 from datetime import datetime
 
 from src.core.abstractions.department_repo_protocol import DepartmentRepositoryProtocol
 from src.core.abstractions.employee_repo_protocol import EmployeeRepositoryProtocol
-from src.core.models.department import CreateDepartment, ReadDepartment, UpdateDepartment
-from src.core.models.employee import CreateEmployee, ReadEmployee
+from src.core.models.department import CreateDepartment, ReadDepartment, UpdateDepartment, DepartmentWithPath, \
+    DepartmentPathItem, validate_moves
+from src.core.models.employee import CreateEmployee, ReadEmployee, EmployeeRow
 from src.core.abstractions.departments_service_protocol import DeleteMode, DepartmentsServiceProtocol
 from src.core.abstractions.employees_service_protocol import EmployeesServiceProtocol
+from src.errors import DepartmentNotFoundError
 
 
 # ==============================================================================
@@ -24,10 +26,13 @@ class FakeDepartmentRepository(DepartmentRepositoryProtocol):
         dept_id = self._next_id
         self._next_id += 1
 
+        # Как и в БД: несуществующий родитель превращается в NULL
+        parent_id = department.parent_id if department.parent_id in self._departments else None
+
         read_dept = ReadDepartment(
             id=dept_id,
             name=department.name,
-            parent_id=department.parent_id,
+            parent_id=parent_id,
             created_at=datetime.now(),
         )
         self._departments[dept_id] = read_dept
@@ -39,6 +44,56 @@ class FakeDepartmentRepository(DepartmentRepositoryProtocol):
     async def get_children(self, department_id: int) -> List[ReadDepartment]:
         return [d for d in self._departments.values() if d.parent_id == department_id]
 
+    async def get_subtree(self, department_id: int, depth: int) -> List[ReadDepartment]:
+        root = self._departments.get(department_id)
+        if root is None:
+            return []
+
+        subtree = [root]
+
+        def collect(parent_id: int, level: int):
+            if level >= depth:
+                return
+            for child in sorted(self._departments.values(), key=lambda d: d.id):
+                if child.parent_id == parent_id:
+                    subtree.append(child)
+                    collect(child.id, level + 1)
+
+        collect(department_id, 0)
+        return subtree
+
+    async def get_subtrees(self, department_ids: Iterable[int], depth: int) -> Dict[int, List[ReadDepartment]]:
+        subtrees = {}
+        for department_id in department_ids:
+            subtree = await self.get_subtree(department_id, depth)
+            if subtree:
+                subtrees[department_id] = subtree
+        return subtrees
+
+    async def get_ancestors(self, department_id: int) -> List[ReadDepartment]:
+        chain = []
+        dept = self._departments.get(department_id)
+        while dept is not None:
+            chain.insert(0, dept)
+            dept = self._departments.get(dept.parent_id) if dept.parent_id is not None else None
+        return chain
+
+    async def search_by_name_prefix(self, prefix: str, limit: int) -> List[DepartmentWithPath]:
+        matches = sorted(
+            (d for d in self._departments.values() if d.name.lower().startswith(prefix.lower())),
+            key=lambda d: (d.name.lower(), d.id),
+        )[:limit]
+
+        found = []
+        for dept in matches:
+            path = []
+            parent = self._departments.get(dept.parent_id) if dept.parent_id is not None else None
+            while parent is not None:
+                path.insert(0, DepartmentPathItem(id=parent.id, name=parent.name))
+                parent = self._departments.get(parent.parent_id) if parent.parent_id is not None else None
+            found.append(DepartmentWithPath(department=dept, path=path))
+        return found
+
     async def is_exists(self, department_id: int) -> bool:
         return department_id in self._departments
 
@@ -64,7 +119,7 @@ class FakeDepartmentRepository(DepartmentRepositoryProtocol):
 
     async def update(self, department_id: int, update_dto: UpdateDepartment) -> ReadDepartment:
         if department_id not in self._departments:
-            raise ValueError(f"Department {department_id} not found")
+            raise DepartmentNotFoundError(department_id)
 
         existing = self._departments[department_id]
         updated = ReadDepartment(
@@ -76,6 +131,17 @@ class FakeDepartmentRepository(DepartmentRepositoryProtocol):
         self._departments[department_id] = updated
         return updated
 
+    async def move_many(self, moves: Mapping[int, int | None]) -> List[ReadDepartment]:
+        parents = {d.id: d.parent_id for d in self._departments.values()}
+        validate_moves(parents, moves)
+
+        moved: List[ReadDepartment] = []
+        for department_id, parent_id in moves.items():
+            updated = self._departments[department_id].model_copy(update={"parent_id": parent_id})
+            self._departments[department_id] = updated
+            moved.append(updated)
+        return moved
+
     async def delete_with_cascade(self, department_id: int) -> bool:
         if department_id not in self._departments:
             return False
@@ -133,9 +199,49 @@ class FakeEmployeeRepository(EmployeeRepositoryProtocol):
     async def get_all_employees_into_department(self, department_id: int) -> List[ReadEmployee]:
         return [e for e in self._employees.values() if e.department_id == department_id]
 
+    async def get_all_employees_into_departments(self, department_ids: Iterable[int]) -> List[ReadEmployee]:
+        ids = set(department_ids)
+        employees = [e for e in self._employees.values() if e.department_id in ids]
+        return sorted(employees, key=lambda e: (e.created_at, e.id))
+
     async def is_exists(self, employee_id: int) -> bool:
         return employee_id in self._employees
 
+    async def search(
+            self,
+            query: str,
+            within_department_id: int | None = None,
+            limit: int = 20,
+            offset: int = 0,
+    ) -> List[ReadEmployee]:
+        """Поиск по подстроке; within_department_id - только само подразделение (дерево знает сервис)"""
+        needle = query.lower()
+        found = [
+            e for e in self._employees.values()
+            if (needle in e.full_name.lower() or needle in e.position.lower())
+            and (within_department_id is None or e.department_id == within_department_id)
+        ]
+        found.sort(key=lambda e: (e.full_name, e.id))
+        return found[offset:offset + limit]
+
+    async def stream_rows(self, within_department_id: int | None, batch_size: int) -> AsyncIterator[List[EmployeeRow]]:
+        """within_department_id - только само подразделение (дерево знает сервис)"""
+        rows = [
+            (e.id, e.department_id, e.full_name, e.position, e.hired_at, e.created_at)
+            for e in sorted(self._employees.values(), key=lambda e: e.id)
+            if within_department_id is None or e.department_id == within_department_id
+        ]
+        for start in range(0, len(rows), batch_size):
+            yield rows[start:start + batch_size]
+
+    async def reassign_department(self, from_department_id: int, to_department_id: int) -> list[int]:
+        moved = []
+        for emp in self._employees.values():
+            if emp.department_id == from_department_id:
+                emp.department_id = to_department_id
+                moved.append(emp.id)
+        return moved
+
     async def delete(self, employee_id: int) -> bool:
         if employee_id in self._employees:
             del self._employees[employee_id]
@@ -160,6 +266,26 @@ class FakeEmployeeRepository(EmployeeRepositoryProtocol):
                 emp.department_id = to_department_id
 
 
+class FakeRawConnection:
+    """
+    Замена соединения asyncpg для репозиториев с чтениями через asyncpg.
+
+    Запоминает выполненные запросы с параметрами и отдаёт заранее заданные строки
+    (словари с теми же ключами, что у asyncpg.Record).
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]] | None = None):
+        self.rows = rows or []
+        self.calls: List[Tuple[str, Tuple[Any, ...]]] = []
+
+    async def fetch(self, statement: str, *args: Any) -> List[Dict[str, Any]]:
+        self.calls.append((statement, args))
+        return self.rows
+
+    def is_closed(self) -> bool:
+        return False
+
+
 # ==============================================================================
 # FAKE SERVICES (Бизнес-логика в памяти)
 # ==============================================================================
@@ -187,12 +313,32 @@ class FakeDepartmentsService(DepartmentsServiceProtocol):
     async def get_department_children(self, department_id: int) -> List[ReadDepartment]:
         return await self._repo.get_children(department_id)
 
+    async def get_department_subtree(self, department_id: int, depth: int) -> List[ReadDepartment]:
+        return await self._repo.get_subtree(department_id, depth)
+
+    async def get_department_subtrees(self, department_ids: Iterable[int], depth: int) -> Dict[int, List[ReadDepartment]]:
+        return await self._repo.get_subtrees(department_ids, depth)
+
+    async def get_department_subtree_ids(self, department_id: int) -> Set[int]:
+        if not await self._repo.is_exists(department_id):
+            return set()
+        return {department_id} | await self._repo.get_all_descendants_ids(department_id)
+
+    async def get_department_ancestors(self, department_id: int) -> List[ReadDepartment]:
+        return await self._repo.get_ancestors(department_id)
+
+    async def search_departments(self, prefix: str, limit: int) -> List[DepartmentWithPath]:
+        return await self._repo.search_by_name_prefix(prefix, limit)
+
     async def update_department(self, department_id: int, update_dto: UpdateDepartment) -> ReadDepartment:
         # Проверка на цикл при перемещении
         if await self._repo.has_cycle(department_id, update_dto.parent_id):
             raise ValueError("Cannot move department: would create a cycle")
         return await self._repo.update(department_id, update_dto)
 
+    async def move_departments(self, moves: Mapping[int, int | None]) -> List[ReadDepartment]:
+        return await self._repo.move_many(moves)
+
     async def delete_department(self, department_id: int, mode: DeleteMode, reassign_to_department_id: int | None) -> str:
         errors = []
 
@@ -246,7 +392,7 @@ class FakeEmployeesService(EmployeesServiceProtocol):
     async def create_employee(self, employee: CreateEmployee) -> ReadEmployee:
         is_exist = await self._depart_repo.is_exists(employee.department_id)
         if not is_exist:
-            raise ValueError("There is no such Department.")
+            raise DepartmentNotFoundError(employee.department_id)
 
         # Валидация
         if not employee.full_name or len(employee.full_name.strip()) == 0:
@@ -257,6 +403,53 @@ class FakeEmployeesService(EmployeesServiceProtocol):
     async def get_all_employees_into_department(self, department_id: int) -> List[ReadEmployee]:
         return await self._repo.get_all_employees_into_department(department_id)
 
+    async def get_all_employees_into_departments(self, department_ids: Iterable[int]) -> List[ReadEmployee]:
+        return await self._repo.get_all_employees_into_departments(department_ids)
+
+    async def search_employees(
+            self,
+            query: str,
+            within_department_id: int | None,
+            limit: int,
+            offset: int,
+    ) -> List[ReadEmployee]:
+        if within_department_id is None:
+            return await self._repo.search(query, None, limit, offset)
+
+        if not await self._depart_repo.is_exists(within_department_id):
+            raise DepartmentNotFoundError(within_department_id)
+
+        subtree = {within_department_id} | await self._depart_repo.get_all_descendants_ids(within_department_id)
+        found = []
+        for department_id in subtree:
+            found.extend(await self._repo.search(query, department_id, limit + offset, 0))
+        found.sort(key=lambda e: (e.full_name, e.id))
+        return found[offset:offset + limit]
+
+    async def export_employees(
+            self,
+            within_department_id: int | None,
+            batch_size: int,
+    ) -> AsyncIterator[List[EmployeeRow]]:
+        if within_department_id is None:
+            return self._repo.stream_rows(None, batch_size)
+
+        if not await self._depart_repo.is_exists(within_department_id):
+            raise DepartmentNotFoundError(within_department_id)
+
+        subtree = {within_department_id} | await self._depart_repo.get_all_descendants_ids(within_department_id)
+
+        async def batches():
+            rows = []
+            for department_id in subtree:
+                async for batch in self._repo.stream_rows(department_id, batch_size):
+                    rows.extend(batch)
+            rows.sort(key=lambda row: row[0])
+            for start in range(0, len(rows), batch_size):
+                yield rows[start:start + batch_size]
+
+        return batches()
+
     # --- Helper for tests ---
     @property
     def repository(self) -> FakeEmployeeRepository:
@@ -0,0 +1,112 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport
+
+from src.api.middleware import AdmissionControlMiddleware
+from src.application.admission import AdmissionRejected, ConcurrencyLimiter
+from src.settings import Settings
+
+
+@pytest.mark.asyncio
+async def test_limiter_hands_slots_in_order():
+    limiter = ConcurrencyLimiter(limit=1, queue_size=2, max_wait=1)
+    order = []
+
+    async def worker(name: str):
+        async with limiter.slot():
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    await limiter.acquire()
+    tasks = [asyncio.create_task(worker(name)) for name in "ab"]
+    await asyncio.sleep(0)
+    assert limiter.waiting == 2
+
+    # Третий в очередь не помещается
+    with pytest.raises(AdmissionRejected) as e:
+        await limiter.acquire()
+    assert e.value.reason == "queue_full"
+
+    limiter.release()
+    await asyncio.gather(*tasks)
+    assert order == ["a", "b"]
+    assert limiter.active == 0
+    assert limiter.waiting == 0
+
+
+@pytest.mark.asyncio
+async def test_limiter_wait_timeout_and_cancel_leave_no_waiters():
+    limiter = ConcurrencyLimiter(limit=1, queue_size=10, max_wait=0.01)
+    await limiter.acquire()
+
+    with pytest.raises(AdmissionRejected) as e:
+        await limiter.acquire()
+    assert e.value.reason == "wait_timeout"
+
+    limiter.max_wait = 10
+    task = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert limiter.waiting == 0
+    limiter.release()
+    assert limiter.active == 0
+
+
+@pytest.mark.asyncio
+async def test_heavy_reads_do_not_block_cheap_requests():
+    release = asyncio.Event()
+    test_app = FastAPI()
+
+    @test_app.get("/departments/{id}")
+    async def heavy(id: int):
+        await release.wait()
+        return {"id": id}
+
+    @test_app.post("/departments")
+    async def create():
+        return {"ok": True}
+
+    settings = Settings(
+        _env_file=None,
+        admission_limits={"heavy": 1, "write": 1},
+        admission_queue_size=1,
+        admission_max_wait=0.05,
+    )
+    wrapped = AdmissionControlMiddleware(test_app, settings=settings, routes=test_app.router.routes)
+
+    transport = ASGITransport(app=wrapped)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        running = asyncio.create_task(client.get("/departments/1"))
+        await asyncio.sleep(0.01)
+        assert wrapped.limiters["heavy"].active == 1
+
+        # Второй ждёт в очереди и не дожидается, третьему сразу отказ
+        queued = asyncio.create_task(client.get("/departments/2"))
+        await asyncio.sleep(0)
+        rejected = await client.get("/departments/3")
+        assert rejected.status_code == 429
+        assert rejected.headers["retry-after"] == "1"
+        assert (await queued).status_code == 503
+
+        # Записи в своём классе и не ждут тяжёлые чтения
+        assert (await client.post("/departments")).status_code == 200
+
+        release.set()
+        assert (await running).json() == {"id": 1}
+    assert wrapped.limiters["heavy"].active == 0
+
+
+def test_admission_class_for_route():
+    settings = Settings(_env_file=None)
+
+    assert settings.admission_class_for("GET", "/departments/{id}") == "heavy"
+    assert settings.admission_class_for("GET", "/health") == "health"
+    assert settings.admission_class_for("GET", "/departments/search") == "read"
+    assert settings.admission_class_for("PATCH", "/departments/{id}") == "write"
+    assert settings.admission_class_for("POST", None) == "write"
@@ -0,0 +1,115 @@
+import gzip
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from httpx import ASGITransport
+
+from src.api.compression import CompressionMiddleware, choose_encoding
+
+BIG = {"items": [{"id": i, "name": f"Отдел {i}"} for i in range(500)]}
+
+
+def make_app(**kwargs) -> CompressionMiddleware:
+    test_app = FastAPI()
+
+    @test_app.get("/big")
+    async def big():
+        return BIG
+
+    @test_app.get("/small")
+    async def small():
+        return {"ok": True}
+
+    @test_app.get("/export")
+    async def export():
+        async def rows():
+            for i in range(1000):
+                yield f"{i};Сотрудник {i}\n".encode()
+
+        return StreamingResponse(rows(), media_type="text/csv")
+
+    @test_app.get("/events")
+    async def events():
+        async def stream():
+            yield b"data: " + b"x" * 4096 + b"\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return CompressionMiddleware(test_app, **kwargs)
+
+
+async def get(app, path: str, accept_encoding: str) -> httpx.Response:
+    transport = ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        # stream - чтобы httpx не распаковывал тело сам
+        async with client.stream("GET", path, headers={"Accept-Encoding": accept_encoding}) as response:
+            response.raw_body = b"".join([chunk async for chunk in response.aiter_raw()])
+            return response
+
+
+def test_choose_encoding():
+    preferred = ["zstd", "br", "gzip"]
+
+    assert choose_encoding("gzip, br", preferred) == "br"
+    assert choose_encoding("gzip, br;q=0.8", preferred) == "gzip"
+    assert choose_encoding("gzip;q=0.5, br;q=0.8", preferred) == "br"
+    assert choose_encoding("br;q=0, *", preferred) == "zstd"
+    assert choose_encoding("identity", preferred) is None
+    assert choose_encoding("", preferred) is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("encoding, module", [("br", "brotli"), ("zstd", "zstandard")])
+async def test_brotli_and_zstd(encoding, module):
+    codec = pytest.importorskip(module)
+    app = make_app()
+
+    for path in ("/big", "/export"):
+        response = await get(app, path, f"gzip, {encoding}")
+        assert response.headers["content-encoding"] == encoding
+        if encoding == "br":
+            body = codec.decompress(response.raw_body)
+        else:
+            # Потоковый ответ - кадр zstd без размера в заголовке
+            body = codec.ZstdDecompressor().decompressobj().decompress(response.raw_body)
+        if path == "/big":
+            assert json.loads(body) == BIG
+        else:
+            assert body.decode().endswith("999;Сотрудник 999\n")
+
+
+@pytest.mark.asyncio
+async def test_large_body_compressed_small_body_not():
+    app = make_app(offload_size=1)  # заодно проверяем сжатие в пуле потоков
+
+    response = await get(app, "/big", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) == len(response.raw_body)
+    assert json.loads(gzip.decompress(response.raw_body)) == BIG
+
+    response = await get(app, "/small", "gzip")
+    assert "content-encoding" not in response.headers
+    assert json.loads(response.raw_body) == {"ok": True}
+
+    response = await get(app, "/big", "identity")
+    assert "content-encoding" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_streaming_response_compressed_incrementally():
+    app = make_app()
+
+    response = await get(app, "/export", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    lines = gzip.decompress(response.raw_body).decode().splitlines()
+    assert len(lines) == 1000
+    assert lines[-1] == "999;Сотрудник 999"
+
+    # SSE не сжимается: события должны уходить сразу
+    response = await get(app, "/events", "gzip")
+    assert "content-encoding" not in response.headers
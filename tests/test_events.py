@@ -0,0 +1,225 @@
+import datetime
+
+import pytest
+
+from src.application.department_events import DepartmentEventStream
+from src.application.event_hub import EventHub
+from src.core.models.change import ReadChange, ChangeEntity, ChangeKind
+
+_next_id = 0
+
+
+def change(
+        entity: ChangeEntity,
+        entity_id: int,
+        kind: ChangeKind,
+        parent_id: int | None = None,
+        previous_parent_id: int | None = None,
+) -> ReadChange:
+    global _next_id
+    _next_id += 1
+    return ReadChange(
+        id=_next_id,
+        entity=entity,
+        entity_id=entity_id,
+        kind=kind,
+        parent_id=parent_id,
+        previous_parent_id=previous_parent_id,
+        created_at=datetime.datetime.now(datetime.UTC),
+    )
+
+
+def make_stream(hub: EventHub, tree: dict[int, int | None], root: int = 1, **kwargs) -> DepartmentEventStream:
+    """Поток по дереву id -> parent_id, которое тест меняет по ходу"""
+
+    async def load_subtree():
+        if root not in tree:
+            return set()
+        subtree = {root}
+        while True:
+            more = {d for d, parent in tree.items() if parent in subtree} - subtree
+            if not more:
+                return subtree
+            subtree |= more
+
+    async def load_changes(since, limit):
+        return []
+
+    return DepartmentEventStream(hub, root, load_subtree, load_changes, heartbeat_interval=0.05, **kwargs)
+
+
+async def read_events(events, count: int) -> list[str]:
+    """Следующие count событий (без retry и keepalive) - строки "event" из SSE"""
+    names = []
+    while len(names) < count:
+        chunk = await anext(events)
+        names.extend(line.removeprefix("event: ") for line in chunk.split("\n") if line.startswith("event: "))
+    return names
+
+
+@pytest.mark.asyncio
+async def test_stream_filters_subtree_and_follows_moves():
+    hub = EventHub()
+    tree = {1: None, 2: 1, 3: None, 4: 3}
+    stream = make_stream(hub, tree)
+    assert await stream.open()
+    events = stream.events()
+
+    hub.publish([
+        change(ChangeEntity.EMPLOYEE, 10, ChangeKind.CREATED, parent_id=2),
+        change(ChangeEntity.EMPLOYEE, 11, ChangeKind.CREATED, parent_id=4),  # чужое поддерево
+        change(ChangeEntity.DEPARTMENT, 5, ChangeKind.CREATED, parent_id=2),
+    ])
+    tree[5] = 2
+    assert await read_events(events, 2) == ["employee.created", "department.created"]
+    assert stream.subtree == {1, 2, 5}
+
+    # 3 вместе с потомком 4 переезжает в поддерево
+    tree[3] = 1
+    hub.publish([change(ChangeEntity.DEPARTMENT, 3, ChangeKind.MOVED, parent_id=1)])
+    assert await read_events(events, 1) == ["department.moved"]
+    assert stream.subtree == {1, 2, 3, 4, 5}
+
+    hub.publish([change(ChangeEntity.EMPLOYEE, 12, ChangeKind.CREATED, parent_id=4)])
+    assert await read_events(events, 1) == ["employee.created"]
+
+    # Удаление корня - последнее событие потока
+    del tree[1]
+    hub.publish([change(ChangeEntity.DEPARTMENT, 1, ChangeKind.DELETED)])
+    assert await read_events(events, 1) == ["department.deleted"]
+    with pytest.raises(StopAsyncIteration):
+        await anext(events)
+    assert hub.subscribers == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_ends_when_ancestor_is_deleted_with_cascade():
+    hub = EventHub()
+    tree = {1: None, 2: 1, 3: 2, 4: None}
+    stream = make_stream(hub, tree, root=2)
+    assert await stream.open()
+    events = stream.events()
+
+    # Удаление в чужом дереве поток не трогает
+    del tree[4]
+    hub.publish([change(ChangeEntity.DEPARTMENT, 4, ChangeKind.DELETED)])
+    hub.publish([change(ChangeEntity.EMPLOYEE, 10, ChangeKind.CREATED, parent_id=3)])
+    assert await read_events(events, 1) == ["employee.created"]
+
+    # Каскад от предка: событие одно - на корень удалённого поддерева
+    for department_id in (1, 2, 3):
+        del tree[department_id]
+    hub.publish([change(ChangeEntity.DEPARTMENT, 1, ChangeKind.DELETED)])
+    assert await read_events(events, 1) == ["department.deleted"]
+    with pytest.raises(StopAsyncIteration):
+        await anext(events)
+    assert hub.subscribers == 0
+
+
+@pytest.mark.asyncio
+async def test_employee_moved_out_of_subtree():
+    hub = EventHub()
+    tree = {1: None, 2: 1, 3: None}
+    stream = make_stream(hub, tree)
+    assert await stream.open()
+    events = stream.events()
+
+    # Перевод из 2 в чужое подразделение 3 (удаление 2 с mode=reassign)
+    hub.publish([change(ChangeEntity.EMPLOYEE, 10, ChangeKind.MOVED, parent_id=3, previous_parent_id=2)])
+    # Между чужими подразделениями - не касается
+    hub.publish([change(ChangeEntity.EMPLOYEE, 11, ChangeKind.MOVED, parent_id=3, previous_parent_id=4)])
+    hub.publish([change(ChangeEntity.EMPLOYEE, 12, ChangeKind.CREATED, parent_id=1)])
+
+    assert await read_events(events, 2) == ["employee.moved", "employee.created"]
+    await events.aclose()
+
+
+@pytest.mark.asyncio
+async def test_missing_department_does_not_subscribe():
+    hub = EventHub()
+    stream = make_stream(hub, {2: None})
+
+    assert not await stream.open()
+    assert hub.subscribers == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_is_dropped_without_blocking_publisher():
+    hub = EventHub(queue_size=2)
+    stream = make_stream(hub, {1: None})
+    assert await stream.open()
+    events = stream.events()
+
+    hub.publish([change(ChangeEntity.EMPLOYEE, i, ChangeKind.CREATED, parent_id=1) for i in range(3)])
+
+    assert hub.subscribers == 0
+    assert hub.dropped == 1
+    assert await anext(events) == "retry: 3000\n\n"
+    assert (await anext(events)).startswith("event: overflow")
+    with pytest.raises(StopAsyncIteration):
+        await anext(events)
+
+
+@pytest.mark.asyncio
+async def test_subscriber_limit_and_heartbeat():
+    hub = EventHub(max_subscribers=1)
+    stream = make_stream(hub, {1: None})
+    assert await stream.open()
+
+    with pytest.raises(OverflowError):
+        hub.subscribe()
+
+    events = stream.events()
+    await anext(events)
+    assert await anext(events) == ": keepalive\n\n"
+    await events.aclose()
+    assert hub.subscribers == 0
+
+
+@pytest.mark.asyncio
+async def test_committed_changes_are_left_to_bridge():
+    hub = EventHub()
+    subscription = hub.subscribe()
+
+    hub.bridged = True
+    hub.committed([change(ChangeEntity.EMPLOYEE, 1, ChangeKind.CREATED, parent_id=1)])
+    assert hub.published == 0
+
+    hub.bridged = False
+    hub.committed([change(ChangeEntity.EMPLOYEE, 1, ChangeKind.CREATED, parent_id=1)])
+    assert (await subscription.get(1)).entity_id == 1
+
+
+def test_on_change_after_own_commit_and_bridge():
+    calls = []
+    hub = EventHub(on_change=lambda: calls.append(1))
+
+    hub.committed([change(ChangeEntity.EMPLOYEE, 1, ChangeKind.CREATED, parent_id=1)])
+    assert len(calls) == 1
+
+    # С мостом своё изменение придёт через NOTIFY, но сброс не ждёт его
+    hub.bridged = True
+    hub.committed([change(ChangeEntity.EMPLOYEE, 2, ChangeKind.CREATED, parent_id=1)])
+    assert len(calls) == 2
+    # Изменение другого воркера
+    hub.publish([change(ChangeEntity.EMPLOYEE, 3, ChangeKind.CREATED, parent_id=1)])
+    assert len(calls) == 3
+
+    hub.committed([])
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_close_all_ends_streams():
+    hub = EventHub()
+    stream = make_stream(hub, {1: None})
+    assert await stream.open()
+    events = stream.events()
+    await anext(events)
+
+    hub.close_all()
+
+    assert hub.subscribers == 0
+    assert (await anext(events)).startswith("event: overflow")
+    with pytest.raises(StopAsyncIteration):
+        await anext(events)
@@ -0,0 +1,215 @@
+import asyncio
+import json
+import logging
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+
+from main import app
+from src.api.error_handlers import register_db_error_handlers
+from src.api.middleware import QueryStatsMiddleware, RequestDeadlineMiddleware
+from src.data_access import session as db_session
+from src.data_access.base import Base
+from src.data_access.instrumentation import get_query_stats
+from src.metrics import MetricsRegistry
+from src.settings import Settings
+
+
+@pytest.mark.asyncio
+async def test_server_timing_counts_request_queries(tmp_path):
+    db_session.init_db(f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite'}", Settings(_env_file=None))
+    try:
+        async with db_session._engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        transport = ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/departments", json={"name": "Root"})
+            assert response.status_code == 200
+            # INSERT подразделения + запись в журнал изменений
+            assert 'desc="2 queries"' in response.headers["server-timing"]
+
+            response = await client.get("/health")
+            assert 'desc="0 queries"' in response.headers["server-timing"]
+    finally:
+        await db_session.dispose_db()
+
+
+@pytest.mark.asyncio
+async def test_slow_request_logged_with_sql(tmp_path, caplog: pytest.LogCaptureFixture):
+    db_session.init_db(f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite'}", Settings(_env_file=None))
+    engine = db_session._engine
+
+    test_app = FastAPI()
+
+    @test_app.get("/query")
+    async def query():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            await conn.execute(text("SELECT 2"))
+        return {"queries": get_query_stats().count}
+
+    # Порог 0 - любой запрос медленный
+    wrapped = QueryStatsMiddleware(test_app, slow_request_threshold_ms=0)
+    try:
+        with caplog.at_level(logging.INFO, logger="app.requests"):
+            transport = ASGITransport(app=wrapped)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                response = await client.get("/query")
+    finally:
+        await db_session.dispose_db()
+
+    assert response.json() == {"queries": 2}
+    [record] = [r for r in caplog.records if r.name == "app.requests"]
+    assert record.levelno == logging.WARNING
+    data = json.loads(record.getMessage().split(" ", 2)[2])
+    assert data["db_queries"] == 2
+    assert data["route"] == "/query"
+    assert [s["sql"] for s in data["db_statements"]] == ["SELECT 1", "SELECT 2"]
+
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    counter = registry.counter("jobs_total", "Jobs", ("kind",))
+    histogram = registry.histogram("job_seconds", "Job time", buckets=(0.1, 1.0))
+
+    counter.inc(kind='a"b')
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    text_ = registry.render()
+
+    assert '# TYPE jobs_total counter' in text_
+    assert 'jobs_total{kind="a\\"b"} 1' in text_
+    assert 'job_seconds_bucket{le="0.1"} 1' in text_
+    assert 'job_seconds_bucket{le="1"} 2' in text_
+    assert 'job_seconds_bucket{le="+Inf"} 3' in text_
+    assert 'job_seconds_count 3' in text_
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_and_readiness(tmp_path):
+    transport = ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        # БД не инициализирована - не готовы
+        response = await client.get("/health/ready")
+        assert response.status_code == 503
+
+        db_session.init_db(f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite'}", Settings(_env_file=None))
+        try:
+            response = await client.get("/health/ready")
+            assert response.status_code == 200
+
+            response = await client.get("/metrics")
+        finally:
+            await db_session.dispose_db()
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/health/ready",status="200"}' in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/health/ready",le="+Inf"}' in body
+    assert "http_requests_in_flight 1" in body
+    assert "db_pool_checked_out 0" in body
+    assert 'cache_hit_ratio{cache="department_reads"}' in body
+
+
+def make_slow_app(started: asyncio.Event, cancelled: asyncio.Event) -> FastAPI:
+    test_app = FastAPI()
+    register_db_error_handlers(test_app)
+
+    @test_app.get("/slow")
+    async def slow():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    @test_app.get("/fast")
+    async def fast():
+        return {"ok": True}
+
+    @test_app.get("/pool")
+    async def pool():
+        raise PoolTimeoutError("QueuePool limit reached")
+
+    @test_app.get("/statement-timeout")
+    async def statement_timeout():
+        orig = Exception("canceling statement due to statement timeout")
+        orig.sqlstate = "57014"
+        raise DBAPIError("SELECT ...", None, orig)
+
+    return test_app
+
+
+@pytest.mark.asyncio
+async def test_request_deadline_returns_504_and_cancels_handler():
+    started, cancelled = asyncio.Event(), asyncio.Event()
+    test_app = make_slow_app(started, cancelled)
+    settings = Settings(_env_file=None, request_timeout=5, request_timeouts={"GET /slow": 0.05})
+    wrapped = RequestDeadlineMiddleware(test_app, settings=settings, routes=test_app.router.routes)
+
+    transport = ASGITransport(app=wrapped)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/slow")
+        assert response.status_code == 504
+        assert response.json() == {"detail": "request_timeout"}
+        assert cancelled.is_set()
+
+        assert (await client.get("/fast")).json() == {"ok": True}
+
+
+@pytest.mark.asyncio
+async def test_client_disconnect_cancels_handler():
+    started, cancelled = asyncio.Event(), asyncio.Event()
+    test_app = make_slow_app(started, cancelled)
+    wrapped = RequestDeadlineMiddleware(test_app, settings=Settings(_env_file=None))
+
+    async def receive():
+        await started.wait()
+        return {"type": "http.disconnect"}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/slow", "raw_path": b"/slow", "root_path": "", "query_string": b"",
+        "headers": [], "server": ("test", 80), "client": ("test", 1234),
+    }
+    await asyncio.wait_for(wrapped(scope, receive, send), 1)
+
+    assert cancelled.is_set()
+    assert sent[0]["status"] == 499
+
+
+@pytest.mark.asyncio
+async def test_db_errors_mapped_to_503_and_504():
+    test_app = make_slow_app(asyncio.Event(), asyncio.Event())
+
+    transport = ASGITransport(app=test_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/pool")
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+
+        response = await client.get("/statement-timeout")
+        assert response.status_code == 504
+        assert response.json() == {"detail": "statement_timeout"}
+
+
+def test_timeout_for_route():
+    settings = Settings(_env_file=None, request_timeout=30, request_timeouts={"DELETE /departments/{id}": 120})
+
+    assert settings.timeout_for("DELETE", "/departments/{id}") == 120
+    assert settings.timeout_for("GET", "/departments/{id}") == 30
+    assert settings.timeout_for("GET", None) == 30
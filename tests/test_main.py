@@ -1,18 +1,23 @@
+import asyncio
 import sys
 from datetime import datetime
 from pathlib import Path
 from typing import AsyncGenerator
 
 import httpx
+import msgpack
 import pytest
 from httpx import ASGITransport
 from pytest_asyncio import fixture as async_fixture
 
 from fakes import FakeDepartmentRepository, FakeEmployeeRepository, FakeDepartmentsService, FakeEmployeesService
 from main import app
+from src.api.employee_export import arrow_available
 from src.core.models.department import create_department
 from src.core.models.employee import create_employee
-from src.dependencies import get_employees_service, get_departments_service
+from src.data_access.context import get_db_context
+from src.dependencies import get_employees_service, get_departments_service, get_department_reads, \
+    get_export_employees_service
 
 # Добавляем корень проекта в sys.path
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -83,6 +88,9 @@ async def override_dependencies(
 
     app.dependency_overrides[get_departments_service] = override_depart
     app.dependency_overrides[get_employees_service] = override_emp
+    app.dependency_overrides[get_export_employees_service] = override_emp
+    # Кэш чтения общий на процесс - между тестами его надо сбрасывать
+    get_department_reads().clear()
 
     yield
 
@@ -152,6 +160,19 @@ class TestCreateDepartment:
         assert data["name"] == "Root Dept"
         assert data["parent_id"] is None
 
+    @pytest.mark.asyncio
+    async def test_create_department_missing_parent_becomes_root(
+            self,
+            client: httpx.AsyncClient,
+            override_dependencies: None,
+    ):
+        # Несуществующий родитель не ошибка: подразделение создаётся корневым
+        payload = {"name": "Orphan", "parent_id": 999}
+        response = await client.post("/departments", json=payload)
+
+        assert response.status_code == 200
+        assert response.json()["parent_id"] is None
+
     @pytest.mark.asyncio
     async def test_create_department_validation_error(
             self,
@@ -352,6 +373,79 @@ class TestGetDepartment:
         assert len(data["employees"]) == 2
 
 
+# noinspection PyShadowingNames
+class TestGetDepartmentCoalescing:
+    """Склейка одинаковых запросов GET /departments/{id}"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_reads_hit_service_once(
+            self,
+            client: httpx.AsyncClient,
+            override_dependencies: None,
+            departments_service: FakeDepartmentsService,
+            monkeypatch: pytest.MonkeyPatch,
+    ):
+        new_dept, errors = create_department(name="Root", parent_id=None)
+        assert errors == ""
+        dept = await departments_service.repository.add(new_dept)
+
+        calls = 0
+        original = departments_service.get_department_subtree
+
+        async def counting_get_department_subtree(department_id: int, depth: int):
+            nonlocal calls
+            calls += 1
+            return await original(department_id, depth)
+
+        monkeypatch.setattr(departments_service, "get_department_subtree", counting_get_department_subtree)
+
+        # depth=7 обрезается до 5 и склеивается с depth=5
+        responses = await asyncio.gather(*[
+            client.get(f"/departments/{dept.id}", params={"depth": 5 if i % 2 else 7})
+            for i in range(10)
+        ])
+
+        assert all(r.status_code == 200 for r in responses)
+        assert calls == 1
+
+
+# noinspection PyShadowingNames
+class TestDbContextPerRequest:
+    """Один DbContext на запрос, даже если обработчику нужны оба сервиса"""
+
+    @pytest.mark.asyncio
+    async def test_services_share_one_db_context(
+            self,
+            client: httpx.AsyncClient,
+            department_repository: FakeDepartmentRepository,
+            employee_repository: FakeEmployeeRepository,
+    ):
+        contexts = []
+
+        class FakeDbContext:
+            department = department_repository
+            employee = employee_repository
+
+        async def override_db_context():
+            db = FakeDbContext()
+            contexts.append(db)
+            yield db
+
+        app.dependency_overrides[get_db_context] = override_db_context
+        get_department_reads().clear()
+        try:
+            new_dept, errors = create_department(name="Root", parent_id=None)
+            assert errors == ""
+            dept = await department_repository.add(new_dept)
+
+            response = await client.get(f"/departments/{dept.id}", params={"depth": 1})
+        finally:
+            app.dependency_overrides.clear()
+
+        assert response.status_code == 200
+        assert len(contexts) == 1
+
+
 # noinspection PyShadowingNames
 class TestMoveDepartment:
     """Тесты для PATCH /departments/{id}"""
@@ -523,3 +617,466 @@ class TestDeleteDepartment:
         response = await client.delete("/departments/999?mode=cascade")
 
         assert response.status_code == 404
+
+
+# noinspection PyShadowingNames
+class TestSearchEmployees:
+    """Тесты для GET /employees/search"""
+
+    @pytest.mark.asyncio
+    async def test_search_by_name_and_position_with_pagination(
+            self,
+            client: httpx.AsyncClient,
+            override_dependencies: None,
+            departments_service: FakeDepartmentsService,
+            employees_service: FakeEmployeesService,
+    ):
+        new_dept, errors = create_department(name="IT", parent_id=None)
+        assert errors == ""
+        dept = await departments_service.repository.add(new_dept)
+
+        for full_name, position in [("Ivan Petrov", "Dev"), ("Maria Ivanova", "QA"), ("Oleg", "Ivan's assistant"), ("Anna", "Dev")]:
+            new_emp, errors = create_employee(full_name=full_name, position=position, department_id=dept.id, hired_at=None)
+            assert errors == ""
+            await employees_service.repository.add(new_emp)
+
+        response = await client.get("/employees/search", params={"q": "ivan", "limit": 2})
+
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["items"]) == 2
+        assert data["has_more"] is True
+
+        response = await client.get("/employees/search", params={"q": "ivan", "limit": 2, "offset": 2})
+        data = response.json()
+        assert len(data["items"]) == 1
+        assert data["has_more"] is False
+
+    @pytest.mark.asyncio
+    async def test_search_within_subtree(
+            self,
+            client: httpx.AsyncClient,
+            override_dependencies: None,
+            departments_service: FakeDepartmentsService,
+            employees_service: FakeEmployeesService,
+    ):
+        new_dept, errors = create_department(name="Root", parent_id=None)
+        root = await departments_service.repository.add(new_dept)
+        new_dept, errors = create_department(name="Team", parent_id=root.id)
+        team = await departments_service.repository.add(new_dept)
+        new_dept, errors = create_department(name="Other", parent_id=None)
+        other = await departments_service.repository.add(new_dept)
+
+        for department_id in (team.id, other.id):
+            new_emp, errors = create_employee(full_name="Ivan", position="Dev", department_id=department_id, hired_at=None)
+            await employees_service.repository.add(new_emp)
+
+        response = await client.get("/employees/search", params={"q": "ivan", "within_department_id": root.id})
+
+        assert response.status_code == 200
+        assert [e["department_id"] for e in response.json()["items"]] == [team.id]
+
+    @pytest.mark.asyncio
+    async def test_search_unknown_department(
+            self,
+            client: httpx.AsyncClient,
+            override_dependencies: None,
+    ):
+        response = await client.get("/employees/search", params={"q": "ivan", "within_department_id": 999})
+
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_search_query_too_short(
+            self,
+            client: httpx.AsyncClient,
+            override_dependencies: None,
+    ):
+        response = await client.get("/employees/search", params={"q": " a "})
+
+        assert response.status_code == 422
+
+
+# noinspection PyShadowingNames
+class TestSearchDepartments:
+    """Тесты для GET /departments/search"""
+
+    @pytest.mark.asyncio
+    async def test_prefix_search_with_path(
+            self,
+            client: httpx.AsyncClient,
+            override_dependencies: None,
+            departments_service: FakeDepartmentsService,
+    ):
+        new_dept, errors = create_department(name="Company", parent_id=None)
+        company = await departments_service.repository.add(new_dept)
+        new_dept, errors = create_department(name="Development", parent_id=company.id)
+        development = await departments_service.repository.add(new_dept)
+        new_dept, errors = create_department(name="Backend team", parent_id=development.id)
+        backend = await departments_service.repository.add(new_dept)
+        new_dept, errors = create_department(name="Design", parent_id=company.id)
+        await departments_service.repository.add(new_dept)
+
+        response = await client.get("/departments/search", params={"prefix": "back"})
+
+        assert response.status_code == 200
+        items = response.json()["items"]
+        assert [i["department"]["id"] for i in items] == [backend.id]
+        assert [p["name"] for p in items[0]["path"]] == ["Company", "Development"]
+
+        response = await client.get("/departments/search", params={"prefix": "De", "limit": 1})
+        assert [i["department"]["name"] for i in response.json()["items"]] == ["Design"]
+
+    @pytest.mark.asyncio
+    async def test_search_route_not_shadowed_by_id(
+            self,
+            client: httpx.AsyncClient,
+            override_dependencies: None,
+    ):
+        response = await client.get("/departments/search", params={"prefix": "x"})
+
+        assert response.status_code == 200
+        assert response.json() == {"items": []}
+
+
+# noinspection PyShadowingNames
+class TestDepartmentAncestors:
+    """Тесты для GET /departments/{id}/ancestors и include_path"""
+
+    @pytest.mark.asyncio
+    async def test_ancestors_root_to_node(
+            self,
+            client: httpx.AsyncClient,
+            override_dependencies: None,
+            departments_service: FakeDepartmentsService,
+    ):
+        new_dept, errors = create_department(name="Company", parent_id=None)
+        company = await departments_service.repository.add(new_dept)
+        new_dept, errors = create_department(name="Division", parent_id=company.id)
+        division = await departments_service.repository.add(new_dept)
+        new_dept, errors = create_department(name="Team", parent_id=division.id)
+        team = await departments_service.repository.add(new_dept)
+
+        response = await client.get(f"/departments/{team.id}/ancestors")
+
+        assert response.status_code == 200
+        assert [d["name"] for d in response.json()["items"]] == ["Company", "Division", "Team"]
+
+        response = await client.get(f"/departments/{team.id}", params={"include_path": True})
+
+        assert response.status_code == 200
+        assert response.json()["path"] == [
+            {"id": company.id, "name": "Company"},
+            {"id": division.id, "name": "Division"},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_path_not_included_by_default(
+            self,
+            client: httpx.AsyncClient,
+            override_dependencies: None,
+            departments_service: FakeDepartmentsService,
+    ):
+        new_dept, errors = create_department(name="Company", parent_id=None)
+        company = await departments_service.repository.add(new_dept)
+
+        response = await client.get(f"/departments/{company.id}")
+        assert response.json()["path"] is None
+
+        # Кэш чтения различает include_path
+        response = await client.get(f"/departments/{company.id}", params={"include_path": True})
+        assert response.json()["path"] == []
+
+    @pytest.mark.asyncio
+    async def test_ancestors_not_found(
+            self,
+            client: httpx.AsyncClient,
+            override_dependencies: None,
+    ):
+        response = await client.get("/departments/999/ancestors")
+
+        assert response.status_code == 404
+
+
+# noinspection PyShadowingNames
+class TestBatchGetDepartments:
+    """Тесты для POST /departments/batch-get"""
+
+    @pytest.mark.asyncio
+    async def test_batch_get_overlapping_and_missing(
+            self,
+            client: httpx.AsyncClient,
+            override_dependencies: None,
+            departments_service: FakeDepartmentsService,
+            employees_service: FakeEmployeesService,
+    ):
+        new_dept, errors = create_department(name="Root", parent_id=None)
+        root = await departments_service.repository.add(new_dept)
+        new_dept, errors = create_department(name="Team", parent_id=root.id)
+        team = await departments_service.repository.add(new_dept)
+
+        new_emp, errors = create_employee(full_name="Ivan", position="Dev", department_id=team.id, hired_at=None)
+        await employees_service.repository.add(new_emp)
+
+        response = await client.post(
+            "/departments/batch-get",
+            json={"ids": [team.id, root.id, 999, team.id], "depth": 1},
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert [i["department"]["id"] for i in data["items"]] == [team.id, root.id]
+        assert data["not_found"] == [999]
+        # Сотрудник Team входит в оба поддерева
+        assert [len(i["employees"]) for i in data["items"]] == [1, 1]
+        assert [c["id"] for c in data["items"][1]["children"]] == [team.id]
+
+    @pytest.mark.asyncio
+    async def test_batch_get_without_employees(
+            self,
+            client: httpx.AsyncClient,
+            override_dependencies: None,
+            departments_service: FakeDepartmentsService,
+            employees_service: FakeEmployeesService,
+    ):
+        new_dept, errors = create_department(name="Root", parent_id=None)
+        root = await departments_service.repository.add(new_dept)
+        new_emp, errors = create_employee(full_name="Ivan", position="Dev", department_id=root.id, hired_at=None)
+        await employees_service.repository.add(new_emp)
+
+        response = await client.post("/departments/batch-get", json={"ids": [root.id], "include_employees": False})
+
+        assert response.status_code == 200
+        assert response.json()["items"][0]["employees"] == []
+
+    @pytest.mark.asyncio
+    async def test_batch_get_validates_ids(
+            self,
+            client: httpx.AsyncClient,
+            override_dependencies: None,
+    ):
+        response = await client.post("/departments/batch-get", json={"ids": []})
+        assert response.status_code == 422
+
+        response = await client.post("/departments/batch-get", json={"ids": list(range(101))})
+        assert response.status_code == 422
+
+
+# noinspection PyShadowingNames,DuplicatedCode
+class TestBatchMoveDepartments:
+    """Тесты для POST /departments/batch-move"""
+
+    @pytest.mark.asyncio
+    async def test_batch_move_swaps_parents(
+            self,
+            client: httpx.AsyncClient,
+            override_dependencies: None,
+            departments_service: FakeDepartmentsService,
+    ):
+        new_dept, errors = create_department(name="A", parent_id=None)
+        a = await departments_service.repository.add(new_dept)
+        new_dept, errors = create_department(name="B", parent_id=a.id)
+        b = await departments_service.repository.add(new_dept)
+
+        # По отдельности "a под b" дало бы цикл, но в итоговом дереве b - корень
+        response = await client.post(
+            "/departments/batch-move",
+            json={"moves": [{"id": a.id, "parent_id": b.id}, {"id": b.id, "parent_id": None}]},
+        )
+
+        assert response.status_code == 200
+        assert [(d["id"], d["parent_id"]) for d in response.json()["items"]] == [(a.id, b.id), (b.id, None)]
+
+    @pytest.mark.asyncio
+    async def test_batch_move_rejects_cycle_atomically(
+            self,
+            client: httpx.AsyncClient,
+            override_dependencies: None,
+            departments_service: FakeDepartmentsService,
+    ):
+        new_dept, errors = create_department(name="A", parent_id=None)
+        a = await departments_service.repository.add(new_dept)
+        new_dept, errors = create_department(name="B", parent_id=None)
+        b = await departments_service.repository.add(new_dept)
+
+        response = await client.post(
+            "/departments/batch-move",
+            json={"moves": [{"id": a.id, "parent_id": b.id}, {"id": b.id, "parent_id": a.id}]},
+        )
+
+        assert response.status_code == 400
+        assert (await departments_service.repository.get_by_id(a.id)).parent_id is None
+
+    @pytest.mark.asyncio
+    async def test_batch_move_missing_departments(
+            self,
+            client: httpx.AsyncClient,
+            override_dependencies: None,
+            departments_service: FakeDepartmentsService,
+    ):
+        new_dept, errors = create_department(name="A", parent_id=None)
+        a = await departments_service.repository.add(new_dept)
+
+        response = await client.post("/departments/batch-move", json={"moves": [{"id": 999, "parent_id": None}]})
+        assert response.status_code == 404
+
+        response = await client.post("/departments/batch-move", json={"moves": [{"id": a.id, "parent_id": 999}]})
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_batch_move_validates_body(
+            self,
+            client: httpx.AsyncClient,
+            override_dependencies: None,
+    ):
+        response = await client.post("/departments/batch-move", json={"moves": []})
+        assert response.status_code == 422
+
+        response = await client.post(
+            "/departments/batch-move",
+            json={"moves": [{"id": 1, "parent_id": None}, {"id": 1, "parent_id": 2}]},
+        )
+        assert response.status_code == 422
+
+
+# noinspection PyShadowingNames
+class TestMessagePack:
+    """Тесты для ответов и тел запросов в MessagePack"""
+
+    @pytest.mark.asyncio
+    async def test_get_department_as_msgpack(
+            self,
+            client: httpx.AsyncClient,
+            override_dependencies: None,
+            departments_service: FakeDepartmentsService,
+    ):
+        new_dept, errors = create_department(name="Root", parent_id=None)
+        root = await departments_service.repository.add(new_dept)
+
+        as_json = await client.get(f"/departments/{root.id}")
+        get_department_reads().clear()
+        response = await client.get(f"/departments/{root.id}", headers={"Accept": "application/msgpack"})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/msgpack"
+        assert "Accept" in response.headers["vary"]
+        assert msgpack.unpackb(response.content) == as_json.json()
+
+    @pytest.mark.asyncio
+    async def test_json_preferred_by_q(
+            self,
+            client: httpx.AsyncClient,
+            override_dependencies: None,
+            departments_service: FakeDepartmentsService,
+    ):
+        new_dept, errors = create_department(name="Root", parent_id=None)
+        root = await departments_service.repository.add(new_dept)
+
+        response = await client.get(
+            f"/departments/{root.id}",
+            headers={"Accept": "application/json, application/msgpack;q=0.5"},
+        )
+
+        assert response.headers["content-type"] == "application/json"
+
+    @pytest.mark.asyncio
+    async def test_batch_get_with_msgpack_body(
+            self,
+            client: httpx.AsyncClient,
+            override_dependencies: None,
+            departments_service: FakeDepartmentsService,
+    ):
+        new_dept, errors = create_department(name="Root", parent_id=None)
+        root = await departments_service.repository.add(new_dept)
+
+        response = await client.post(
+            "/departments/batch-get",
+            content=msgpack.packb({"ids": [root.id, 999]}),
+            headers={"Content-Type": "application/msgpack", "Accept": "application/msgpack"},
+        )
+
+        assert response.status_code == 200
+        data = msgpack.unpackb(response.content)
+        assert [i["department"]["id"] for i in data["items"]] == [root.id]
+        assert data["not_found"] == [999]
+
+    @pytest.mark.asyncio
+    async def test_invalid_msgpack_body(self, client: httpx.AsyncClient, override_dependencies: None):
+        response = await client.post(
+            "/departments/batch-get",
+            content=b"\xc1",
+            headers={"Content-Type": "application/msgpack"},
+        )
+
+        assert response.status_code == 400
+
+
+# noinspection PyShadowingNames
+class TestExportEmployees:
+    """Тесты для GET /employees/export"""
+
+    @pytest.mark.asyncio
+    async def test_export_csv_within_subtree(
+            self,
+            client: httpx.AsyncClient,
+            override_dependencies: None,
+            departments_service: FakeDepartmentsService,
+            employees_service: FakeEmployeesService,
+    ):
+        new_dept, errors = create_department(name="Root", parent_id=None)
+        root = await departments_service.repository.add(new_dept)
+        new_dept, errors = create_department(name="Team", parent_id=root.id)
+        team = await departments_service.repository.add(new_dept)
+        new_dept, errors = create_department(name="Other", parent_id=None)
+        other = await departments_service.repository.add(new_dept)
+
+        for name, department_id in [("Ivan", team.id), ("Anna", root.id), ("Petr", other.id)]:
+            new_emp, errors = create_employee(full_name=name, position="Dev", department_id=department_id, hired_at=None)
+            await employees_service.repository.add(new_emp)
+
+        response = await client.get("/employees/export", params={"within_department_id": root.id})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "text/csv; charset=utf-8"
+        lines = response.text.splitlines()
+        assert lines[0] == "id,department_id,full_name,position,hired_at,created_at"
+        assert [line.split(",")[2] for line in lines[1:]] == ["Ivan", "Anna"]
+
+    @pytest.mark.asyncio
+    async def test_export_empty_has_header(self, client: httpx.AsyncClient, override_dependencies: None):
+        response = await client.get("/employees/export")
+
+        assert response.status_code == 200
+        assert response.text == "id,department_id,full_name,position,hired_at,created_at\n"
+
+    @pytest.mark.asyncio
+    async def test_export_unknown_department(self, client: httpx.AsyncClient, override_dependencies: None):
+        response = await client.get("/employees/export", params={"within_department_id": 999})
+
+        assert response.status_code == 404
+        assert response.json()["detail"]["error"] == "department_not_found"
+
+    @pytest.mark.asyncio
+    async def test_export_arrow(
+            self,
+            client: httpx.AsyncClient,
+            override_dependencies: None,
+            departments_service: FakeDepartmentsService,
+            employees_service: FakeEmployeesService,
+    ):
+        new_dept, errors = create_department(name="Root", parent_id=None)
+        root = await departments_service.repository.add(new_dept)
+        new_emp, errors = create_employee(full_name="Ivan", position="Dev", department_id=root.id, hired_at=None)
+        await employees_service.repository.add(new_emp)
+
+        response = await client.get("/employees/export", params={"format": "arrow"})
+
+        if not arrow_available():
+            assert response.status_code == 501
+            return
+        import pyarrow.ipc
+
+        assert response.status_code == 200
+        table = pyarrow.ipc.open_stream(response.content).read_all()
+        assert table.column("full_name").to_pylist() == ["Ivan"]
+
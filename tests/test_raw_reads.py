@@ -0,0 +1,125 @@
+"""
+Чтения через asyncpg (DB_RAW_READS) на подставном соединении.
+
+На SQLite репозитории уходят в запасной путь через ORM, а на Postgres (TEST_DATABASE_URL) их
+проверяют тесты test_repositories.py. Здесь без базы проверяется сам путь через asyncpg:
+какой SQL с какими параметрами выполняется и как записи превращаются в модели.
+"""
+from datetime import date, datetime
+
+import asyncpg
+import pytest
+from sqlalchemy.exc import DBAPIError
+
+from src.core.models.department import ReadDepartment
+from src.core.models.employee import ReadEmployee
+from src.data_access.instrumentation import start_query_stats, stop_query_stats
+from src.data_access.repositories import asyncpg_department_repository, asyncpg_employee_repository
+from src.data_access.repositories.asyncpg_department_repository import AsyncpgDepartmentRepository
+from src.data_access.repositories.asyncpg_employee_repository import AsyncpgEmployeeRepository
+from fakes import FakeRawConnection
+
+CREATED_AT = datetime(2024, 1, 1, 12, 0)
+
+
+def department_row(id: int, parent_id: int | None) -> dict:
+    return {"id": id, "name": f"D{id}", "parent_id": parent_id, "created_at": CREATED_AT}
+
+
+@pytest.fixture
+def connection(monkeypatch) -> FakeRawConnection:
+    """Репозитории получают подставное соединение вместо соединения asyncpg из пула"""
+    fake = FakeRawConnection()
+
+    async def raw_connection(session):
+        return fake
+
+    monkeypatch.setattr(asyncpg_department_repository, "raw_connection", raw_connection)
+    monkeypatch.setattr(asyncpg_employee_repository, "raw_connection", raw_connection)
+    return fake
+
+
+@pytest.mark.asyncio
+async def test_department_get_by_id(connection):
+    repository = AsyncpgDepartmentRepository(session=None)
+    connection.rows = [department_row(5, 1)]
+
+    department = await repository.get_by_id(5)
+
+    assert connection.calls == [(asyncpg_department_repository.GET_BY_ID_SQL, (5,))]
+    assert "WHERE id = $1" in asyncpg_department_repository.GET_BY_ID_SQL
+    assert department == ReadDepartment(id=5, name="D5", parent_id=1, created_at=CREATED_AT)
+
+    connection.rows = []
+    assert await repository.get_by_id(6) is None
+
+
+@pytest.mark.asyncio
+async def test_department_subtrees_are_grouped_depth_first(connection):
+    repository = AsyncpgDepartmentRepository(session=None)
+    # Запрос отдаёт строки по id, а не в порядке обхода; 4 - ребёнок второго корня 3
+    connection.rows = [department_row(1, None), department_row(2, 1), department_row(3, 1),
+                       department_row(4, 3), department_row(5, 2)]
+
+    subtrees = await repository.get_subtrees([1, 3, 1], depth=2)
+
+    statement, args = connection.calls[0]
+    assert statement == asyncpg_department_repository.GET_SUBTREES_SQL
+    assert "id = ANY($1::integer[])" in statement and "s.level < $2" in statement
+    # Повторы id убираются до запроса
+    assert args == ([1, 3], 2)
+    assert [d.id for d in subtrees[1]] == [1, 2, 5, 3, 4]
+    assert [d.id for d in subtrees[3]] == [3, 4]
+
+    assert await repository.get_subtrees([], depth=2) == {}
+    assert len(connection.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_department_ancestors_and_children(connection):
+    repository = AsyncpgDepartmentRepository(session=None)
+    connection.rows = [department_row(1, None), department_row(2, 1)]
+    assert [d.id for d in await repository.get_ancestors(3)] == [1, 2]
+
+    connection.rows = [department_row(3, 1), department_row(4, 1)]
+    assert [d.id for d in await repository.get_children(1)] == [3, 4]
+    assert connection.calls == [
+        (asyncpg_department_repository.GET_ANCESTORS_SQL, (3,)),
+        (asyncpg_department_repository.GET_CHILDREN_SQL, (1,)),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_employee_reads(connection):
+    repository = AsyncpgEmployeeRepository(session=None)
+    row = {"id": 7, "department_id": 2, "full_name": "Ivan", "position": "dev",
+           "hired_at": date(2023, 5, 1), "created_at": CREATED_AT}
+    connection.rows = [row]
+
+    assert await repository.get_by_id(7) == ReadEmployee(**row)
+    assert await repository.get_all_employees_into_departments(iter([2, 3])) == [ReadEmployee(**row)]
+    assert await repository.get_all_employees_into_departments([]) == []
+    assert connection.calls == [
+        (asyncpg_employee_repository.GET_BY_ID_SQL, (7,)),
+        (asyncpg_employee_repository.GET_IN_DEPARTMENTS_SQL, ([2, 3],)),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_fetch_records_stats_and_wraps_errors(connection):
+    repository = AsyncpgDepartmentRepository(session=None)
+
+    async def cancelled(statement, *args):
+        raise asyncpg.QueryCanceledError("canceling statement due to statement timeout")
+
+    connection.fetch = cancelled
+    stats, token = start_query_stats()
+    try:
+        # Как у SQLAlchemy: ошибку разберут общие обработчики (statement_timeout - 504)
+        with pytest.raises(DBAPIError) as error:
+            await repository.get_by_id(1)
+    finally:
+        stop_query_stats(token)
+
+    assert isinstance(error.value.orig, asyncpg.QueryCanceledError)
+    assert stats.count == 1
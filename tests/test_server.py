@@ -0,0 +1,42 @@
+import pytest
+
+from src import startup
+from src.server import build_config, pool_size_per_worker, worker_count
+from src.settings import Settings
+
+
+def test_pool_fits_connection_budget():
+    settings = Settings(_env_file=None, db_pool_size=10, db_max_overflow=20, db_max_connections=100)
+
+    # 100 / 4 = 25 на воркер, одно - мост LISTEN/NOTIFY
+    assert pool_size_per_worker(settings, 4) == (10, 14)
+    assert pool_size_per_worker(settings, 16) == (5, 0)
+
+    unlimited = Settings(_env_file=None, db_pool_size=10, db_max_overflow=20)
+    assert pool_size_per_worker(unlimited, 16) == (10, 20)
+
+    with pytest.raises(ValueError):
+        pool_size_per_worker(settings, 64)
+
+
+def test_workers_and_config():
+    assert worker_count(Settings(_env_file=None, server_workers=3)) == 3
+    assert worker_count(Settings(_env_file=None)) >= 1
+
+    config = build_config(Settings(_env_file=None, server_graceful_timeout=12), workers=3)
+    assert config.workers == 3
+    assert config.timeout_graceful_shutdown == 12
+    assert config.loop == "auto"
+
+
+def test_config_load_records_app_import(monkeypatch):
+    monkeypatch.setattr(startup, "_app_import", None)
+    assert startup.app_import_timing()[1] is None
+
+    config = build_config(Settings(_env_file=None), workers=1)
+    config.load()
+
+    started, seconds = startup.app_import_timing()
+    assert config.loaded
+    assert seconds is not None and seconds >= 0
+    assert started > 0
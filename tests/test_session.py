@@ -0,0 +1,190 @@
+import httpx
+import pytest
+from fastapi import Request
+from fastapi.routing import APIRoute
+from httpx import ASGITransport
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+
+from main import app
+from src.data_access import session as db_session
+from src.data_access.context import get_db_context, read_only_endpoint
+from src.data_access.pool import InstrumentedAsyncQueuePool
+from src.data_access.routing import ReplicaRouter
+from src.settings import Settings
+
+
+def make_request(method: str, route=None) -> Request:
+    scope = {"type": "http", "method": method, "headers": []}
+    if route is not None:
+        scope["route"] = route
+    return Request(scope)
+
+
+def test_settings_read_from_env(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("DB_HOST", "db.local")
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "true")
+
+    settings = Settings(_env_file=None)
+
+    assert settings.db_pool_size == 3
+    assert settings.db_pool_pre_ping is True
+    assert "@db.local:5432/" in settings.database_url
+
+
+@pytest.mark.asyncio
+async def test_pool_stats_endpoint(tmp_path):
+    settings = Settings(_env_file=None, db_pool_size=2, db_max_overflow=1)
+    db_session.init_db(f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}", settings)
+    try:
+        engine = db_session._engine
+        assert isinstance(engine.pool, InstrumentedAsyncQueuePool)
+
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+            transport = ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                response = await client.get("/health/pool")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["size"] == 2
+        assert data["max_overflow"] == 1
+        assert data["checked_out"] == 1
+        assert data["checkouts"] >= 1
+    finally:
+        await db_session.dispose_db()
+
+
+@pytest.mark.asyncio
+async def test_pool_timeout_is_not_counted_as_checkout(tmp_path):
+    settings = Settings(_env_file=None, db_pool_size=1, db_max_overflow=0, db_pool_timeout=0.05)
+    db_session.init_db(f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}", settings)
+    try:
+        engine = db_session._engine
+        async with engine.connect():
+            with pytest.raises(PoolTimeoutError):
+                async with engine.connect():
+                    pass
+
+        assert engine.pool.timeouts == 1
+        assert engine.pool.checkouts == 1
+    finally:
+        await db_session.dispose_db()
+
+
+def test_settings_replica_urls_comma_separated(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("DB_REPLICA_URLS", "postgresql+asyncpg://a/db, postgresql+asyncpg://b/db")
+
+    settings = Settings(_env_file=None)
+
+    assert settings.db_replica_urls == ["postgresql+asyncpg://a/db", "postgresql+asyncpg://b/db"]
+
+
+class TestReplicaRouter:
+    """Выбор реплики для читающих запросов"""
+
+    def test_round_robin(self):
+        router = ReplicaRouter(primary="primary", replicas=["r1", "r2"])
+
+        assert [router.pick() for _ in range(4)] == ["r1", "r2", "r1", "r2"]
+
+    def test_no_replicas_uses_primary(self):
+        router = ReplicaRouter(primary="primary", replicas=[])
+
+        assert router.pick() == "primary"
+
+    def test_unhealthy_replica_skipped_until_retry_interval(self):
+        now = 100.0
+        router = ReplicaRouter(primary="primary", replicas=["r1", "r2"], retry_interval=10, clock=lambda: now)
+
+        router.mark_unhealthy("r1")
+        assert [router.pick() for _ in range(3)] == ["r2", "r2", "r2"]
+
+        now = 111.0
+        assert {router.pick() for _ in range(2)} == {"r1", "r2"}
+
+    def test_all_replicas_down_falls_back_to_primary(self):
+        router = ReplicaRouter(primary="primary", replicas=["r1", "r2"])
+
+        router.mark_unhealthy("r1")
+        router.mark_unhealthy("r2")
+
+        assert router.pick() == "primary"
+
+
+@pytest.mark.asyncio
+async def test_get_db_context_routes_reads_to_replica(tmp_path):
+    replica_url = f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}"
+    settings = Settings(_env_file=None, db_replica_urls=[replica_url])
+    db_session.init_db(f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}", settings)
+    try:
+        async for db in get_db_context(make_request("GET")):
+            assert str(db.session.bind.url) == replica_url
+
+        async for db in get_db_context(make_request("POST")):
+            assert db.session.bind is db_session._engine
+    finally:
+        await db_session.dispose_db()
+
+
+@pytest.mark.asyncio
+async def test_unreachable_replica_falls_back_to_primary(tmp_path):
+    # Файла в несуществующем каталоге не открыть - реплика "лежит"
+    settings = Settings(_env_file=None, db_replica_urls=[f"sqlite+aiosqlite:///{tmp_path / 'missing' / 'replica.db'}"])
+    db_session.init_db(f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}", settings)
+    try:
+        with pytest.raises(OperationalError):
+            async for db in get_db_context(make_request("GET")):
+                await db.session.execute(text("SELECT 1"))
+
+        # Следующий читающий запрос уходит на primary
+        async for db in get_db_context(make_request("GET")):
+            assert db.session.bind.pool is db_session._engine.pool
+    finally:
+        await db_session.dispose_db()
+
+
+@pytest.mark.asyncio
+async def test_db_context_is_lazy_and_reads_skip_transaction(tmp_path):
+    db_session.init_db(f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}", Settings(_env_file=None))
+    try:
+        # Запрос, который не дошёл до БД, не создаёт сессию и не берёт соединение
+        async for db in get_db_context(make_request("POST")):
+            pass
+        assert not db.has_session
+        assert db_session.get_pool_stats()["checkouts"] == 0
+
+        # Читающий запрос работает без транзакции
+        async for db in get_db_context(make_request("GET")):
+            await db.session.execute(text("SELECT 1"))
+            assert db.session.bind.get_execution_options()["isolation_level"] == "AUTOCOMMIT"
+            assert db.read_only
+    finally:
+        await db_session.dispose_db()
+
+
+@pytest.mark.asyncio
+async def test_read_only_endpoint_gets_read_session(tmp_path):
+    replica_url = f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}"
+    settings = Settings(_env_file=None, db_replica_urls=[replica_url])
+    db_session.init_db(f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}", settings)
+
+    @read_only_endpoint
+    async def batch_read():
+        ...
+
+    async def write():
+        ...
+
+    try:
+        async for db in get_db_context(make_request("POST", route=APIRoute("/batch", batch_read))):
+            assert db.read_only
+            assert str(db.session.bind.url) == replica_url
+
+        async for db in get_db_context(make_request("POST", route=APIRoute("/write", write))):
+            assert not db.read_only
+    finally:
+        await db_session.dispose_db()
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from src.application.single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_in_flight_computation_is_shared():
+    """Конкурентные вызовы с одним ключом ждут одно вычисление"""
+    flight = SingleFlight(ttl=0)
+    started = asyncio.Event()
+    release = asyncio.Event()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        started.set()
+        await release.wait()
+        return calls
+
+    leader = asyncio.create_task(flight.run("key", compute))
+    await started.wait()
+    followers = [asyncio.create_task(flight.run("key", compute)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+
+    results = await asyncio.gather(leader, *followers)
+
+    assert results == [1] * 6
+    assert calls == 1
+    assert flight.shared == 5
+
+
+@pytest.mark.asyncio
+async def test_error_is_shared_and_not_cached():
+    flight = SingleFlight(ttl=10)
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        raise ValueError("boom")
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            await flight.run("key", compute)
+
+    assert calls == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_lets_follower_retry():
+    """Отмена вычисляющего запроса не должна ронять остальных"""
+    flight = SingleFlight(ttl=0)
+    started = asyncio.Event()
+
+    async def slow():
+        started.set()
+        await asyncio.sleep(10)
+
+    async def fast():
+        return "ok"
+
+    leader = asyncio.create_task(flight.run("key", slow))
+    await started.wait()
+    follower = asyncio.create_task(flight.run("key", fast))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == "ok"
+
+
+@pytest.mark.asyncio
+async def test_invalidate_does_not_cache_in_flight_result():
+    flight = SingleFlight(ttl=10)
+    release = asyncio.Event()
+    value = 1
+
+    async def compute():
+        await release.wait()
+        return value
+
+    task = asyncio.create_task(flight.run("key", compute))
+    await asyncio.sleep(0)
+    # Данные поменялись, пока шло вычисление - его результат не кэшируется
+    flight.invalidate()
+    release.set()
+    assert await task == 1
+
+    value = 2
+    assert await flight.run("key", compute) == 2
+    assert await flight.run("key", compute) == 2
+    assert flight.hits == 1
+
+
+@pytest.mark.asyncio
+async def test_caller_after_invalidate_does_not_join_stale_computation():
+    """Чтение после записи не присоединяется к вычислению, начатому до неё"""
+    flight = SingleFlight(ttl=10)
+    release = asyncio.Event()
+    value = "old"
+
+    async def stale():
+        await release.wait()
+        return "old"
+
+    async def fresh():
+        return value
+
+    leader = asyncio.create_task(flight.run("key", stale))
+    await asyncio.sleep(0)
+
+    value = "new"
+    flight.invalidate()
+    # Со старым поведением этот вызов ждал бы release и завис
+    assert await asyncio.wait_for(flight.run("key", fresh), timeout=1) == "new"
+
+    release.set()
+    assert await leader == "old"
+    # Старое вычисление не вытеснило свежий результат из кэша и не удалило чужую запись
+    assert await flight.run("key", stale) == "new"
+    assert flight.hits == 1
@@ -0,0 +1,42 @@
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import event
+
+from main import app
+from src.data_access import session as db_session
+from src.data_access.base import Base
+from src.settings import Settings
+from src.startup import STARTUP_SECONDS, warm_up
+
+
+def test_heavy_optional_modules_not_imported_with_app():
+    """Импорт приложения не тянет то, что нужно только запуску из консоли или редким маршрутам"""
+    code = "import sys, main; print(','.join(m for m in ('uvicorn', 'pyarrow') if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+
+    assert result.stdout.strip() == ""
+
+
+@pytest.mark.asyncio
+async def test_warm_up_opens_connections_and_runs_statements(tmp_path):
+    db_session.init_db(f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite'}", Settings(_env_file=None))
+    engine = db_session._engine
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+        settings = Settings(_env_file=None, warmup_db_connections=3)
+        timings = await warm_up(app, settings, started=0.0, import_seconds=0.5)
+
+        assert engine.pool.checkedin() == 3
+        assert len(statements) >= 7
+        assert {"import", "db_connections", "statements", "schemas", "total"} <= set(timings)
+        assert STARTUP_SECONDS.value(phase="import") == 0.5
+        assert app.openapi_schema is not None
+    finally:
+        await db_session.dispose_db()